@@ -6,6 +6,7 @@
 # GNU General Public License v3.0+
 
 from ansible.module_utils.basic import AnsibleModule
+from multiprocessing.pool import ThreadPool
 from socket import error as socket_error
 import boto
 import radosgw
@@ -45,6 +46,11 @@ option:
         description:
             - radosgw admin user's secret key
         required: true
+    workers:
+        description:
+            - number of users or buckets created concurrently
+        required: false
+        default: 8
     users:
         description:
             - list of users to be created containing sub options
@@ -293,176 +299,228 @@ added_buckets:
 '''
 
 
-def create_users(rgw, users, result):
+def get_uids(rgw):
+    '''
+    List the existing users once, returns None if they can't be listed
+    '''
+
+    try:
+        return set(rgw.get_uids())
+    except (radosgw.exception.RadosGWAdminError, AttributeError):
+        return None
+
+
+def user_exists(rgw, username, uids):
+    '''
+    Check if a user exists, using the listed users when available
+    '''
+
+    if uids is not None:
+        return username in uids
+
+    try:
+        return bool(rgw.get_user(uid=username))
+    except radosgw.exception.RadosGWAdminError:
+        # it doesnt exist
+        return False
+
+
+def create_user(rgw, user, uids):
+    '''
+    Create a single user and set its quotas.
+    Returns whether the user was added and the error messages.
+    '''
+
+    # get info
+    username = user['username']
+    fullname = user['fullname']
+    email = user['email']
+    maxbucket = user['maxbucket']
+    suspend = user['suspend']
+    autogenkey = user['autogenkey']
+    accesskey = user['accesskey']
+    secretkey = user['secretkey']
+    userquota = user['userquota']
+    usermaxsize = user['usermaxsize']
+    usermaxobjects = user['usermaxobjects']
+    bucketquota = user['bucketquota']
+    bucketmaxsize = user['bucketmaxsize']
+    bucketmaxobjects = user['bucketmaxobjects']
+
+    # user exists can not create
+    if user_exists(rgw, username, uids):
+        return False, [username + ' UserExists']
+
+    # user doesnt exist create it
+    kwargs = dict(key_type='s3', max_buckets=maxbucket, suspended=suspend)
+    if email:
+        kwargs['email'] = email
+    if autogenkey:
+        kwargs['generate_key'] = autogenkey
+    else:
+        kwargs['access_key'] = accesskey
+        kwargs['secret_key'] = secretkey
+
+    created = False
+    try:
+        rgw.create_user(username, fullname, **kwargs)
+        created = True
+
+        if userquota:
+            rgw.set_quota(username, 'user', max_objects=usermaxobjects,
+                          max_size_kb=usermaxsize, enabled=True)
+
+        if bucketquota:
+            rgw.set_quota(username, 'bucket', max_objects=bucketmaxobjects,  # noqa E501
+                          max_size_kb=bucketmaxsize, enabled=True)
+    except radosgw.exception.RadosGWAdminError as e:
+        # only roll back a user created by this call, never one created
+        # since the users were listed
+        if created:
+            try:
+                rgw.delete_user(username)
+            except radosgw.exception.RadosGWAdminError:
+                pass
+        return False, [username + ' ' + e.get_code()]
+
+    return True, []
+
+
+def split_duplicates(items, key):
+    '''
+    Split the items in the first item of each key and the other ones,
+    so that two workers never create the same user or bucket
+    '''
+
+    seen = set()
+    unique = []
+    duplicates = []
+    for item in items:
+        if item[key] in seen:
+            duplicates.append(item)
+        else:
+            seen.add(item[key])
+            unique.append(item)
+
+    return unique, duplicates
+
+
+def create_users(rgw, users, result, uids=None, workers=1):
 
     added_users = []
     failed_users = []
 
-    for user in users:
-
-        # get info
-        username = user['username']
-        fullname = user['fullname']
-        email = user['email']
-        maxbucket = user['maxbucket']
-        suspend = user['suspend']
-        autogenkey = user['autogenkey']
-        accesskey = user['accesskey']
-        secretkey = user['secretkey']
-        userquota = user['userquota']
-        usermaxsize = user['usermaxsize']
-        usermaxobjects = user['usermaxobjects']
-        bucketquota = user['bucketquota']
-        bucketmaxsize = user['bucketmaxsize']
-        bucketmaxobjects = user['bucketmaxobjects']
-
-        fail_flag = False
-
-        #  check if user exists
-        try:
-            user_info = rgw.get_user(uid=username)
-        except radosgw.exception.RadosGWAdminError:
-            # it doesnt exist
-            user_info = None
-
-        # user exists can not create
-        if user_info:
-            result['error_messages'].append(username + ' UserExists')
-            failed_users.append(username)
+    users, duplicates = split_duplicates(users, 'username')
+
+    pool = ThreadPool(max(1, min(workers, len(users))))
+    try:
+        # the results are returned in the order of the users
+        results = pool.map(lambda user: create_user(rgw, user, uids), users)
+    finally:
+        pool.close()
+        pool.join()
+
+    for user, (added, errors) in zip(users, results):
+        result['error_messages'].extend(errors)
+        if added:
+            added_users.append(user['username'])
+            if uids is not None:
+                uids.add(user['username'])
         else:
-            # user doesnt exist create it
-            if email:
-                if autogenkey:
-                    try:
-                        rgw.create_user(username, fullname, email=email, key_type='s3',  # noqa E501
-                                        generate_key=autogenkey,
-                                        max_buckets=maxbucket, suspended=suspend)  # noqa E501
-                    except radosgw.exception.RadosGWAdminError as e:
-                        result['error_messages'].append(username + ' ' + e.get_code())  # noqa E501
-                        fail_flag = True
-                else:
-                    try:
-                        rgw.create_user(username, fullname, email=email, key_type='s3',  # noqa E501
-                                        access_key=accesskey, secret_key=secretkey,  # noqa E501
-                                        max_buckets=maxbucket, suspended=suspend)  # noqa E501
-                    except radosgw.exception.RadosGWAdminError as e:
-                        result['error_messages'].append(username + ' ' + e.get_code())  # noqa E501
-                        fail_flag = True
-            else:
-                if autogenkey:
-                    try:
-                        rgw.create_user(username, fullname, key_type='s3',
-                                        generate_key=autogenkey,
-                                        max_buckets=maxbucket, suspended=suspend)  # noqa E501
-                    except radosgw.exception.RadosGWAdminError as e:
-                        result['error_messages'].append(username + ' ' + e.get_code())  # noqa E501
-                        fail_flag = True
-                else:
-                    try:
-                        rgw.create_user(username, fullname, key_type='s3',
-                                        access_key=accesskey, secret_key=secretkey,  # noqa E501
-                                        max_buckets=maxbucket, suspended=suspend)  # noqa E501
-                    except radosgw.exception.RadosGWAdminError as e:
-                        result['error_messages'].append(username + ' ' + e.get_code())  # noqa E501
-                        fail_flag = True
-
-            if not fail_flag and userquota:
-                try:
-                    rgw.set_quota(username, 'user', max_objects=usermaxobjects,
-                                  max_size_kb=usermaxsize, enabled=True)
-                except radosgw.exception.RadosGWAdminError as e:
-                    result['error_messages'].append(username + ' ' + e.get_code())  # noqa E501
-                    fail_flag = True
-
-            if not fail_flag and bucketquota:
-                try:
-                    rgw.set_quota(username, 'bucket', max_objects=bucketmaxobjects,  # noqa E501
-                                  max_size_kb=bucketmaxsize, enabled=True)
-                except radosgw.exception.RadosGWAdminError as e:
-                    result['error_messages'].append(username + ' ' + e.get_code())  # noqa E501
-                    fail_flag = True
-
-            if fail_flag:
-                try:
-                    rgw.delete_user(username)
-                except radosgw.exception.RadosGWAdminError:
-                    pass
-                failed_users.append(username)
-            else:
-                added_users.append(username)
-
-        result['added_users'] = ", ".join(added_users)
-        result['failed_users'] = ", ".join(failed_users)
-
-
-def create_buckets(rgw, buckets, result):
+            failed_users.append(user['username'])
+
+    # the next definitions of a user find it existing, as they did when
+    # the users were created one after the other
+    for user in duplicates:
+        if user['username'] in added_users:
+            result['error_messages'].append(user['username'] + ' UserExists')
+        failed_users.append(user['username'])
+
+    result['added_users'] = ", ".join(added_users)
+    result['failed_users'] = ", ".join(failed_users)
+
+
+def create_bucket_for_user(rgw, conn, bucket, user, uids):
+    '''
+    Create a single bucket and link it to its user.
+    Returns whether the bucket was added and the error messages.
+    '''
+
+    #  check if bucket exists
+    try:
+        bucket_info = rgw.get_bucket(bucket_name=bucket)
+    except TypeError:
+        # it doesnt exist
+        bucket_info = None
+
+    # if it exists add to failed list
+    if bucket_info:
+        return False, [bucket + ' BucketExists']
+
+    # bucket doesn't exist, so we need to create it
+    bucket_info = create_bucket(rgw, bucket, conn)
+    if not bucket_info:
+        # something went wrong
+        return False, [bucket + ' could not be created']
+
+    # bucket created ok, link to user
+    if user_exists(rgw, user, uids):
+        try:
+            rgw.link_bucket(bucket_name=bucket,
+                            bucket_id=bucket_info.id,
+                            uid=user)
+            return True, []
+        except radosgw.exception.RadosGWAdminError as e:
+            error = bucket + e.get_code()
+    else:
+        # user doesnt exist cant be link delete bucket
+        error = bucket + ' could not be linked' + ', NoSuchUser ' + user
+
+    try:
+        rgw.delete_bucket(bucket, purge_objects=True)
+    except radosgw.exception.RadosGWAdminError:
+        pass
+    return False, [error]
+
+
+def create_buckets(rgw, buckets, result, uids=None, workers=1):
 
     added_buckets = []
     failed_buckets = []
 
-    for bucket_info in buckets:
-        bucket = bucket_info['bucket']
-        user = bucket_info['user']
+    buckets, duplicates = split_duplicates(buckets, 'bucket')
 
-        #  check if bucket exists
-        try:
-            bucket_info = rgw.get_bucket(bucket_name=bucket)
-        except TypeError:
-            # it doesnt exist
-            bucket_info = None
-
-        # if it exists add to failed list
-        if bucket_info:
-            failed_buckets.append(bucket)
-            result['error_messages'].append(bucket + ' BucketExists')
+    # a single S3 connection shared by all the buckets
+    conn = connect_s3(rgw)
+
+    pool = ThreadPool(max(1, min(workers, len(buckets))))
+    try:
+        # the results are returned in the order of the buckets
+        results = pool.map(
+            lambda b: create_bucket_for_user(rgw, conn, b['bucket'], b['user'], uids),  # noqa E501
+            buckets)
+    finally:
+        pool.close()
+        pool.join()
+
+    for bucket_info, (added, errors) in zip(buckets, results):
+        result['error_messages'].extend(errors)
+        if added:
+            added_buckets.append(bucket_info['bucket'])
         else:
-            # bucket doesn't exist, so we need to create it
-            bucket_info = create_bucket(rgw, bucket)
-            if bucket_info:
-                # bucket created ok, link to user
-
-                #  check if user exists
-                try:
-                    user_info = rgw.get_user(uid=user)
-                except radosgw.exception.RadosGWAdminError:
-                    # it doesnt exist
-                    user_info = None
-
-                # user exists, link
-                if user_info:
-                    try:
-                        rgw.link_bucket(bucket_name=bucket,
-                                        bucket_id=bucket_info.id,
-                                        uid=user)
-                        added_buckets.append(bucket)
-                    except radosgw.exception.RadosGWAdminError as e:
-                        result['error_messages'].append(bucket + e.get_code())
-                        try:
-                            rgw.delete_bucket(bucket, purge_objects=True)
-                        except radosgw.exception.RadosGWAdminError:
-                            pass
-                        failed_buckets.append(bucket)
-
-                else:
-                    # user doesnt exist cant be link delete bucket
-                    try:
-                        rgw.delete_bucket(bucket, purge_objects=True)
-                    except radosgw.exception.RadosGWAdminError:
-                        pass
-                    failed_buckets.append(bucket)
-                    result['error_messages'].append(bucket + ' could not be linked' + ', NoSuchUser ' + user)  # noqa E501
-
-            else:
-                # something went wrong
-                failed_buckets.append(bucket)
-                result['error_messages'].append(bucket + ' could not be created')  # noqa E501
-
-        result['added_buckets'] = ", ".join(added_buckets)
-        result['failed_buckets'] = ", ".join(failed_buckets)
-
-
-def create_bucket(rgw, bucket):
-    conn = boto.connect_s3(aws_access_key_id=rgw.provider._access_key,
+            failed_buckets.append(bucket_info['bucket'])
+
+    for bucket_info in duplicates:
+        if bucket_info['bucket'] in added_buckets:
+            result['error_messages'].append(bucket_info['bucket'] + ' BucketExists')  # noqa E501
+        failed_buckets.append(bucket_info['bucket'])
+
+    result['added_buckets'] = ", ".join(added_buckets)
+    result['failed_buckets'] = ", ".join(failed_buckets)
+
+
+def connect_s3(rgw):
+    return boto.connect_s3(aws_access_key_id=rgw.provider._access_key,
                            aws_secret_access_key=rgw.provider._secret_key,
                            host=rgw._connection[0],
                            port=rgw.port,
@@ -470,6 +528,11 @@ def create_bucket(rgw, bucket):
                            calling_format=boto.s3.connection.OrdinaryCallingFormat(),  # noqa E501
                            )
 
+
+def create_bucket(rgw, bucket, conn=None):
+    if conn is None:
+        conn = connect_s3(rgw)
+
     try:
         conn.create_bucket(bucket_name=bucket)
         bucket_info = rgw.get_bucket(bucket_name=bucket)
@@ -488,6 +551,7 @@ def main():
                                  default=False),
                   admin_access_key=dict(type='str', required=True),
                   admin_secret_key=dict(type='str', required=True),
+                  workers=dict(type='int', required=False, default=8),
                   buckets=dict(type='list', required=False, elements='dict',
                                options=dict(bucket=dict(type='str', required=True),  # noqa E501
                                             user=dict(type='str', required=True))),  # noqa E501
@@ -519,6 +583,7 @@ def main():
     admin_secret_key = module.params.get('admin_secret_key')
     users = module.params['users']
     buckets = module.params.get('buckets')
+    workers = module.params.get('workers')
 
     # seed the result dict in the object
     result = dict(
@@ -549,11 +614,14 @@ def main():
         connected = False
         result['error_messages'] = str(e)
 
+    # list the existing users once
+    uids = get_uids(rgw) if connected else None
+
     if connected and users:
-        create_users(rgw, users, result)
+        create_users(rgw, users, result, uids, workers)
 
     if connected and buckets:
-        create_buckets(rgw, buckets, result)
+        create_buckets(rgw, buckets, result, uids, workers)
 
     if result['added_users'] != '' or result['added_buckets'] != '':
         result['changed'] = True
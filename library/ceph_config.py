@@ -0,0 +1,245 @@
+# Copyright 2020, Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+from ansible.module_utils.basic import AnsibleModule
+try:
+    from ansible.module_utils.ca_common import exec_command, generate_ceph_cmd, is_containerized, fatal
+except ImportError:
+    from module_utils.ca_common import exec_command, generate_ceph_cmd, is_containerized, fatal
+import datetime
+import json
+
+
+ANSIBLE_METADATA = {
+    'metadata_version': '1.1',
+    'status': ['preview'],
+    'supported_by': 'community'
+}
+
+DOCUMENTATION = '''
+---
+module: ceph_config
+short_description: Manage the Ceph centralized configuration
+version_added: "2.8"
+description:
+    - Manage the options of the Ceph configuration database (ceph config).
+      The current configuration is read once with 'config dump' and only
+      the options that differ from the desired state are set or removed.
+options:
+    cluster:
+        description:
+            - The ceph cluster name.
+        required: false
+        default: ceph
+    config:
+        description:
+            - List of the desired options. Each item needs a 'who' (the
+            section, e.g. 'global', 'mgr', 'osd.0' or 'osd/class:ssd'),
+            an 'option' and a 'value' when its 'state' is 'present'.
+            'state' is either 'present' (the default) or 'absent'.
+        required: true
+author:
+    - Dimitri Savineau <dsavinea@redhat.com>
+'''
+
+EXAMPLES = '''
+- name: configure the dashboard
+  ceph_config:
+    config:
+      - { who: mgr, option: mgr/dashboard/ssl, value: false }
+      - { who: mgr, option: mgr/dashboard/server_port, value: 8443 }
+
+- name: remove an option
+  ceph_config:
+    config:
+      - { who: global, option: osd_pool_default_size, state: absent }
+'''
+
+RETURN = '''#  '''
+
+
+def dump_config(cluster, container_image=None):
+    '''
+    Dump the configuration database
+    '''
+
+    args = ['dump', '--format=json']
+
+    cmd = generate_ceph_cmd(['config'], args, cluster=cluster, container_image=container_image)
+
+    return cmd
+
+
+def set_config(cluster, who, option, value, container_image=None):
+    '''
+    Set an option in the configuration database
+    '''
+
+    args = ['set', who, option, value]
+
+    cmd = generate_ceph_cmd(['config'], args, cluster=cluster, container_image=container_image)
+
+    return cmd
+
+
+def remove_config(cluster, who, option, container_image=None):
+    '''
+    Remove an option from the configuration database
+    '''
+
+    args = ['rm', who, option]
+
+    cmd = generate_ceph_cmd(['config'], args, cluster=cluster, container_image=container_image)
+
+    return cmd
+
+
+def normalize_value(value):
+    '''
+    Convert a value to the string stored by ceph, booleans are
+    compared case insensitively
+    '''
+
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+
+    value = str(value).strip()
+    if value.lower() in ['true', 'false']:
+        return value.lower()
+
+    return value
+
+
+def parse_config_dump(out):
+    '''
+    Index the output of 'config dump' by (who, option)
+    '''
+
+    current = {}
+    for entry in json.loads(out):
+        who = entry['section']
+        if entry.get('mask'):
+            who = '{}/{}'.format(who, entry['mask'])
+        current[(who, entry['name'])] = entry['value']
+
+    return current
+
+
+def plan_config(config, current):
+    '''
+    Return the items of 'config' that differ from the current configuration
+    '''
+
+    plan = []
+    for item in config:
+        key = (item['who'], item['option'])
+        if item['state'] == 'absent':
+            if key in current:
+                plan.append(item)
+        elif key not in current or normalize_value(current[key]) != item['value']:
+            plan.append(item)
+
+    return plan
+
+
+def run_module():
+    module_args = dict(
+        cluster=dict(type='str', required=False, default='ceph'),
+        config=dict(type='list', elements='dict', required=True),
+    )
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=True,
+    )
+
+    cluster = module.params.get('cluster')
+
+    startd = datetime.datetime.now()
+
+    container_image = is_containerized()
+
+    config = []
+    for item in module.params.get('config'):
+        state = item.get('state', 'present')
+        if not item.get('who') or not item.get('option'):
+            fatal("each item of 'config' must have a 'who' and an 'option'", module)
+        if state not in ['present', 'absent']:
+            fatal("the state of {} {} must be 'present' or 'absent'".format(item['who'], item['option']), module)
+        if state == 'present' and item.get('value') is None:
+            fatal("{} {} needs a value".format(item['who'], item['option']), module)
+        config.append(dict(who=item['who'],
+                           option=item['option'],
+                           value=normalize_value(item['value']) if state == 'present' else None,
+                           state=state))
+
+    rc, cmd, out, err = exec_command(module, dump_config(cluster, container_image=container_image))
+    if rc != 0:
+        module.fail_json(msg='failed to dump the configuration', cmd=cmd,
+                         rc=rc, stdout=out, stderr=err)
+
+    current = parse_config_dump(out)
+
+    results = []
+    cmds = []
+    out, err = '', ''
+    for item in plan_config(config, current):
+        result = dict(who=item['who'], option=item['option'], state=item['state'],
+                      value=item['value'], changed=True)
+        results.append(result)
+        if module.check_mode:
+            continue
+
+        if item['state'] == 'absent':
+            _cmd = remove_config(cluster, item['who'], item['option'], container_image=container_image)
+        else:
+            _cmd = set_config(cluster, item['who'], item['option'], item['value'], container_image=container_image)
+        # the commands share the librados connection of the dump when
+        # the librados backend is available
+        _rc, _cmd, _out, _err = exec_command(module, _cmd)
+        cmds.append(_cmd)
+        result.update(rc=_rc, changed=_rc == 0, stderr=_err.rstrip("\r\n"))
+        if _rc != 0 and rc == 0:
+            rc, out, err = _rc, _out, _err
+
+    endd = datetime.datetime.now()
+    delta = endd - startd
+
+    result = dict(
+        cmd=cmds,
+        start=str(startd),
+        end=str(endd),
+        delta=str(delta),
+        rc=rc,
+        stdout=out.rstrip("\r\n"),
+        stderr=err.rstrip("\r\n"),
+        changed=any(r['changed'] for r in results),
+        results=results,
+    )
+
+    if rc != 0:
+        module.fail_json(msg='failed to apply the configuration', **result)
+
+    module.exit_json(**result)
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,385 @@
+# Copyright 2020, Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.six.moves.urllib.error import HTTPError, URLError
+from ansible.module_utils.six.moves.urllib.parse import urlencode
+from ansible.module_utils.urls import open_url
+import base64
+import datetime
+import json
+import re
+import socket
+
+
+ANSIBLE_METADATA = {
+    'metadata_version': '1.1',
+    'status': ['preview'],
+    'supported_by': 'community'
+}
+
+DOCUMENTATION = '''
+---
+module: ceph_container_image
+short_description: Inventory the Ceph containers and pull the Ceph image
+version_added: "2.8"
+description:
+    - List the running Ceph containers and their image with a single
+      'ps' and a single 'inspect' (which also inspects the Ceph image).
+    - Optionally pull the Ceph image. The pull is skipped when the manifest
+      digest of the image in the registry is already one of the local
+      image digests.
+    - Report the Ceph daemons running an image other than the Ceph image,
+      i.e. the daemons to restart.
+options:
+    image:
+        description:
+            - The Ceph container image, 'registry/name:tag'.
+        required: true
+    container_binary:
+        description:
+            - The container engine binary, docker or podman.
+        required: true
+    pull:
+        description:
+            - If set to True, pull the image unless the registry has the
+              same digest as the local image.
+        required: false
+        default: false
+    pull_timeout:
+        description:
+            - Kill the pull after this duration (as accepted by 'timeout'),
+              0 means no limit.
+        required: false
+        default: '0'
+    registry_url:
+        description:
+            - The URL of the registry API. By default, https://<registry>
+              (https://registry-1.docker.io for docker.io).
+        required: false
+    registry_username:
+        description:
+            - The user name to authenticate to the registry.
+        required: false
+    registry_password:
+        description:
+            - The password to authenticate to the registry.
+        required: false
+    validate_certs:
+        description:
+            - Validate the registry SSL certificate.
+        required: false
+        default: true
+author:
+    - Dimitri Savineau <dsavinea@redhat.com>
+'''
+
+EXAMPLES = '''
+- name: pull the ceph image if it changed in the registry
+  ceph_container_image:
+    image: docker.io/ceph/daemon:latest-master
+    container_binary: podman
+    pull: true
+
+- name: restart the mons running an outdated image
+  debug:
+    msg: restart the mons
+  when: "'mon' in ceph_container_image.updated"
+'''
+
+RETURN = '''
+ansible_facts:
+    description: the Ceph containers and the Ceph image
+    returned: always
+    type: complex
+    contains:
+        ceph_containers:
+            description: the running Ceph containers, indexed by daemon type
+            type: dict
+            sample: {"mon": [{"id": "4c3b...", "name": "ceph-mon-mon0",
+                     "image_id": "sha256:8e4c..."}]}
+        ceph_container_image:
+            description: the Ceph image
+            type: dict
+            sample: {"name": "docker.io/ceph/daemon:latest-master",
+                     "id": "sha256:8e4c...",
+                     "digests": ["sha256:93b1..."],
+                     "registry_digest": "sha256:93b1...",
+                     "pulled": false,
+                     "updated": ["mon"]}
+'''
+
+DAEMONS = ['mon', 'osd', 'mds', 'rgw', 'mgr', 'rbd-mirror', 'nfs', 'crash']
+
+MANIFEST_TYPES = [
+    'application/vnd.docker.distribution.manifest.list.v2+json',
+    'application/vnd.docker.distribution.manifest.v2+json',
+    'application/vnd.oci.image.index.v1+json',
+    'application/vnd.oci.image.manifest.v1+json',
+]
+
+DOCKER_HUB = ['docker.io', 'index.docker.io', 'registry-1.docker.io']
+
+
+def parse_image(image):
+    '''
+    Split an image reference into (registry, repository, tag or digest)
+    '''
+
+    name, _, digest = image.partition('@')
+    tag = 'latest'
+    if ':' in name.rsplit('/', 1)[-1]:
+        name, tag = name.rsplit(':', 1)
+    reference = digest or tag
+
+    registry, _, repository = name.partition('/')
+    if not repository or not ('.' in registry or ':' in registry or registry == 'localhost'):
+        registry, repository = 'docker.io', name
+    if registry in DOCKER_HUB and '/' not in repository:
+        repository = 'library/' + repository
+
+    return registry, repository, reference
+
+
+def get_daemon(name):
+    '''
+    Return the daemon type of a Ceph container name, None if it isn't
+    a Ceph daemon container
+    '''
+
+    name = name.lstrip('/')
+    for daemon in DAEMONS:
+        if re.match(r'ceph-{}(-|$)'.format(daemon), name):
+            return daemon.replace('-', '_')
+
+    return None
+
+
+def list_containers(module, container_binary):
+    '''
+    List the ids of the running Ceph containers
+    '''
+
+    cmd = [container_binary, 'ps', '-q', '--no-trunc', '--filter', 'name=ceph-']
+    rc, out, err = module.run_command(cmd)
+    if rc != 0:
+        module.fail_json(msg='failed to list the containers', cmd=cmd, rc=rc, stdout=out, stderr=err)
+
+    return out.split()
+
+
+def inspect(module, container_binary, names):
+    '''
+    Inspect the containers and images in a single call, the names which
+    don't exist (e.g. an image not pulled yet) are left out, or nothing is
+    returned at all depending on the engine
+    '''
+
+    cmd = [container_binary, 'inspect'] + names
+    rc, out, err = module.run_command(cmd)
+    try:
+        # some names missing is a failure but the others are on stdout
+        return json.loads(out) if out.strip() else []
+    except ValueError:
+        module.fail_json(msg='failed to inspect {}'.format(' '.join(names)), cmd=cmd, rc=rc, stdout=out, stderr=err)
+
+
+def image_facts(inspected):
+    '''
+    Return the id and the digests of the image in the inspect output,
+    the only item which isn't a container
+    '''
+
+    for item in inspected:
+        if 'State' in item:
+            continue
+        return dict(id=item['Id'],
+                    digests=[d.rpartition('@')[2] for d in item.get('RepoDigests') or []])
+
+    return dict(id=None, digests=[])
+
+
+def container_facts(inspected):
+    '''
+    Index the inspected containers by daemon type
+    '''
+
+    containers = {}
+    for item in inspected:
+        if 'State' not in item:
+            continue
+        daemon = get_daemon(item.get('Name', ''))
+        if daemon is None:
+            continue
+        containers.setdefault(daemon, []).append(dict(id=item['Id'],
+                                                      name=item['Name'].lstrip('/'),
+                                                      image_id=item['Image']))
+
+    return containers
+
+
+def get_token(module, challenge, repository):
+    '''
+    Get a token for a Bearer authentication challenge
+    '''
+
+    params = dict(re.findall(r'(\w+)="([^"]*)"', challenge))
+    query = dict((k, v) for k, v in params.items() if k in ['service', 'scope'])
+    query.setdefault('scope', 'repository:{}:pull'.format(repository))
+    response = open_url('{}?{}'.format(params['realm'], urlencode(query)),
+                        url_username=module.params.get('registry_username'),
+                        url_password=module.params.get('registry_password'),
+                        force_basic_auth=bool(module.params.get('registry_username')),
+                        validate_certs=module.params.get('validate_certs'),
+                        timeout=30)
+    data = json.loads(response.read())
+
+    return data.get('token') or data.get('access_token')
+
+
+def get_registry_digest(module, image):
+    '''
+    Return the digest of the image manifest in the registry, None if it
+    can't be determined
+    '''
+
+    registry, repository, reference = parse_image(image)
+    if reference.startswith('sha256:'):
+        return reference
+
+    url = module.params.get('registry_url')
+    if not url:
+        url = 'https://' + ('registry-1.docker.io' if registry in DOCKER_HUB else registry)
+    url = '{}/v2/{}/manifests/{}'.format(url.rstrip('/'), repository, reference)
+
+    headers = {'Accept': ', '.join(MANIFEST_TYPES)}
+    username = module.params.get('registry_username')
+    password = module.params.get('registry_password')
+    try:
+        for _ in range(2):
+            try:
+                response = open_url(url, method='HEAD', headers=headers,
+                                    validate_certs=module.params.get('validate_certs'),
+                                    timeout=30)
+                return response.headers.get('Docker-Content-Digest')
+            except HTTPError as e:
+                challenge = e.headers.get('WWW-Authenticate', '') if e.code == 401 else ''
+                if 'Authorization' in headers or not challenge:
+                    raise
+                if challenge.lower().startswith('bearer'):
+                    headers['Authorization'] = 'Bearer {}'.format(get_token(module, challenge, repository))
+                elif username:
+                    credentials = '{}:{}'.format(username, password or '').encode('utf-8')
+                    headers['Authorization'] = 'Basic {}'.format(base64.b64encode(credentials).decode('utf-8'))
+                else:
+                    raise
+    except (HTTPError, URLError, socket.error, ValueError, KeyError) as e:
+        module.warn('failed to get the digest of {} from the registry: {}'.format(image, e))
+
+    return None
+
+
+def pull_image(module, container_binary, image):
+    '''
+    Pull the image
+    '''
+
+    cmd = [container_binary, 'pull', image]
+    if module.params.get('pull_timeout') not in [None, '', '0']:
+        cmd = ['timeout', '--foreground', '-s', 'KILL', module.params['pull_timeout']] + cmd
+    rc, out, err = module.run_command(cmd)
+    if rc != 0:
+        module.fail_json(msg='failed to pull {}'.format(image), cmd=cmd, rc=rc, stdout=out, stderr=err)
+
+    return cmd
+
+
+def run_module():
+    module_args = dict(
+        image=dict(type='str', required=True),
+        container_binary=dict(type='str', required=True),
+        pull=dict(type='bool', required=False, default=False),
+        pull_timeout=dict(type='str', required=False, default='0'),
+        registry_url=dict(type='str', required=False),
+        registry_username=dict(type='str', required=False),
+        registry_password=dict(type='str', required=False, no_log=True),
+        validate_certs=dict(type='bool', required=False, default=True),
+    )
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=True,
+    )
+
+    image = module.params.get('image')
+    container_binary = module.params.get('container_binary')
+
+    startd = datetime.datetime.now()
+
+    names = list_containers(module, container_binary)
+    inspected = inspect(module, container_binary, names + [image])
+    if names and len(inspected) != len(names) + 1:
+        # a name is missing, inspect the containers and the image separately
+        # so that one doesn't hide the others
+        inspected = inspect(module, container_binary, names) + inspect(module, container_binary, [image])
+    containers = container_facts(inspected)
+    local_image = image_facts(inspected)
+
+    cmds = []
+    registry_digest = None
+    pulled = False
+    if module.params.get('pull'):
+        registry_digest = get_registry_digest(module, image)
+        if registry_digest is None or registry_digest not in local_image['digests']:
+            pulled = True
+            if not module.check_mode:
+                cmds.append(pull_image(module, container_binary, image))
+                local_image = image_facts(inspect(module, container_binary, [image]))
+
+    updated = sorted(daemon for daemon, items in containers.items()
+                     if local_image['id'] and any(c['image_id'] != local_image['id'] for c in items))
+
+    endd = datetime.datetime.now()
+    delta = endd - startd
+
+    module.exit_json(
+        cmd=cmds,
+        start=str(startd),
+        end=str(endd),
+        delta=str(delta),
+        rc=0,
+        changed=False,
+        ansible_facts=dict(
+            ceph_containers=containers,
+            ceph_container_image=dict(
+                name=image,
+                id=local_image['id'],
+                digests=local_image['digests'],
+                registry_digest=registry_digest,
+                pulled=pulled,
+                updated=updated,
+            ),
+        ),
+    )
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
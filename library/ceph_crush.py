@@ -13,6 +13,7 @@ try:
 except ImportError:
     from module_utils.ca_common import fatal
 import datetime
+import json
 
 ANSIBLE_METADATA = {
     'metadata_version': '1.1',
@@ -44,7 +45,16 @@ options:
         description:
             - osd_crush_location dict from the inventory file. It contains
             the placement of each host in the CRUSH map.
-        required: true
+            Mutually exclusive with I(locations).
+        required: false
+    locations:
+        description:
+            - List of osd_crush_location dicts, typically one per OSD host of
+            the inventory. The current CRUSH hierarchy is read once and only
+            the missing buckets and the misplaced ones are created/moved.
+            The task reports no change when the hierarchy already matches.
+            Mutually exclusive with I(location).
+        required: false
     containerized:
         description:
             - Weither or not this is a containerized cluster. The value is
@@ -61,6 +71,14 @@ EXAMPLES = '''
     containerized: "{{ container_exec_cmd }}"
   with_items: "{{ groups[osd_group_name] }}"
   when: crush_rule_config | bool
+
+- name: configure crush hierarchy for all the osd hosts at once
+  ceph_crush:
+    cluster: "{{ cluster }}"
+    locations: "{{ groups[osd_group_name] | map('extract', hostvars) | selectattr('osd_crush_location', 'defined') | map(attribute='osd_crush_location') | list }}"  # noqa E501
+    containerized: "{{ container_exec_cmd }}"
+  run_once: true
+  when: crush_rule_config | bool
 '''
 
 RETURN = '''#  '''
@@ -85,6 +103,39 @@ def generate_cmd(cluster, subcommand, bucket, bucket_type, containerized=None):
     return cmd
 
 
+def generate_crush_dump_cmd(cluster, containerized=None):
+    '''
+    Generate command line to dump the CRUSH map
+    '''
+    cmd = [
+        'ceph',
+        '--cluster',
+        cluster,
+        'osd',
+        'crush',
+        'dump',
+        '--format=json',
+    ]
+    if containerized:
+        cmd = containerized.split() + cmd
+    return cmd
+
+
+def get_crush_tree(crush_dump):
+    '''
+    Build a {bucket name: {type, parent}} dict from the CRUSH map dump
+    '''
+    names = dict((bucket['id'], bucket['name']) for bucket in crush_dump.get('buckets', []))  # noqa E501
+    tree = dict((bucket['name'], dict(type=bucket['type_name'], parent=None))
+                for bucket in crush_dump.get('buckets', []))
+    for bucket in crush_dump.get('buckets', []):
+        for item in bucket.get('items', []):
+            # negative ids are buckets, positive ids are osds
+            if item['id'] < 0 and item['id'] in names:
+                tree[names[item['id']]]['parent'] = bucket['name']
+    return tree
+
+
 def sort_osd_crush_location(location, module):
     '''
     Sort location tuple
@@ -113,19 +164,31 @@ def sort_osd_crush_location(location, module):
         fatal("{} is not a valid CRUSH bucket, valid bucket types are {}".format(error.args[0].split()[0], crush_bucket_types), module)  # noqa E501
 
 
-def create_and_move_buckets_list(cluster, location, containerized=None):
+def create_and_move_buckets_list(cluster, location, containerized=None, tree=None, module=None):  # noqa E501
     '''
     Creates Ceph CRUSH buckets and arrange the hierarchy
+
+    When the current hierarchy is given (see get_crush_tree) only the
+    missing buckets are created and only the misplaced ones are moved.
+    The tree is updated with the planned changes so it can be reused for
+    the next location.
     '''
     previous_bucket = None
     cmd_list = []
     for item in location:
         bucket_type, bucket_name = item
-        # ceph osd crush add-bucket maroot root
-        cmd_list.append(generate_cmd(cluster, "add-bucket", bucket_name, bucket_type, containerized))  # noqa E501
-        if previous_bucket:
+        if tree is None or bucket_name not in tree:
+            # ceph osd crush add-bucket maroot root
+            cmd_list.append(generate_cmd(cluster, "add-bucket", bucket_name, bucket_type, containerized))  # noqa E501
+            if tree is not None:
+                tree[bucket_name] = dict(type=bucket_type, parent=None)
+        elif tree[bucket_name]['type'] != bucket_type:
+            fatal("bucket {} already exists with type {}".format(bucket_name, tree[bucket_name]['type']), module)  # noqa E501
+        if previous_bucket and (tree is None or tree[previous_bucket]['parent'] != bucket_name):  # noqa E501
             # ceph osd crush move monrack root=maroot
             cmd_list.append(generate_cmd(cluster, "move", previous_bucket, "%s=%s" % (bucket_type, bucket_name), containerized))  # noqa E501
+            if tree is not None:
+                tree[previous_bucket]['parent'] = bucket_name
         previous_bucket = item[1]
     return cmd_list
 
@@ -134,27 +197,37 @@ def exec_commands(module, cmd_list):
     '''
     Creates Ceph commands
     '''
+    rc, cmd, out, err = 0, [], '', ''
     for cmd in cmd_list:
         rc, out, err = module.run_command(cmd)
+        if rc != 0:
+            break
     return rc, cmd, out, err
 
 
 def run_module():
     module_args = dict(
         cluster=dict(type='str', required=False, default='ceph'),
-        location=dict(type='dict', required=True),
+        location=dict(type='dict', required=False),
+        locations=dict(type='list', elements='dict', required=False),
         containerized=dict(type='str', required=True, default=None),
     )
 
     module = AnsibleModule(
         argument_spec=module_args,
-        supports_check_mode=True
+        supports_check_mode=True,
+        required_one_of=[['location', 'locations']],
+        mutually_exclusive=[['location', 'locations']],
     )
 
     cluster = module.params['cluster']
+    containerized = module.params['containerized']
+
+    if module.params['locations'] is not None:
+        run_batch(module, cluster, containerized)
+
     location_dict = module.params['location']
     location = sort_osd_crush_location(tuple(location_dict.items()), module)
-    containerized = module.params['containerized']
 
     result = dict(
         changed=False,
@@ -194,6 +267,52 @@ def run_module():
     module.exit_json(**result)
 
 
+def run_batch(module, cluster, containerized):
+    '''
+    Reconcile the CRUSH hierarchy with all the locations from a single
+    CRUSH map dump
+    '''
+    locations = [sort_osd_crush_location(tuple(location.items()), module)
+                 for location in module.params['locations']]
+
+    startd = datetime.datetime.now()
+
+    cmd = generate_crush_dump_cmd(cluster, containerized)
+    rc, out, err = module.run_command(cmd)
+    if rc != 0:
+        fatal("failed to dump the crush map: {}".format(err), module)
+
+    tree = get_crush_tree(json.loads(out))
+    cmd_list = []
+    for location in locations:
+        cmd_list.extend(create_and_move_buckets_list(cluster, location, containerized, tree, module))  # noqa E501
+
+    if cmd_list and not module.check_mode:
+        rc, cmd, out, err = exec_commands(module, cmd_list)
+    else:
+        out, err = '', ''
+
+    endd = datetime.datetime.now()
+    delta = endd - startd
+
+    result = dict(
+        cmd=cmd,
+        commands=[' '.join(c) for c in cmd_list],
+        start=str(startd),
+        end=str(endd),
+        delta=str(delta),
+        rc=rc,
+        stdout=out.rstrip("\r\n"),
+        stderr=err.rstrip("\r\n"),
+        changed=len(cmd_list) > 0,
+    )
+
+    if rc != 0:
+        module.fail_json(msg='non-zero return code', **result)
+
+    module.exit_json(**result)
+
+
 def main():
     run_module()
 
@@ -19,9 +19,9 @@ __metaclass__ = type
 
 from ansible.module_utils.basic import AnsibleModule
 try:
-    from ansible.module_utils.ca_common import is_containerized, container_exec, fatal
+    from ansible.module_utils.ca_common import is_containerized, container_exec, exec_command, fatal  # noqa: E501
 except ImportError:
-    from module_utils.ca_common import is_containerized, container_exec, fatal
+    from module_utils.ca_common import is_containerized, container_exec, exec_command, fatal  # noqa: E501
 import datetime
 import json
 import os
@@ -29,6 +29,7 @@ import struct
 import time
 import base64
 import socket
+import tempfile
 
 
 ANSIBLE_METADATA = {
@@ -59,7 +60,20 @@ options:
     name:
         description:
             - name of the CephX key
-        required: true
+            Mutually exclusive with 'keys'.
+        required: false
+    keys:
+        description:
+            - List of CephX keys to manage in a single invocation (only
+            with state 'present' or 'absent').
+            Each item accepts 'name', 'caps', 'secret' (or 'key') and 'mode'.
+            The cluster state is fetched once with 'auth ls', the keys
+            that need to be created or updated are imported at once and
+            the keyring of each entity is written in 'dest' (which must
+            be a directory).
+            Mutually exclusive with 'name'.
+        required: false
+        default: None
     user:
         description:
             - entity used to perform operation.
@@ -173,6 +187,11 @@ caps:
     caps: "{{ caps }}"
     import_key: False
 
+- name: create multiple cephx keys at once
+  ceph_key:
+    keys: "{{ keys_to_create }}"
+    state: present
+
 - name: delete cephx key
   ceph_key:
     name: "my_key"
@@ -250,7 +269,7 @@ def generate_caps(_type, caps):
     return caps_cli
 
 
-def generate_ceph_cmd(cluster, args, user, user_key_path, container_image=None):
+def generate_ceph_cmd(cluster, args, user, user_key_path, container_image=None, interactive=False):  # noqa: E501
     '''
     Generate 'ceph' command line to execute
     '''
@@ -258,7 +277,7 @@ def generate_ceph_cmd(cluster, args, user, user_key_path, container_image=None):
     if container_image:
         binary = 'ceph'
         cmd = container_exec(
-            binary, container_image)
+            binary, container_image, interactive=interactive)
     else:
         binary = ['ceph']
         cmd = binary
@@ -409,13 +428,189 @@ def list_keys(cluster, user, user_key_path, container_image=None):
     return cmd_list
 
 
+def import_keys(cluster, user, user_key_path, container_image=None):
+    '''
+    Import CephX key(s) from a keyring passed on stdin
+    '''
+
+    cmd_list = []
+
+    args = [
+        'import',
+        '-i',
+        '-',
+    ]
+
+    cmd_list.append(generate_ceph_cmd(
+        cluster, args, user, user_key_path, container_image, interactive=True))
+
+    return cmd_list
+
+
+def generate_keyring(name, secret, caps):
+    '''
+    Generate the keyring content of an entity (same format as 'ceph auth get')
+    '''
+
+    keyring = ['[{}]'.format(name), '\tkey = {}'.format(secret)]
+    for k in sorted(caps.keys()):
+        if len(k) == 0:
+            continue
+        keyring.append('\tcaps {} = "{}"'.format(k, caps[k]))
+
+    return '\n'.join(keyring) + '\n'
+
+
+def lookup_auth_entities(module, out):
+    '''
+    Index the auth map by entity
+    '''
+
+    try:
+        out_dict = json.loads(out)
+    except ValueError as e:
+        fatal("Could not decode 'ceph auth list' json output: {}".format(e), module)  # noqa E501
+
+    if "auth_dump" not in out_dict:
+        fatal("'auth_dump' key not present in json output:", module)  # noqa E501
+
+    entities = {}
+    for entity in out_dict["auth_dump"]:
+        entities[entity['entity']] = dict(key=entity.get('key'),
+                                          caps=entity.get('caps', {}))
+
+    return entities
+
+
+def write_keyring(module, path, keyring, file_args):
+    '''
+    Write a keyring on the filesystem if its content differs
+    '''
+
+    changed = False
+    current = None
+    if os.path.isfile(path):
+        with open(path) as f:
+            current = f.read()
+
+    if current != keyring:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'w') as f:
+            f.write(keyring)
+        module.atomic_move(tmp_path, path)
+        changed = True
+
+    file_args['path'] = path
+
+    return module.set_fs_attributes_if_different(file_args, changed)
+
+
+def run_batch(module, cluster, state, user, user_key_path, import_key, dest, startd, container_image=None):  # noqa: E501
+    '''
+    Reconcile all the keys passed with the 'keys' parameter
+    '''
+
+    if state not in ['present', 'absent']:
+        fatal("'keys' is only supported with state 'present' or 'absent'", module)  # noqa E501
+    if state == 'present' and not os.path.isdir(dest):
+        fatal("'dest' must be a directory when 'keys' is used", module)
+
+    keys = []
+    for item in module.params.get('keys'):
+        keys.append(dict(name=item['name'],
+                         caps=item.get('caps') or None,
+                         secret=item.get('secret') or item.get('key') or None,
+                         mode=item.get('mode')))
+
+    rc, cmd, out, err = 0, '', '', ''
+    entities = {}
+    if import_key or state == 'absent':
+        rc, cmd, out, err = exec_commands(
+            module, list_keys(cluster, user, user_key_path, container_image))
+        if rc != 0:
+            module.fail_json(msg="failed to retrieve ceph keys", cmd=cmd,
+                             rc=rc, stdout=out, stderr=err)
+        entities = lookup_auth_entities(module, out)
+
+    results = []
+    to_import = []
+    for key in keys:
+        name = key['name']
+        result = dict(name=name, changed=False, mode=key['mode'])
+        current = entities.get(name)
+
+        if state == 'absent':
+            if current is not None:
+                _rc, _cmd, _out, _err = exec_commands(
+                    module, delete_key(cluster, user, user_key_path, name, container_image))  # noqa: E501
+                result.update(rc=_rc, changed=_rc == 0, stderr=_err.rstrip("\r\n"))  # noqa: E501
+                if _rc != 0 and rc == 0:
+                    rc, cmd, err = _rc, _cmd, _err
+            results.append(result)
+            continue
+
+        if current is not None:
+            secret = key['secret'] or current['key']
+            caps = key['caps'] or current['caps']
+            result['changed'] = secret != current['key'] or caps != current['caps']  # noqa: E501
+        elif not import_key and not (key['secret'] and key['caps']):
+            result['stdout'] = "{0} requires secret *and* caps when import_key is {1}".format(name, import_key)  # noqa: E501
+            results.append(result)
+            continue
+        elif not key['caps']:
+            fatal("Capabilities must be provided for {} when state is 'present'".format(name), module)  # noqa E501
+        else:
+            secret = key['secret'] or generate_secret().decode()
+            caps = key['caps']
+            result['changed'] = True
+
+        result['keyring'] = generate_keyring(name, secret, caps)
+        result['path'] = os.path.join(dest, '{}.{}.keyring'.format(cluster, name))  # noqa: E501
+        if result['changed'] and import_key:
+            to_import.append(result['keyring'])
+        results.append(result)
+
+    if to_import:
+        # a single import for all the keys that need to be created or updated
+        rc, cmd, out, err = exec_command(
+            module, import_keys(cluster, user, user_key_path, container_image)[0],  # noqa: E501
+            stdin=''.join(to_import))
+        if rc != 0:
+            module.fail_json(msg="Couldn't create or update the keys", cmd=cmd,
+                             rc=rc, stdout=out, stderr=err)
+
+    for result in results:
+        if 'keyring' not in result:
+            continue
+        file_args = module.load_file_common_arguments(module.params)
+        if result['mode']:
+            file_args['mode'] = result['mode']
+        if write_keyring(module, result['path'], result['keyring'], file_args):
+            result['changed'] = True
+
+    endd = datetime.datetime.now()
+    delta = endd - startd
+
+    module.exit_json(
+        cmd=cmd,
+        start=str(startd),
+        end=str(endd),
+        delta=str(delta),
+        rc=rc,
+        stdout=out.rstrip("\r\n"),
+        stderr=err.rstrip("\r\n"),
+        changed=any(r['changed'] for r in results),
+        results=results,
+    )
+
+
 def exec_commands(module, cmd_list):
     '''
     Execute command(s)
     '''
 
     for cmd in cmd_list:
-        rc, out, err = module.run_command(cmd)
+        rc, cmd, out, err = exec_command(module, cmd)
         if rc != 0:
             return rc, cmd, out, err
 
@@ -481,6 +676,13 @@ def run_module():
     module_args = dict(
         cluster=dict(type='str', required=False, default='ceph'),
         name=dict(type='str', required=False),
+        keys=dict(type='list', elements='dict', required=False, no_log=False, options=dict(
+            name=dict(type='str', required=True),
+            caps=dict(type='dict', required=False),
+            key=dict(type='str', required=False, no_log=True),
+            secret=dict(type='str', required=False, no_log=True),
+            mode=dict(type='raw', required=False),
+        )),
         state=dict(type='str', required=False, default='present', choices=['present', 'update', 'absent',
                                                                            'list', 'info', 'fetch_initial_keys', 'generate_secret']),
         caps=dict(type='dict', required=False, default=None),
@@ -496,6 +698,7 @@ def run_module():
         argument_spec=module_args,
         supports_check_mode=True,
         add_file_common_args=True,
+        mutually_exclusive=[['name', 'keys']],
     )
 
     file_args = module.load_file_common_arguments(module.params)
@@ -546,6 +749,10 @@ def run_module():
     else:
         user_key_path = user_key
 
+    if module.params.get('keys'):
+        run_batch(module, cluster, state, user, user_key_path, import_key,
+                  dest, startd, container_image)
+
     if (state in ["present", "update"]):
         # if dest is not a directory, the user wants to change the file's name
         # (e,g: /etc/ceph/ceph.mgr.ceph-mon2.keyring)
@@ -17,10 +17,13 @@ __metaclass__ = type
 
 from ansible.module_utils.basic import AnsibleModule
 try:
-    from ansible.module_utils.ca_common import exit_module, generate_ceph_cmd, is_containerized
+    from ansible.module_utils.ca_common import exit_module, exec_command, generate_ceph_cmd, is_containerized
 except ImportError:
-    from module_utils.ca_common import exit_module, generate_ceph_cmd, is_containerized
+    from module_utils.ca_common import exit_module, exec_command, generate_ceph_cmd, is_containerized
+from multiprocessing.pool import ThreadPool
 import datetime
+import json
+import time
 
 
 ANSIBLE_METADATA = {
@@ -36,11 +39,22 @@ short_description: Manage Ceph MGR module
 version_added: "2.8"
 description:
     - Manage Ceph MGR module
+    - With C(modules), the enabled modules are compared to a single
+      'mgr module ls' and all the changes are sent at once so they land
+      in the same mgr map and the active MGR respawns once. The module
+      then waits for the MGR to be available again.
 options:
     name:
         description:
             - name of the ceph MGR module.
-        required: true
+            Mutually exclusive with C(modules).
+        required: false
+    modules:
+        description:
+            - The full list of the MGR modules to enable, the other
+            enabled modules are disabled (the always-on modules are left
+            untouched). Mutually exclusive with C(name).
+        required: false
     cluster:
         description:
             - The ceph cluster name.
@@ -53,6 +67,28 @@ options:
         required: false
         choices: ['enable', 'disable']
         default: enable
+    wait:
+        description:
+            - With C(modules), wait for the MGR to be available before
+            the changes and again after them.
+        required: false
+        default: true
+    timeout:
+        description:
+            - How long to wait for the MGR to be available, in seconds.
+        required: false
+        default: 300
+    delay:
+        description:
+            - Initial delay in seconds between two polls of the MGR map,
+            it doubles up to C(max_delay).
+        required: false
+        default: 1
+    max_delay:
+        description:
+            - Maximum delay in seconds between two polls of the MGR map.
+        required: false
+        default: 10
 author:
     - Dimitri Savineau <dsavinea@redhat.com>
 '''
@@ -70,19 +106,243 @@ EXAMPLES = '''
   loop:
     - 'dashboard'
     - 'prometheus'
+
+- name: enable only the dashboard and prometheus mgr modules
+  ceph_mgr_module:
+    modules:
+      - 'dashboard'
+      - 'prometheus'
 '''
 
 RETURN = '''#  '''
 
+BACKOFF_FACTOR = 2
+
+
+def list_modules(cluster, container_image=None):
+    '''
+    List the MGR modules
+    '''
+
+    return generate_ceph_cmd(['mgr', 'module'], ['ls', '--format=json'], cluster=cluster, container_image=container_image)
+
+
+def dump_mgr(cluster, container_image=None):
+    '''
+    Dump the MGR map
+    '''
+
+    return generate_ceph_cmd(['mgr'], ['dump', '--format=json'], cluster=cluster, container_image=container_image)
+
+
+def always_on_modules(modules):
+    '''
+    Return the always-on modules of a 'mgr module ls' output, this is a
+    list before octopus and a list per release afterwards
+    '''
+
+    always_on = modules.get('always_on_modules', [])
+    if isinstance(always_on, dict):
+        return set(name for names in always_on.values() for name in names)
+
+    return set(always_on)
+
+
+def plan_modules(modules, desired):
+    '''
+    Return the modules to disable and to enable
+    '''
+
+    enabled = modules.get('enabled_modules', [])
+    always_on = always_on_modules(modules)
+
+    to_disable = [name for name in enabled if name not in desired]
+    to_enable = [name for name in desired if name not in enabled and name not in always_on]
+
+    return to_disable, to_enable
+
+
+def get_mgr_map(module, cluster, container_image=None):
+    '''
+    Return the MGR map, None if it can't be retrieved
+    '''
+
+    rc, cmd, out, err = exec_command(module, dump_mgr(cluster, container_image=container_image))
+    if rc != 0:
+        return None
+
+    try:
+        return json.loads(out)
+    except ValueError:
+        return None
+
+
+def poll_mgr_map(module, cluster, condition, container_image=None):
+    '''
+    Poll the MGR map until condition(mgr_map) is true or the timeout
+    expires.
+    Returns the last MGR map, whether the condition is met and the number
+    of polls.
+    '''
+
+    deadline = time.time() + module.params.get('timeout')
+    delay = module.params.get('delay')
+    polls = 0
+
+    while True:
+        mgr_map = get_mgr_map(module, cluster, container_image=container_image)
+        polls += 1
+        if mgr_map is not None and condition(mgr_map):
+            return mgr_map, True, polls
+
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return mgr_map, False, polls
+
+        time.sleep(min(delay, remaining))
+        delay = min(delay * BACKOFF_FACTOR, module.params.get('max_delay'))
+
+
+def wait_for_modules(module, cluster, modules, always_on=(), container_image=None):
+    '''
+    Poll the MGR map until its enabled modules are exactly the given ones,
+    the always-on modules aside.
+    Returns the epoch of that MGR map and the number of polls, the epoch
+    is None on timeout.
+    '''
+
+    expected = set(modules) - set(always_on)
+    mgr_map, met, polls = poll_mgr_map(module, cluster,
+                                       lambda mgr_map: set(mgr_map.get('modules', [])) - set(always_on) == expected,
+                                       container_image=container_image)
+
+    return mgr_map['epoch'] if met else None, polls
+
+
+def wait_for_mgr(module, cluster, previous_gid=None, epoch=0, container_image=None):
+    '''
+    Poll the MGR map until the MGR is available. When previous_gid is set,
+    the MGR must have respawned first, in a MGR map at least as recent as
+    epoch: the map can still report the previous MGR as available for a
+    few seconds after the changes.
+    Returns the MGR map and the number of polls, the MGR map is None on
+    timeout.
+    '''
+
+    def respawned(mgr_map):
+        return mgr_map.get('available') and mgr_map.get('epoch', 0) >= epoch and \
+            (previous_gid is None or mgr_map.get('active_gid') != previous_gid)
+
+    mgr_map, met, polls = poll_mgr_map(module, cluster, respawned, container_image=container_image)
+    if met:
+        return mgr_map, polls
+
+    # the MGR didn't respawn but it is available
+    if previous_gid is not None and mgr_map is not None and mgr_map.get('available') and \
+            mgr_map.get('epoch', 0) >= epoch:
+        module.warn('the active MGR is available but did not respawn after the changes')
+        return mgr_map, polls
+
+    return None, polls
+
+
+def set_modules(module, cluster, to_disable, to_enable, container_image=None):
+    '''
+    Send all the enable/disable commands concurrently so the MGR monitor
+    batches them in the same MGR map update
+    '''
+
+    cmds = [generate_ceph_cmd(['mgr', 'module'], ['disable', name], cluster=cluster, container_image=container_image) for name in to_disable]
+    cmds.extend(generate_ceph_cmd(['mgr', 'module'], ['enable', name], cluster=cluster, container_image=container_image) for name in to_enable)
+
+    pool = ThreadPool(len(cmds))
+    try:
+        return pool.map(lambda cmd: exec_command(module, cmd), cmds)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def run_modules(module, cluster, startd, container_image=None):
+    '''
+    Enable exactly the modules passed with the 'modules' parameter
+    '''
+
+    desired = module.params.get('modules')
+    wait = module.params.get('wait')
+
+    rc, cmd, out, err = exec_command(module, list_modules(cluster, container_image=container_image))
+    if rc != 0:
+        module.fail_json(msg='failed to list the mgr modules', cmd=cmd, rc=rc, stdout=out, stderr=err)
+
+    modules = json.loads(out)
+    enabled = modules.get('enabled_modules', [])
+    to_disable, to_enable = plan_modules(modules, desired)
+    changed = bool(to_disable or to_enable)
+
+    result = dict(
+        cmd=[],
+        disabled=to_disable,
+        enabled=to_enable,
+        rc=0,
+        stdout='',
+        stderr='',
+        changed=changed,
+        polls=0,
+    )
+
+    previous_gid = None
+    if wait and not module.check_mode:
+        # the modules can only be enabled once the MGR has reported them
+        mgr_map, polls = wait_for_mgr(module, cluster, container_image=container_image)
+        result['polls'] += polls
+        if mgr_map is None:
+            module.fail_json(msg='timed out waiting for the mgr to be available', **result)
+        previous_gid = mgr_map.get('active_gid')
+
+    if changed and not module.check_mode:
+        for _rc, _cmd, _out, _err in set_modules(module, cluster, to_disable, to_enable, container_image=container_image):
+            result['cmd'].append(_cmd)
+            if _rc != 0 and result['rc'] == 0:
+                result.update(rc=_rc, stdout=_out.rstrip("\r\n"), stderr=_err.rstrip("\r\n"))
+
+        if result['rc'] != 0:
+            module.fail_json(msg='failed to enable or disable the mgr modules', **result)
+
+        if wait:
+            # the MGR respawns once it gets the MGR map with the new modules
+            epoch, polls = wait_for_modules(module, cluster, set(enabled) - set(to_disable) | set(to_enable),
+                                            always_on=always_on_modules(modules), container_image=container_image)
+            result['polls'] += polls
+            if epoch is None:
+                module.fail_json(msg='timed out waiting for the mgr map to have the new modules', **result)
+
+            mgr_map, polls = wait_for_mgr(module, cluster, previous_gid=previous_gid, epoch=epoch, container_image=container_image)
+            result['polls'] += polls
+            if mgr_map is None:
+                module.fail_json(msg='timed out waiting for the mgr to be available', **result)
+
+    endd = datetime.datetime.now()
+    delta = endd - startd
+
+    module.exit_json(start=str(startd), end=str(endd), delta=str(delta), **result)
+
 
 def main():
     module = AnsibleModule(
         argument_spec=dict(
-            name=dict(type='str', required=True),
+            name=dict(type='str', required=False),
+            modules=dict(type='list', elements='str', required=False),
             cluster=dict(type='str', required=False, default='ceph'),
             state=dict(type='str', required=False, default='enable', choices=['enable', 'disable']),
+            wait=dict(type='bool', required=False, default=True),
+            timeout=dict(type='int', required=False, default=300),
+            delay=dict(type='float', required=False, default=1),
+            max_delay=dict(type='float', required=False, default=10),
         ),
         supports_check_mode=True,
+        required_one_of=[['name', 'modules']],
+        mutually_exclusive=[['name', 'modules']],
     )
 
     name = module.params.get('name')
@@ -93,6 +353,9 @@ def main():
 
     container_image = is_containerized()
 
+    if module.params.get('modules') is not None:
+        run_modules(module, cluster, startd, container_image=container_image)
+
     cmd = generate_ceph_cmd(['mgr', 'module'], [state, name], cluster=cluster, container_image=container_image)
 
     if module.check_mode:
@@ -106,7 +369,7 @@ def main():
             changed=False
         )
     else:
-        rc, out, err = module.run_command(cmd)
+        rc, cmd, out, err = exec_command(module, cmd)
         if out == "module '{}' is already enabled".format(name):
             changed = False
         else:
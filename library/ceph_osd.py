@@ -17,9 +17,9 @@ __metaclass__ = type
 
 from ansible.module_utils.basic import AnsibleModule
 try:
-    from ansible.module_utils.ca_common import exit_module, generate_ceph_cmd, is_containerized
+    from ansible.module_utils.ca_common import exit_module, exec_command, generate_ceph_cmd, is_containerized
 except ImportError:
-    from module_utils.ca_common import exit_module, generate_ceph_cmd, is_containerized
+    from module_utils.ca_common import exit_module, exec_command, generate_ceph_cmd, is_containerized
 import datetime
 
 
@@ -40,6 +40,8 @@ options:
     ids:
         description:
             - The ceph OSD id(s).
+            - Multiple OSDs are destroyed or purged one after the other, the
+              first failure stops the batch.
         required: true
     cluster:
         description:
@@ -81,6 +83,11 @@ EXAMPLES = '''
     ids: 42
     state: purge
 
+- name: purge multiple OSDs
+  ceph_osd:
+    ids: [0, 1, 3]
+    state: purge
+
 - name: rm OSD 42
   ceph_osd:
     ids: 42
@@ -90,6 +97,23 @@ EXAMPLES = '''
 RETURN = '''#  '''
 
 
+def exec_batch(module, cmds):
+    '''
+    Execute the commands one after the other, stop on the first failure
+    '''
+
+    outs = []
+    errs = []
+    for cmd in cmds:
+        rc, cmd, out, err = exec_command(module, cmd)
+        outs.append(out.rstrip('\r\n'))
+        errs.append(err.rstrip('\r\n'))
+        if rc != 0:
+            break
+
+    return rc, '\n'.join(o for o in outs if o), '\n'.join(e for e in errs if e)
+
+
 def main():
     module = AnsibleModule(
         argument_spec=dict(
@@ -104,17 +128,17 @@ def main():
     cluster = module.params.get('cluster')
     state = module.params.get('state')
 
-    if state in ['destroy', 'purge'] and len(ids) > 1:
-        module.fail_json(msg='destroy and purge only support one OSD at at time', rc=1)
-
     startd = datetime.datetime.now()
 
     container_image = is_containerized()
 
-    cmd = generate_ceph_cmd(['osd', state], ids, cluster=cluster, container_image=container_image)
-
     if state in ['destroy', 'purge']:
-        cmd.append('--yes-i-really-mean-it')
+        # destroy and purge only support one OSD per command
+        cmds = [generate_ceph_cmd(['osd', state], [osd_id, '--yes-i-really-mean-it'], cluster=cluster, container_image=container_image) for osd_id in ids]
+    else:
+        cmds = [generate_ceph_cmd(['osd', state], ids, cluster=cluster, container_image=container_image)]
+
+    cmd = cmds[0] if len(cmds) == 1 else cmds
 
     if module.check_mode:
         exit_module(
@@ -127,7 +151,10 @@ def main():
             changed=False
         )
     else:
-        rc, out, err = module.run_command(cmd)
+        if len(cmds) == 1:
+            rc, cmd, out, err = exec_command(module, cmd)
+        else:
+            rc, out, err = exec_batch(module, cmds)
         changed = True
         if state in ['down', 'in', 'out'] and 'marked' not in err:
             changed = False
@@ -0,0 +1,245 @@
+# Copyright 2020, Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+from ansible.module_utils.basic import AnsibleModule
+try:
+    from ansible.module_utils.ca_common import exec_command, generate_ceph_cmd, is_containerized
+except ImportError:
+    from module_utils.ca_common import exec_command, generate_ceph_cmd, is_containerized
+import datetime
+import json
+
+
+ANSIBLE_METADATA = {
+    'metadata_version': '1.1',
+    'status': ['preview'],
+    'supported_by': 'community'
+}
+
+DOCUMENTATION = '''
+---
+module: ceph_osd_facts
+short_description: Gather the Ceph OSDs facts
+version_added: "2.8"
+description:
+    - Gather the metadata, the CRUSH location and the state of the OSDs
+      with a single 'osd metadata', 'osd tree' and 'osd dump' for all the
+      OSDs, and index them by OSD id and by host.
+options:
+    cluster:
+        description:
+            - The ceph cluster name.
+        required: false
+        default: ceph
+    ids:
+        description:
+            - Only gather the facts of these OSD ids. The module fails if one
+            of them doesn't exist.
+        required: false
+    hosts:
+        description:
+            - Only gather the facts of the OSDs of these hosts.
+        required: false
+author:
+    - Dimitri Savineau <dsavinea@redhat.com>
+'''
+
+EXAMPLES = '''
+- name: gather the facts of the osds of this host
+  ceph_osd_facts:
+    hosts: "{{ [ansible_hostname] }}"
+  delegate_to: "{{ groups[mon_group_name][0] }}"
+
+- name: gather the facts of osd.0 and osd.1
+  ceph_osd_facts:
+    ids: [0, 1]
+'''
+
+RETURN = '''
+ansible_facts:
+    description: the OSDs facts
+    returned: always
+    type: complex
+    contains:
+        ceph_osds:
+            description: the OSDs, indexed by id
+            type: dict
+            sample: {"0": {"id": 0, "host": "osd0", "hostname": "osd0",
+                     "up": true, "in": true, "uuid": "a0b1c2d3-...",
+                     "objectstore": "bluestore", "device_class": "hdd",
+                     "crush_weight": 0.0488, "reweight": 1.0,
+                     "devices": ["sdb"], "ceph_version": "15.2.8"}}
+        ceph_osd_hosts:
+            description: the OSDs ids and objectstores, indexed by host
+            type: dict
+            sample: {"osd0": {"ids": [0, 3], "objectstores": ["bluestore"]}}
+'''
+
+
+def generate_osd_cmd(cluster, sub_cmd, container_image=None):
+    '''
+    Generate an 'osd' command with a json output
+    '''
+
+    args = [sub_cmd, '--format=json']
+
+    cmd = generate_ceph_cmd(['osd'], args, cluster=cluster, container_image=container_image)
+
+    return cmd
+
+
+def get_osd_json(module, cluster, sub_cmd, container_image=None):
+    '''
+    Run an 'osd' command and return its decoded output
+    '''
+
+    rc, cmd, out, err = exec_command(module, generate_osd_cmd(cluster, sub_cmd, container_image=container_image))
+    if rc != 0:
+        module.fail_json(msg='failed to get the osd {}'.format(sub_cmd), cmd=cmd,
+                         rc=rc, stdout=out, stderr=err)
+
+    return cmd, json.loads(out)
+
+
+def build_osd_facts(metadata, tree, dump):
+    '''
+    Merge the outputs of 'osd metadata', 'osd tree' and 'osd dump'
+    into a dict of OSDs indexed by id
+    '''
+
+    metadata = dict((m['id'], m) for m in metadata)
+    nodes = dict((node['id'], node) for node in tree.get('nodes', []) + tree.get('stray', []))
+
+    hosts = {}
+    for node in tree.get('nodes', []):
+        if node['type'] == 'host':
+            for child in node.get('children', []):
+                hosts[child] = node['name']
+
+    osds = {}
+    for osd in dump.get('osds', []):
+        osd_id = osd['osd']
+        meta = metadata.get(osd_id, {})
+        node = nodes.get(osd_id, {})
+        devices = meta.get('devices')
+        osds[str(osd_id)] = {
+            'id': osd_id,
+            'host': hosts.get(osd_id),
+            'hostname': meta.get('hostname'),
+            'up': bool(osd.get('up')),
+            'in': bool(osd.get('in')),
+            'uuid': osd.get('uuid'),
+            'objectstore': meta.get('osd_objectstore'),
+            'device_class': node.get('device_class'),
+            'crush_weight': node.get('crush_weight'),
+            'reweight': osd.get('weight'),
+            'devices': devices.split(',') if devices else [],
+            'ceph_version': meta.get('ceph_version_short', meta.get('ceph_version')),
+        }
+
+    return osds
+
+
+def build_host_facts(osds):
+    '''
+    Index the OSDs ids and objectstores by host, the CRUSH host when the
+    OSD is in the CRUSH map, the hostname reported by the OSD otherwise
+    '''
+
+    hosts = {}
+    for osd in sorted(osds.values(), key=lambda o: o['id']):
+        host = osd['host'] or osd['hostname']
+        if host is None:
+            continue
+        facts = hosts.setdefault(host, dict(ids=[], objectstores=[]))
+        facts['ids'].append(osd['id'])
+        if osd['objectstore'] and osd['objectstore'] not in facts['objectstores']:
+            facts['objectstores'].append(osd['objectstore'])
+
+    return hosts
+
+
+def filter_osds(module, osds, ids, hosts):
+    '''
+    Keep the requested OSDs only
+    '''
+
+    if ids:
+        missing = [str(i) for i in ids if str(i) not in osds]
+        if missing:
+            module.fail_json(msg='osd(s) {} not found'.format(', '.join(missing)), rc=2)
+        osds = dict((str(i), osds[str(i)]) for i in ids)
+
+    if hosts:
+        osds = dict((k, v) for k, v in osds.items()
+                    if v['host'] in hosts or v['hostname'] in hosts)
+
+    return osds
+
+
+def run_module():
+    module_args = dict(
+        cluster=dict(type='str', required=False, default='ceph'),
+        ids=dict(type='list', elements='str', required=False, default=[]),
+        hosts=dict(type='list', elements='str', required=False, default=[]),
+    )
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=True,
+    )
+
+    cluster = module.params.get('cluster')
+    ids = module.params.get('ids')
+    hosts = module.params.get('hosts')
+
+    startd = datetime.datetime.now()
+
+    container_image = is_containerized()
+
+    cmds = []
+    outputs = {}
+    for sub_cmd in ['metadata', 'tree', 'dump']:
+        cmd, outputs[sub_cmd] = get_osd_json(module, cluster, sub_cmd, container_image=container_image)
+        cmds.append(cmd)
+
+    osds = build_osd_facts(outputs['metadata'], outputs['tree'], outputs['dump'])
+    osds = filter_osds(module, osds, ids, hosts)
+
+    endd = datetime.datetime.now()
+    delta = endd - startd
+
+    module.exit_json(
+        cmd=cmds,
+        start=str(startd),
+        end=str(endd),
+        delta=str(delta),
+        rc=0,
+        changed=False,
+        ansible_facts=dict(
+            ceph_osds=osds,
+            ceph_osd_hosts=build_host_facts(osds),
+        ),
+    )
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,289 @@
+# Copyright 2020, Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+from ansible.module_utils.basic import AnsibleModule
+try:
+    from ansible.module_utils.ca_common import exec_command, generate_ceph_cmd, is_containerized, fatal
+except ImportError:
+    from module_utils.ca_common import exec_command, generate_ceph_cmd, is_containerized, fatal
+import datetime
+import json
+
+
+ANSIBLE_METADATA = {
+    'metadata_version': '1.1',
+    'status': ['preview'],
+    'supported_by': 'community'
+}
+
+DOCUMENTATION = '''
+---
+module: ceph_osd_upgrade_batches
+short_description: Group OSD hosts sharing a failure domain
+version_added: "2.8"
+description:
+    - Group the OSD hosts into batches that can be upgraded at the same time.
+      The hosts of a batch share the same failure domain, i.e. the smallest
+      CRUSH bucket type used by the CRUSH rules of the pools to spread the
+      data, so stopping a whole batch never stops more than one replica (or
+      chunk) of a placement group.
+    - Each batch is confirmed with 'ceph osd ok-to-stop', a batch that isn't
+      ok to stop is split into one batch per host.
+    - This module doesn't change anything in the cluster.
+options:
+    hosts:
+        description:
+            - Dict of the OSD hosts, the key is the inventory hostname and the
+              value is the name of the host bucket in the CRUSH map. The order
+              of the hosts is kept within the batches.
+        required: true
+    cluster:
+        description:
+            - The ceph cluster name.
+        required: false
+        default: ceph
+    failure_domain:
+        description:
+            - The CRUSH bucket type used to group the hosts. By default, this
+              is the smallest bucket type used by the CRUSH rules of the pools.
+        required: false
+    max_batch_size:
+        description:
+            - The maximum number of hosts in a batch, 0 means no limit.
+        required: false
+        default: 0
+    max_osds:
+        description:
+            - The maximum number of OSDs of a batch, i.e. the number of OSDs
+              stopped at the same time, 0 means no limit. A host having more
+              OSDs than this is alone in its batch.
+        required: false
+        default: 0
+'''
+
+EXAMPLES = '''
+- name: group the osd hosts by failure domain
+  ceph_osd_upgrade_batches:
+    hosts:
+      osd0: osd0
+      osd1: osd1
+      osd2: osd2
+  register: batches
+
+- name: group the osd hosts by rack, 4 hosts at most
+  ceph_osd_upgrade_batches:
+    hosts: "{{ dict(groups['osds'] | zip(groups['osds'] | map('extract', hostvars, 'ansible_hostname'))) }}"
+    failure_domain: rack
+    max_batch_size: 4
+
+- name: group the osd hosts, 12 osds at most per batch
+  ceph_osd_upgrade_batches:
+    hosts: "{{ dict(groups['osds'] | zip(groups['osds'])) }}"
+    failure_domain: rack
+    max_osds: 12
+'''
+
+RETURN = '''
+batches:
+    description: list of batches of inventory hostnames
+    returned: always
+    type: list
+    sample: [["osd0", "osd1"], ["osd2"]]
+batch_sizes:
+    description: size of each batch, to be used as a play 'serial' value
+    returned: always
+    type: list
+    sample: [2, 1]
+hosts:
+    description: the inventory hostnames, ordered by batch
+    returned: always
+    type: list
+    sample: ["osd0", "osd1", "osd2"]
+failure_domain:
+    description: the CRUSH bucket type used to group the hosts
+    returned: always
+    type: str
+    sample: rack
+'''
+
+CHOOSE_OPS = ['choose_firstn', 'choose_indep', 'chooseleaf_firstn', 'chooseleaf_indep']
+
+
+def run_ceph_json(module, cluster, sub_cmd, args, container_image=None):
+    '''
+    Run a ceph command and decode its json output
+    '''
+
+    cmd = generate_ceph_cmd(sub_cmd, args + ['--format', 'json'], cluster=cluster, container_image=container_image)  # noqa: E501
+    rc, cmd, out, err = exec_command(module, cmd)
+    if rc != 0:
+        fatal("'{}' failed: {}".format(' '.join(cmd), err), module)
+
+    try:
+        return json.loads(out)
+    except ValueError as e:
+        fatal("Could not decode '{}' json output: {}".format(' '.join(cmd), e), module)  # noqa: E501
+
+
+def get_failure_domain(crush_dump, pools):
+    '''
+    Return the smallest bucket type used by the CRUSH rules of the pools
+    (or by all the rules if there's no pool)
+    '''
+
+    type_ids = dict((t['name'], t['type_id']) for t in crush_dump.get('types', []))  # noqa: E501
+    used_rules = set(pool['crush_rule'] for pool in pools)
+
+    failure_domain = None
+    for rule in crush_dump.get('rules', []):
+        if used_rules and rule['rule_id'] not in used_rules:
+            continue
+        for step in rule.get('steps', []):
+            if step['op'] not in CHOOSE_OPS:
+                continue
+            if failure_domain is None or type_ids.get(step['type'], 0) < type_ids.get(failure_domain, 0):  # noqa: E501
+                failure_domain = step['type']
+
+    return failure_domain or 'host'
+
+
+def get_host_domains(crush_dump, failure_domain):
+    '''
+    Return the failure domain bucket and the OSD ids of each host bucket.
+    The failure domain of a host is the host itself when the failure
+    domain isn't above the host buckets.
+    '''
+
+    buckets = dict((b['id'], b) for b in crush_dump.get('buckets', []))
+    parents = {}
+    for bucket in buckets.values():
+        for item in bucket.get('items', []):
+            parents[item['id']] = bucket['id']
+
+    hosts = {}
+    for bucket in buckets.values():
+        if bucket['type_name'] != 'host':
+            continue
+        domain = bucket['name']
+        parent = parents.get(bucket['id'])
+        while parent is not None:
+            if buckets[parent]['type_name'] == failure_domain:
+                domain = buckets[parent]['name']
+                break
+            parent = parents.get(parent)
+        osds = [item['id'] for item in bucket.get('items', []) if item['id'] >= 0]
+        hosts[bucket['name']] = dict(domain=domain, osds=osds)
+
+    return hosts
+
+
+def generate_batches(hosts, host_domains, max_batch_size=0, max_osds=0):
+    '''
+    Group the hosts by failure domain, keeping the order of the hosts.
+    Hosts without CRUSH host bucket or without OSD are alone in their batch,
+    their failure domain is unknown.
+    Returns a list of (inventory hostnames, OSD ids)
+    '''
+
+    batches = []
+    domains = {}
+    for name, crush_host in hosts.items():
+        info = host_domains.get(crush_host)
+        domain = info['domain'] if info and info['osds'] else None
+        osds = info['osds'] if info else []
+        if domain is None:
+            batches.append(([name], osds))
+            continue
+        if domain not in domains or \
+                (max_batch_size and len(domains[domain][0]) >= max_batch_size) or \
+                (max_osds and domains[domain][1] and len(domains[domain][1]) + len(osds) > max_osds):  # noqa: E501
+            domains[domain] = ([], [])
+            batches.append(domains[domain])
+        domains[domain][0].append(name)
+        domains[domain][1].extend(osds)
+
+    return batches
+
+
+def ok_to_stop(module, cluster, osds, container_image=None):
+    '''
+    Check if the OSDs can be stopped without reducing data availability
+    '''
+
+    if not osds:
+        return True
+
+    cmd = generate_ceph_cmd(['osd', 'ok-to-stop'], [str(osd) for osd in osds], cluster=cluster, container_image=container_image)  # noqa: E501
+    rc, cmd, out, err = exec_command(module, cmd)
+
+    return rc == 0
+
+
+def main():
+    module = AnsibleModule(
+        argument_spec=dict(
+            hosts=dict(type='dict', required=True),
+            cluster=dict(type='str', required=False, default='ceph'),
+            failure_domain=dict(type='str', required=False),
+            max_batch_size=dict(type='int', required=False, default=0),
+            max_osds=dict(type='int', required=False, default=0),
+        ),
+        supports_check_mode=True,
+    )
+
+    hosts = module.params.get('hosts')
+    cluster = module.params.get('cluster')
+    failure_domain = module.params.get('failure_domain')
+    max_batch_size = module.params.get('max_batch_size')
+    max_osds = module.params.get('max_osds')
+
+    startd = datetime.datetime.now()
+
+    container_image = is_containerized()
+
+    crush_dump = run_ceph_json(module, cluster, ['osd', 'crush'], ['dump'], container_image)  # noqa: E501
+    if not failure_domain:
+        pools = run_ceph_json(module, cluster, ['osd', 'pool'], ['ls', 'detail'], container_image)  # noqa: E501
+        failure_domain = get_failure_domain(crush_dump, pools)
+
+    host_domains = get_host_domains(crush_dump, failure_domain)
+
+    batches = []
+    for names, osds in generate_batches(hosts, host_domains, max_batch_size, max_osds):
+        if len(names) == 1 or ok_to_stop(module, cluster, osds, container_image):  # noqa: E501
+            batches.append(names)
+        else:
+            # one host at a time
+            batches.extend([name] for name in names)
+
+    endd = datetime.datetime.now()
+    delta = endd - startd
+
+    module.exit_json(
+        changed=False,
+        start=str(startd),
+        end=str(endd),
+        delta=str(delta),
+        failure_domain=failure_domain,
+        batches=batches,
+        batch_sizes=[len(batch) for batch in batches],
+        hosts=[name for batch in batches for name in batch],
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -64,7 +64,20 @@ options:
     name:
         description:
             - name of the Ceph pool
-        required: true
+            Mutually exclusive with 'pools'.
+        required: false
+    pools:
+        description:
+            - List of pools to manage in a single invocation.
+            Each item accepts the same options as the module ('name' is
+            required, 'type' is an alias of 'pool_type'), unknown keys
+            are ignored. The options set at the module level are used as
+            default values.
+            The state of all the pools is fetched once with
+            'osd pool ls detail' and only the needed commands are issued.
+            Mutually exclusive with 'name'.
+        required: false
+        default: None
     state:
         description:
             If 'present' is used, the module creates a pool if it doesn't exist
@@ -150,10 +163,20 @@ pools:
         pool_type: "{{ item.pool_type }}"
         pg_autoscale_mode: "{{ item.pg_autoscale_mode }}"
       with_items: "{{ pools }}"
+
+    - name: create all the pools at once
+      ceph_pool:
+        pools: "{{ pools }}"
+        state: present
 '''
 
 RETURN = '''#  '''
 
+POOL_OPTIONS = ['name', 'size', 'min_size', 'pg_num', 'pgp_num',
+                'pg_autoscale_mode', 'target_size_ratio', 'pool_type',
+                'erasure_profile', 'rule_name', 'expected_num_objects',
+                'application']
+
 
 def check_pool_exist(cluster,
                      name,
@@ -325,6 +348,47 @@ def get_pool_details(module,
     return rc, cmd, out, err
 
 
+def get_pools_details(module,
+                      cluster,
+                      user,
+                      user_key,
+                      output_format='json',
+                      container_image=None):
+    '''
+    Get details about all the pools (a single 'osd pool ls detail' call)
+    '''
+
+    cmd = list_pools(cluster,
+                     user,
+                     user_key,
+                     True,
+                     output_format=output_format,
+                     container_image=container_image)
+
+    rc, cmd, out, err = exec_command(module, cmd)
+
+    pools = {}
+    if rc == 0:
+        for pool in json.loads(out.strip()):
+            # 'osd pool ls detail' already reports the enabled applications
+            # so there is no need to run 'osd pool application get' per pool
+            if 'target_size_ratio' in pool['options'].keys():
+                pool['target_size_ratio'] = pool['options']['target_size_ratio']
+            else:
+                pool['target_size_ratio'] = None
+
+            application = list(pool.get('application_metadata', {}).keys())
+
+            if len(application) == 0:
+                pool['application'] = ''
+            else:
+                pool['application'] = application[0]
+
+            pools[pool['pool_name']] = pool
+
+    return rc, cmd, pools, err
+
+
 def compare_pool_config(user_pool_config, running_pool_details):
     '''
     Compare user input config pool details with current running pool details
@@ -489,10 +553,205 @@ def update_pool(module, cluster, name,
     return rc, cmd, out, err
 
 
+def generate_user_pool_config(params):
+    '''
+    Build the user pool config from the module (or pool item) parameters
+    '''
+
+    pg_autoscale_mode = str(params.get('pg_autoscale_mode')).lower()
+    if pg_autoscale_mode in ['true', 'on', 'yes']:
+        pg_autoscale_mode = 'on'
+    elif pg_autoscale_mode in ['false', 'off', 'no']:
+        pg_autoscale_mode = 'off'
+    else:
+        pg_autoscale_mode = 'warn'
+
+    if params.get('pool_type') == '1':
+        pool_type = 'replicated'
+    elif params.get('pool_type') == '3':
+        pool_type = 'erasure'
+    else:
+        pool_type = params.get('pool_type')
+
+    if not params.get('rule_name'):
+        rule_name = 'replicated_rule' if pool_type == 'replicated' else None
+    else:
+        rule_name = params.get('rule_name')
+
+    user_pool_config = {
+        'pool_name': {'value': params.get('name')},
+        'pg_num': {'value': params.get('pg_num'), 'cli_set_opt': 'pg_num'},
+        'pgp_num': {'value': params.get('pgp_num'), 'cli_set_opt': 'pgp_num'},
+        'pg_autoscale_mode': {'value': pg_autoscale_mode,
+                              'cli_set_opt': 'pg_autoscale_mode'},
+        'target_size_ratio': {'value': params.get('target_size_ratio'),
+                              'cli_set_opt': 'target_size_ratio'},
+        'application': {'value': params.get('application')},
+        'type': {'value': pool_type},
+        'erasure_profile': {'value': params.get('erasure_profile')},
+        'crush_rule': {'value': rule_name, 'cli_set_opt': 'crush_rule'},
+        'expected_num_objects': {'value': params.get('expected_num_objects')},
+        'size': {'value': params.get('size'), 'cli_set_opt': 'size'},
+        'min_size': {'value': params.get('min_size')}
+    }
+
+    return user_pool_config
+
+
+def reconcile_pool(module,
+                   cluster,
+                   name,
+                   user,
+                   user_key,
+                   user_pool_config,
+                   running_pool_details,
+                   container_image=None):
+    '''
+    Create a pool or update it if it differs from the user pool config
+    (running_pool_details is None when the pool doesn't exist)
+    '''
+
+    rc, cmd, out, err = 0, [], '', ''
+    changed = False
+
+    if running_pool_details is not None:
+        user_pool_config['pg_placement_num'] = {'value': str(running_pool_details['pg_placement_num']), 'cli_set_opt': 'pgp_num'}  # noqa: E501
+        delta = compare_pool_config(user_pool_config,
+                                    running_pool_details)
+        if len(delta) > 0:
+            keys = list(delta.keys())
+            if running_pool_details['erasure_code_profile'] and 'size' in keys:
+                del delta['size']
+            if running_pool_details['pg_autoscale_mode'] == 'on':
+                delta.pop('pg_num', None)
+                delta.pop('pgp_num', None)
+
+            if len(delta) == 0:
+                out = "Skipping pool {}.\nUpdating either 'size' on an erasure-coded pool or 'pg_num'/'pgp_num' on a pg autoscaled pool is incompatible".format(name)  # noqa: E501
+            else:
+                rc, cmd, out, err = update_pool(module,
+                                                cluster,
+                                                name,
+                                                user,
+                                                user_key,
+                                                delta,
+                                                container_image=container_image)  # noqa: E501
+                if rc == 0:
+                    changed = True
+        else:
+            out = "Pool {} already exists and there is nothing to update.".format(name)  # noqa: E501
+    else:
+        rc, cmd, out, err = exec_command(module,
+                                         create_pool(cluster,
+                                                     name,
+                                                     user,
+                                                     user_key,
+                                                     user_pool_config=user_pool_config,  # noqa: E501
+                                                     container_image=container_image))  # noqa: E501
+        if user_pool_config['application']['value']:
+            rc, _, _, _ = exec_command(module,
+                                       enable_application_pool(cluster,
+                                                               name,
+                                                               user_pool_config['application']['value'],  # noqa: E501
+                                                               user,
+                                                               user_key,
+                                                               container_image=container_image))  # noqa: E501
+        if user_pool_config['min_size']['value']:
+            # not implemented yet
+            pass
+        changed = True
+
+    return rc, cmd, out, err, changed
+
+
+def run_batch(module, cluster, state, user, user_key, startd, container_image=None):  # noqa: E501
+    '''
+    Reconcile all the pools passed with the 'pools' parameter
+    '''
+
+    defaults = dict((k, module.params.get(k)) for k in POOL_OPTIONS)
+    pools = []
+    for pool in module.params.get('pools'):
+        params = dict(defaults)
+        if 'type' in pool and 'pool_type' not in pool:
+            pool = dict(pool, pool_type=pool['type'])
+        for key in POOL_OPTIONS:
+            if pool.get(key) is not None:
+                params[key] = str(pool[key])
+        if not params['name']:
+            module.fail_json(msg="each item of 'pools' must have a 'name'", rc=1)  # noqa: E501
+        if params['pool_type'] not in ['replicated', 'erasure', '1', '3']:
+            module.fail_json(msg="invalid pool_type '{}' for pool {}".format(params['pool_type'], params['name']), rc=1)  # noqa: E501
+        pools.append(params)
+
+    rc, cmd, running_pools, err = get_pools_details(module,
+                                                    cluster,
+                                                    user,
+                                                    user_key,
+                                                    container_image=container_image)  # noqa: E501
+    if rc != 0:
+        exit_module(module=module, out="Couldn't list pool(s) present on the cluster",  # noqa: E501
+                    rc=rc, cmd=cmd, err=err, startd=startd, changed=False)
+
+    results = []
+    for params in pools:
+        name = params['name']
+
+        if state == 'present':
+            _rc, _cmd, _out, _err, _changed = reconcile_pool(module,
+                                                             cluster,
+                                                             name,
+                                                             user,
+                                                             user_key,
+                                                             generate_user_pool_config(params),  # noqa: E501
+                                                             running_pools.get(name),  # noqa: E501
+                                                             container_image=container_image)  # noqa: E501
+        elif name in running_pools:
+            _rc, _cmd, _out, _err = exec_command(module,
+                                                 remove_pool(cluster,
+                                                             name,
+                                                             user,
+                                                             user_key,
+                                                             container_image=container_image))  # noqa: E501
+            _changed = True
+        else:
+            _rc, _cmd, _out, _err = 0, [], "Skipped, since pool {} doesn't exist".format(name), ''  # noqa: E501
+            _changed = False
+
+        results.append(dict(
+            name=name,
+            cmd=_cmd,
+            rc=_rc,
+            stdout=_out.rstrip("\r\n"),
+            stderr=_err.rstrip("\r\n"),
+            changed=_changed,
+        ))
+
+        # report the first failure but still try to reconcile the other pools
+        if _rc != 0 and rc == 0:
+            rc, cmd, err = _rc, _cmd, _err
+
+    endd = datetime.datetime.now()
+    delta = endd - startd
+
+    module.exit_json(
+        cmd=cmd,
+        start=str(startd),
+        end=str(endd),
+        delta=str(delta),
+        rc=rc,
+        stdout="\n".join(r['stdout'] for r in results if r['stdout']),
+        stderr=err.rstrip("\r\n"),
+        changed=any(r['changed'] for r in results),
+        results=results,
+    )
+
+
 def run_module():
     module_args = dict(
         cluster=dict(type='str', required=False, default='ceph'),
-        name=dict(type='str', required=True),
+        name=dict(type='str', required=False),
+        pools=dict(type='list', elements='dict', required=False),
         state=dict(type='str', required=False, default='present',
                    choices=['present', 'absent', 'list']),
         details=dict(type='bool', required=False, default=False),
@@ -512,7 +771,9 @@ def run_module():
 
     module = AnsibleModule(
         argument_spec=module_args,
-        supports_check_mode=True
+        supports_check_mode=True,
+        required_one_of=[['name', 'pools']],
+        mutually_exclusive=[['name', 'pools']],
     )
 
     # Gather module parameters in variables
@@ -520,53 +781,8 @@ def run_module():
     name = module.params.get('name')
     state = module.params.get('state')
     details = module.params.get('details')
-    size = module.params.get('size')
-    min_size = module.params.get('min_size')
-    pg_num = module.params.get('pg_num')
-    pgp_num = module.params.get('pgp_num')
-    pg_autoscale_mode = module.params.get('pg_autoscale_mode')
-    target_size_ratio = module.params.get('target_size_ratio')
-    application = module.params.get('application')
-
-    if (module.params.get('pg_autoscale_mode').lower() in
-            ['true', 'on', 'yes']):
-        pg_autoscale_mode = 'on'
-    elif (module.params.get('pg_autoscale_mode').lower() in
-          ['false', 'off', 'no']):
-        pg_autoscale_mode = 'off'
-    else:
-        pg_autoscale_mode = 'warn'
-
-    if module.params.get('pool_type') == '1':
-        pool_type = 'replicated'
-    elif module.params.get('pool_type') == '3':
-        pool_type = 'erasure'
-    else:
-        pool_type = module.params.get('pool_type')
-
-    if not module.params.get('rule_name'):
-        rule_name = 'replicated_rule' if pool_type == 'replicated' else None
-    else:
-        rule_name = module.params.get('rule_name')
-
-    erasure_profile = module.params.get('erasure_profile')
-    expected_num_objects = module.params.get('expected_num_objects')
-    user_pool_config = {
-        'pool_name': {'value': name},
-        'pg_num': {'value': pg_num, 'cli_set_opt': 'pg_num'},
-        'pgp_num': {'value': pgp_num, 'cli_set_opt': 'pgp_num'},
-        'pg_autoscale_mode': {'value': pg_autoscale_mode,
-                              'cli_set_opt': 'pg_autoscale_mode'},
-        'target_size_ratio': {'value': target_size_ratio,
-                              'cli_set_opt': 'target_size_ratio'},
-        'application': {'value': application},
-        'type': {'value': pool_type},
-        'erasure_profile': {'value': erasure_profile},
-        'crush_rule': {'value': rule_name, 'cli_set_opt': 'crush_rule'},
-        'expected_num_objects': {'value': expected_num_objects},
-        'size': {'value': size, 'cli_set_opt': 'size'},
-        'min_size': {'value': min_size}
-    }
+    pools = module.params.get('pools')
+    user_pool_config = generate_user_pool_config(module.params)
 
     if module.check_mode:
         module.exit_json(
@@ -589,6 +805,12 @@ def run_module():
     keyring_filename = cluster + '.' + user + '.keyring'
     user_key = os.path.join("/etc/ceph/", keyring_filename)
 
+    if pools:
+        if state == "list":
+            module.fail_json(msg="'pools' is not supported with state 'list'", rc=1)  # noqa: E501
+        run_batch(module, cluster, state, user, user_key, startd,
+                  container_image=container_image)
+
     if state == "present":
         rc, cmd, out, err = exec_command(module,
                                          check_pool_exist(cluster,
@@ -596,59 +818,24 @@ def run_module():
                                                           user,
                                                           user_key,
                                                           container_image=container_image))  # noqa: E501
+        running_pool_details = None
         if rc == 0:
             running_pool_details = get_pool_details(module,
                                                     cluster,
                                                     name,
                                                     user,
                                                     user_key,
-                                                    container_image=container_image)  # noqa: E501
-            user_pool_config['pg_placement_num'] = {'value': str(running_pool_details[2]['pg_placement_num']), 'cli_set_opt': 'pgp_num'}  # noqa: E501
-            delta = compare_pool_config(user_pool_config,
-                                        running_pool_details[2])
-            if len(delta) > 0:
-                keys = list(delta.keys())
-                details = running_pool_details[2]
-                if details['erasure_code_profile'] and 'size' in keys:
-                    del delta['size']
-                if details['pg_autoscale_mode'] == 'on':
-                    delta.pop('pg_num', None)
-                    delta.pop('pgp_num', None)
-
-                if len(delta) == 0:
-                    out = "Skipping pool {}.\nUpdating either 'size' on an erasure-coded pool or 'pg_num'/'pgp_num' on a pg autoscaled pool is incompatible".format(name)  # noqa: E501
-                else:
-                    rc, cmd, out, err = update_pool(module,
-                                                    cluster,
-                                                    name,
-                                                    user,
-                                                    user_key,
-                                                    delta,
-                                                    container_image=container_image)  # noqa: E501
-                    if rc == 0:
-                        changed = True
-            else:
-                out = "Pool {} already exists and there is nothing to update.".format(name)  # noqa: E501
-        else:
-            rc, cmd, out, err = exec_command(module,
-                                             create_pool(cluster,
-                                                         name,
-                                                         user,
-                                                         user_key,
-                                                         user_pool_config=user_pool_config,  # noqa: E501
-                                                         container_image=container_image))  # noqa: E501
-            if user_pool_config['application']['value']:
-                rc, _, _, _ = exec_command(module,
-                                           enable_application_pool(cluster,
-                                                                   name,
-                                                                   user_pool_config['application']['value'],  # noqa: E501
-                                                                   user,
-                                                                   user_key,
-                                                                   container_image=container_image))  # noqa: E501
-            if user_pool_config['min_size']['value']:
-                # not implemented yet
-                pass
-            changed = True
+                                                    container_image=container_image)[2]  # noqa: E501
+        _rc, _cmd, out, _err, changed = reconcile_pool(module,
+                                                       cluster,
+                                                       name,
+                                                       user,
+                                                       user_key,
+                                                       user_pool_config,
+                                                       running_pool_details,
+                                                       container_image=container_image)  # noqa: E501
+        if _cmd:
+            rc, cmd, err = _rc, _cmd, _err
 
     elif state == "list":
         rc, cmd, out, err = exec_command(module,
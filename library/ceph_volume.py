@@ -5,10 +5,14 @@ try:
     from ansible.module_utils.ca_common import exec_command, is_containerized, fatal
 except ImportError:
     from module_utils.ca_common import exec_command, is_containerized, fatal
+from multiprocessing.pool import ThreadPool
 import datetime
 import copy
+import hashlib
 import json
 import os
+import shutil
+import tempfile
 
 ANSIBLE_METADATA = {
     'metadata_version': '1.0',
@@ -153,6 +157,39 @@ options:
         description:
             - List storage device inventory.
         required: false
+    volumes:
+        description:
+            - A list of volumes to prepare, create or zap in a single
+              invocation.
+            - Each item accepts the data, data_vg, journal, journal_vg, db,
+              db_vg, wal, wal_vg and crush_device_class keys (osd_fsid and
+              destroy instead of crush_device_class with the 'zap' action),
+              the options set at the module level are used as default values.
+            - The devices already used are detected with a single
+              'ceph-volume lvm list' and the other ones are prepared
+              concurrently.
+            - The LVs are checked with a single 'lvs' and the volumes are
+              zapped concurrently.
+            - Only applicable if action is 'create', 'prepare' or 'zap'.
+        required: false
+    workers:
+        description:
+            - The maximum number of volumes prepared, created or zapped
+              concurrently.
+            - Only applicable if volumes is set.
+        required: false
+        default: 1
+    cache:
+        description:
+            - If set to True the result of the read-only commands ('lvm list',
+              'inventory' and 'lvm batch --report') is cached on the host.
+            - A cached result is only used if the set of block devices, the
+              udev event sequence number and the lvm metadata backups didn't
+              change since it was stored.
+            - The cache is dropped by any action modifying the devices
+              (create, prepare, batch, zap and activate).
+        required: false
+        default: false
 
 author:
     - Andrew Schoen (@andrewschoen)
@@ -183,8 +220,110 @@ EXAMPLES = '''
     db: /dev/sdc1
     wal: /dev/sdc2
     action: create
+
+- name: prepare multiple bluestore osds, 4 at a time
+  ceph_volume:
+    objectstore: bluestore
+    volumes:
+      - data: /dev/sdb
+      - data: /dev/sdc
+      - data: data-lv1
+        data_vg: data-vg1
+    workers: 4
+    action: prepare
+
+- name: zap the devices of two osds at the same time
+  ceph_volume:
+    volumes:
+      - osd_fsid: a0b1c2d3-0000-0000-0000-000000000000
+        destroy: false
+      - data: /dev/sdc
+    workers: 2
+    action: zap
 '''
 
+CACHE_DIR = '/run/ceph-ansible/ceph-volume'
+
+VOLUME_KEYS = ['data', 'data_vg', 'journal', 'journal_vg', 'db', 'db_vg',
+               'wal', 'wal_vg', 'crush_device_class']
+
+ZAP_KEYS = ['data', 'data_vg', 'journal', 'journal_vg', 'db', 'db_vg',
+            'wal', 'wal_vg', 'osd_fsid', 'destroy']
+
+
+def get_devices_state():
+    '''
+    Return a fingerprint of the block devices state: the list of block
+    devices, the udev event sequence number (incremented on any device
+    add/remove/change, including lvm changes) and the mtime of the lvm
+    metadata backups (updated on any lvm metadata change).
+    Returns None if the state can't be determined.
+    '''
+
+    try:
+        with open('/sys/kernel/uevent_seqnum') as f:
+            seqnum = f.read().strip()
+        devices = sorted(os.listdir('/sys/block'))
+    except (IOError, OSError):
+        return None
+
+    lvm_backup = '/etc/lvm/backup'
+    lvm_mtime = 0
+    if os.path.isdir(lvm_backup):
+        lvm_mtime = max([os.path.getmtime(lvm_backup)] +
+                        [os.path.getmtime(os.path.join(lvm_backup, f))
+                         for f in os.listdir(lvm_backup)])
+
+    return [seqnum, devices, lvm_mtime]
+
+
+def cached_exec_command(module, cmd):
+    '''
+    Execute a read-only command, answering from the host cache if the
+    devices state didn't change since the result was stored
+    '''
+
+    if not module.params.get('cache'):
+        return exec_command(module, cmd)
+
+    state = get_devices_state()
+    if state is None:
+        return exec_command(module, cmd)
+
+    key = hashlib.sha1(json.dumps(cmd).encode('utf-8')).hexdigest()
+    path = os.path.join(CACHE_DIR, key)
+
+    try:
+        with open(path) as f:
+            cached = json.load(f)
+        if cached['state'] == state:
+            return cached['rc'], cmd, cached['out'], cached['err']
+    except (IOError, OSError, ValueError, KeyError):
+        pass
+
+    rc, cmd, out, err = exec_command(module, cmd)
+
+    if rc == 0:
+        try:
+            if not os.path.isdir(CACHE_DIR):
+                os.makedirs(CACHE_DIR, 0o700)
+            fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR)
+            with os.fdopen(fd, 'w') as f:
+                json.dump(dict(state=state, rc=rc, out=out, err=err), f)
+            os.rename(tmp_path, path)
+        except (IOError, OSError):
+            pass
+
+    return rc, cmd, out, err
+
+
+def invalidate_cache():
+    '''
+    Drop all the cached results
+    '''
+
+    shutil.rmtree(CACHE_DIR, ignore_errors=True)
+
 
 def container_exec(binary, container_image):
     '''
@@ -339,25 +478,28 @@ def ceph_volume_cmd(subcommand, container_image, cluster=None):
     return cmd
 
 
-def prepare_or_create_osd(module, action, container_image):
+def prepare_or_create_osd(module, action, container_image, params=None):
     '''
     Prepare or create OSD devices
     '''
 
+    if params is None:
+        params = module.params
+
     # get module variables
-    cluster = module.params['cluster']
-    objectstore = module.params['objectstore']
-    data = module.params['data']
-    data_vg = module.params.get('data_vg', None)
+    cluster = params['cluster']
+    objectstore = params['objectstore']
+    data = params['data']
+    data_vg = params.get('data_vg', None)
     data = get_data(data, data_vg)
-    journal = module.params.get('journal', None)
-    journal_vg = module.params.get('journal_vg', None)
-    db = module.params.get('db', None)
-    db_vg = module.params.get('db_vg', None)
-    wal = module.params.get('wal', None)
-    wal_vg = module.params.get('wal_vg', None)
-    crush_device_class = module.params.get('crush_device_class', None)
-    dmcrypt = module.params.get('dmcrypt', None)
+    journal = params.get('journal', None)
+    journal_vg = params.get('journal_vg', None)
+    db = params.get('db', None)
+    db_vg = params.get('db_vg', None)
+    wal = params.get('wal', None)
+    wal_vg = params.get('wal_vg', None)
+    crush_device_class = params.get('crush_device_class', None)
+    dmcrypt = params.get('dmcrypt', None)
 
     # Build the CLI
     action = ['lvm', action]
@@ -387,16 +529,18 @@ def prepare_or_create_osd(module, action, container_image):
     return cmd
 
 
-def list_osd(module, container_image):
+def list_osd(module, container_image, all_devices=False):
     '''
     List will detect wether or not a device has Ceph LVM Metadata
     '''
 
     # get module variables
     cluster = module.params['cluster']
-    data = module.params.get('data', None)
-    data_vg = module.params.get('data_vg', None)
-    data = get_data(data, data_vg)
+    data = None
+    if not all_devices:
+        data = module.params.get('data', None)
+        data_vg = module.params.get('data_vg', None)
+        data = get_data(data, data_vg)
 
     # Build the CLI
     action = ['lvm', 'list']
@@ -408,6 +552,135 @@ def list_osd(module, container_image):
     return cmd
 
 
+def is_volume_used(lvm_list, data, data_vg):
+    '''
+    Check if a volume is already used for an osd based on the output
+    of 'ceph-volume lvm list' (same result as 'lvm list <data>')
+    '''
+
+    for lvs in lvm_list.values():
+        for lv in lvs:
+            if data_vg:
+                if lv.get('vg_name') == data_vg and lv.get('lv_name') == data:
+                    return True
+            elif data in lv.get('devices', []) or data == lv.get('lv_path'):
+                return True
+
+    return False
+
+
+def prepare_or_create_osds(module, action, container_image):
+    '''
+    Prepare or create all the OSDs passed with the 'volumes' parameter
+    '''
+
+    volumes = []
+    for volume in module.params['volumes']:
+        if not volume.get('data'):
+            fatal('each item of volumes must have a data key', module)
+        params = dict(module.params)
+        params.update(dict((k, v) for k, v in volume.items()
+                           if k in VOLUME_KEYS and v))
+        volumes.append(params)
+
+    # a single 'lvm list' for the whole host instead of one per volume
+    rc, cmd, out, err = cached_exec_command(
+        module, list_osd(module, container_image, all_devices=True))
+    try:
+        lvm_list = json.loads(out) if out.strip() else {}
+    except ValueError:
+        fatal("Could not decode json output: {} from the command {}".format(out, cmd), module)  # noqa E501
+    if rc != 0:
+        fatal("Could not list the existing OSDs: {}".format(err), module)
+
+    def prepare_volume(params):
+        data = get_data(params['data'], params.get('data_vg'))
+        if is_volume_used(lvm_list, params['data'], params.get('data_vg')):
+            return dict(data=data, rc=0, changed=False, skipped=True, cmd='',
+                        stdout='skipped, since {0} is already used for an osd'.format(data),  # noqa E501
+                        stderr='')
+        startd = datetime.datetime.now()
+        try:
+            rc, cmd, out, err = exec_command(
+                module, prepare_or_create_osd(module, action, container_image, params))  # noqa E501
+        except BaseException as e:
+            # the pool only handles Exception, a SystemExit (fail_json)
+            # would leave pool.map waiting forever
+            return dict(data=data, rc=1, changed=False, skipped=False, cmd='',
+                        stdout='', stderr='{}: {}'.format(type(e).__name__, e),
+                        delta=str(datetime.datetime.now() - startd))
+        return dict(data=data, rc=rc, changed=rc == 0, skipped=False, cmd=cmd,
+                    stdout=out.rstrip('\r\n'), stderr=err.rstrip('\r\n'),
+                    delta=str(datetime.datetime.now() - startd))
+
+    results = []
+    workers = max(1, min(module.params['workers'], len(volumes)))
+    pool = ThreadPool(workers)
+    try:
+        # a failure on one volume doesn't stop the other ones
+        results = pool.map(prepare_volume, volumes)
+    finally:
+        pool.close()
+        pool.join()
+        if any(not r['skipped'] for r in results):
+            invalidate_cache()
+
+    return results
+
+
+def zap_volumes(module, container_image):
+    '''
+    Zap all the OSDs and devices passed with the 'volumes' parameter
+    '''
+
+    get_lvs = lvs_lister(module, container_image)
+
+    # the LVs are checked before zapping anything, so 'lvs' runs once
+    volumes = []
+    for volume in module.params['volumes']:
+        if not any(volume.get(k) for k in ZAP_KEYS if k != 'destroy'):
+            fatal('each item of volumes must have a data, journal, db, wal or osd_fsid key', module)  # noqa E501
+        params = dict(module.params)
+        params.update(dict((k, v) for k, v in volume.items()
+                           if k in ZAP_KEYS and v is not None))
+        name = params.get('osd_fsid') or get_data(params.get('data'), params.get('data_vg')) or ''  # noqa E501
+        volumes.append((name, params, check_zap_devices(params, get_lvs)))
+
+    def zap_volume(volume):
+        name, params, zap = volume
+        if not zap:
+            return dict(data=name, rc=0, changed=False, skipped=True, cmd='',
+                        stdout='Skipped, nothing to zap', stderr='')
+        startd = datetime.datetime.now()
+        try:
+            rc, cmd, out, err = exec_command(
+                module, zap_devices(module, container_image, params))
+        except BaseException as e:
+            # see prepare_or_create_osds
+            return dict(data=name, rc=1, changed=False, skipped=False, cmd='',
+                        stdout='', stderr='{}: {}'.format(type(e).__name__, e),
+                        delta=str(datetime.datetime.now() - startd))
+        return dict(data=name, rc=rc, changed=rc == 0, skipped=False, cmd=cmd,
+                    stdout=out.rstrip('\r\n'), stderr=err.rstrip('\r\n'),
+                    delta=str(datetime.datetime.now() - startd))
+
+    results = []
+    workers = max(1, min(module.params['workers'], len(volumes)))
+    pool = ThreadPool(workers)
+    try:
+        # a failure on one volume doesn't stop the other ones
+        results = pool.map(zap_volume, volumes)
+    finally:
+        pool.close()
+        pool.join()
+        if any(not r['skipped'] for r in results):
+            for scan_cmd in ['vgscan', 'lvscan']:
+                module.run_command([scan_cmd, '--cache'])
+            invalidate_cache()
+
+    return results
+
+
 def list_storage_inventory(module, container_image):
     '''
     List storage inventory.
@@ -434,25 +707,65 @@ def activate_osd():
     return cmd
 
 
-def is_lv(module, vg, lv, container_image):
+def list_lvs(module, container_image):
     '''
-    Check if an LV exists
+    List all the LVs as a set of (vg_name, lv_name)
     '''
 
-    args = ['--noheadings', '--reportformat', 'json', '--select', 'lv_name={},vg_name={}'.format(lv, vg)]  # noqa E501
+    args = ['--noheadings', '--reportformat', 'json', '-o', 'lv_name,vg_name']  # noqa E501
 
     cmd = build_cmd(args, container_image, binary='lvs')
 
-    rc, cmd, out, err = exec_command(module, cmd)
+    rc, cmd, out, err = cached_exec_command(module, cmd)
 
-    result = json.loads(out)['report'][0]['lv']
-    if rc == 0 and len(result) > 0:
-        return True
-    else:
-        return False
+    if rc != 0:
+        return set()
+
+    return set((lv['vg_name'], lv['lv_name'])
+               for lv in json.loads(out)['report'][0]['lv'])
+
+
+def lvs_lister(module, container_image):
+    '''
+    Return a function listing the LVs, 'lvs' is only run on the first call
+    '''
+
+    lvs = []
+
+    def get_lvs():
+        if not lvs:
+            lvs.append(list_lvs(module, container_image))
+        return lvs[0]
 
+    return get_lvs
 
-def zap_devices(module, container_image):
+
+def check_zap_devices(params, get_lvs):
+    '''
+    Unset the vg/lv devices of params that aren't actual LVs (they are raw
+    devices or partitions), return True if there's something to zap
+    '''
+
+    skip = []
+    for device_type in ['journal', 'data', 'db', 'wal']:
+        # 1/ if we passed vg/lv
+        if params.get('{}_vg'.format(device_type), None) and params.get(device_type, None):  # noqa E501
+            # 2/ check this is an actual lv/vg
+            # (a single 'lvs' call for all the device types)
+            ret = (params['{}_vg'.format(device_type)], params[device_type]) in get_lvs()  # noqa E501
+            skip.append(ret)
+            # 3/ This isn't a lv/vg device
+            if not ret:
+                params['{}_vg'.format(device_type)] = False
+                params[device_type] = False
+        # 4/ no journal|data|db|wal|_vg was passed, so it must be a raw device  # noqa E501
+        elif not params.get('{}_vg'.format(device_type), None) and params.get(device_type, None):  # noqa E501
+            skip.append(True)
+
+    return any(skip) or bool(params.get('osd_fsid', None))
+
+
+def zap_devices(module, container_image, params=None):
     '''
     Will run 'ceph-volume lvm zap' on all devices, lvs and partitions
     used to create the OSD. The --destroy flag is always passed so that
@@ -460,17 +773,20 @@ def zap_devices(module, container_image):
     'data' then any lvs that were created by ceph-volume are removed.
     '''
 
+    if params is None:
+        params = module.params
+
     # get module variables
-    data = module.params.get('data', None)
-    data_vg = module.params.get('data_vg', None)
-    journal = module.params.get('journal', None)
-    journal_vg = module.params.get('journal_vg', None)
-    db = module.params.get('db', None)
-    db_vg = module.params.get('db_vg', None)
-    wal = module.params.get('wal', None)
-    wal_vg = module.params.get('wal_vg', None)
-    osd_fsid = module.params.get('osd_fsid', None)
-    destroy = module.params.get('destroy', True)
+    data = params.get('data', None)
+    data_vg = params.get('data_vg', None)
+    journal = params.get('journal', None)
+    journal_vg = params.get('journal_vg', None)
+    db = params.get('db', None)
+    db_vg = params.get('db_vg', None)
+    wal = params.get('wal', None)
+    wal_vg = params.get('wal_vg', None)
+    osd_fsid = params.get('osd_fsid', None)
+    destroy = params.get('destroy', True)
 
     # build the CLI
     action = ['lvm', 'zap']
@@ -528,6 +844,9 @@ def run_module():
         report=dict(type='bool', required=False, default=False),
         osd_fsid=dict(type='str', required=False),
         destroy=dict(type='bool', required=False, default=True),
+        volumes=dict(type='list', elements='dict', required=False),
+        workers=dict(type='int', required=False, default=1),
+        cache=dict(type='bool', required=False, default=False),
     )
 
     module = AnsibleModule(
@@ -560,9 +879,35 @@ def run_module():
     # Assume the task's status will be 'changed'
     changed = True
 
+    if action in ['create', 'prepare', 'zap'] and module.params.get('volumes'):  # noqa E501
+        if action == 'zap':
+            results = zap_volumes(module, container_image)
+        else:
+            results = prepare_or_create_osds(module, action, container_image)  # noqa E501
+        failed = [r for r in results if r['rc'] != 0]
+
+        endd = datetime.datetime.now()
+        delta = endd - startd
+
+        result = dict(
+            start=str(startd),
+            end=str(endd),
+            delta=str(delta),
+            rc=failed[0]['rc'] if failed else 0,
+            stdout='\n'.join(r['stdout'] for r in results if r['stdout']),
+            stderr='\n'.join(r['stderr'] for r in failed),
+            changed=any(r['changed'] for r in results),
+            results=results,
+        )
+
+        if failed:
+            module.fail_json(msg='failed to {} {}'.format(action, ', '.join(r['data'] for r in failed)), **result)  # noqa E501
+
+        module.exit_json(**result)
+
     if action == 'create' or action == 'prepare':
         # First test if the device has Ceph LVM Metadata
-        rc, cmd, out, err = exec_command(
+        rc, cmd, out, err = cached_exec_command(
             module, list_osd(module, container_image))
 
         # list_osd returns a dict, if the dict is empty this means
@@ -586,6 +931,7 @@ def run_module():
         # Prepare or create the OSD
         rc, cmd, out, err = exec_command(
             module, prepare_or_create_osd(module, action, container_image))
+        invalidate_cache()
 
     elif action == 'activate':
         if container_image:
@@ -595,31 +941,19 @@ def run_module():
         # Activate the OSD
         rc, cmd, out, err = exec_command(
             module, activate_osd())
+        invalidate_cache()
 
     elif action == 'zap':
         # Zap the OSD
-        skip = []
-        for device_type in ['journal', 'data', 'db', 'wal']:
-            # 1/ if we passed vg/lv
-            if module.params.get('{}_vg'.format(device_type), None) and module.params.get(device_type, None):  # noqa E501
-                # 2/ check this is an actual lv/vg
-                ret = is_lv(module, module.params['{}_vg'.format(device_type)], module.params[device_type], container_image)  # noqa E501
-                skip.append(ret)
-                # 3/ This isn't a lv/vg device
-                if not ret:
-                    module.params['{}_vg'.format(device_type)] = False
-                    module.params[device_type] = False
-            # 4/ no journal|data|db|wal|_vg was passed, so it must be a raw device  # noqa E501
-            elif not module.params.get('{}_vg'.format(device_type), None) and module.params.get(device_type, None):  # noqa E501
-                skip.append(True)
-
+        zap = check_zap_devices(module.params, lvs_lister(module, container_image))  # noqa E501
         cmd = zap_devices(module, container_image)
 
-        if any(skip) or module.params.get('osd_fsid', None):
+        if zap:
             rc, cmd, out, err = exec_command(
                 module, cmd)
             for scan_cmd in ['vgscan', 'lvscan']:
                 module.run_command([scan_cmd, '--cache'])
+            invalidate_cache()
         else:
             out = 'Skipped, nothing to zap'
             err = ''
@@ -628,12 +962,12 @@ def run_module():
 
     elif action == 'list':
         # List Ceph LVM Metadata on a device
-        rc, cmd, out, err = exec_command(
+        rc, cmd, out, err = cached_exec_command(
             module, list_osd(module, container_image))
 
     elif action == 'inventory':
         # List storage device inventory.
-        rc, cmd, out, err = exec_command(
+        rc, cmd, out, err = cached_exec_command(
             module, list_storage_inventory(module, container_image))
 
     elif action == 'batch':
@@ -652,7 +986,7 @@ def run_module():
 
         # Run batch --report to see what's going to happen
         # Do not run the batch command if there is nothing to do
-        rc, cmd, out, err = exec_command(
+        rc, cmd, out, err = cached_exec_command(
             module, batch_report_cmd)
         try:
             if not out:
@@ -694,11 +1028,13 @@ def run_module():
                     # Batch prepare the OSD
                     rc, cmd, out, err = exec_command(
                         module, batch(module, container_image))
+                    invalidate_cache()
             else:
                 # we have the refactored batch, its idempotent so lets just
                 # run it
                 rc, cmd, out, err = exec_command(
                     module, batch(module, container_image))
+                invalidate_cache()
         else:
             cmd = batch_report_cmd
 
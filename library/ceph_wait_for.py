@@ -0,0 +1,363 @@
+# Copyright 2020, Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+from ansible.module_utils.basic import AnsibleModule
+try:
+    from ansible.module_utils.ca_common import exec_command, generate_ceph_cmd, is_containerized
+except ImportError:
+    from module_utils.ca_common import exec_command, generate_ceph_cmd, is_containerized
+import datetime
+import errno
+import json
+import time
+
+
+ANSIBLE_METADATA = {
+    'metadata_version': '1.1',
+    'status': ['preview'],
+    'supported_by': 'community'
+}
+
+DOCUMENTATION = '''
+---
+module: ceph_wait_for
+short_description: Wait for a Ceph cluster condition
+version_added: "2.8"
+description:
+    - Poll the Ceph cluster until a condition is met. Each poll runs a single
+      ceph command, its json output is evaluated by the module.
+    - The delay between two polls starts at C(delay) and grows up to
+      C(max_delay) as long as the condition doesn't make progress.
+    - This module doesn't change anything in the cluster.
+options:
+    condition:
+        description:
+            - The condition to wait for.
+            - C(pgs_active_clean) waits for all the PGs to be active+clean.
+            - C(quorum) waits for the monitor C(name) to be in the quorum.
+            - C(osds_up) waits for the OSDs C(osds) (all the OSDs in the
+              cluster if not set) to be up.
+            - C(mds_state) waits for the MDS C(name) to be in one of the
+              C(state) states.
+            - C(ok_to_stop) waits for the OSDs C(osds) to be ok to stop.
+        required: true
+        choices: ['pgs_active_clean', 'quorum', 'osds_up', 'mds_state', 'ok_to_stop']
+    cluster:
+        description:
+            - The ceph cluster name.
+        required: false
+        default: ceph
+    name:
+        description:
+            - The name of the monitor (quorum) or the MDS (mds_state).
+        required: false
+    osds:
+        description:
+            - List of OSD ids (osds_up, ok_to_stop).
+        required: false
+    max:
+        description:
+            - Also return up to C(max) OSDs (including C(osds)) that are ok
+              to stop at the same time (ok_to_stop). Before Octopus, only
+              C(osds) are returned.
+        required: false
+        default: 0
+    state:
+        description:
+            - List of the accepted MDS states (mds_state).
+        required: false
+        default: ['up:active', 'up:standby', 'up:standby-replay']
+    timeout:
+        description:
+            - Maximum number of seconds to wait for the condition.
+        required: false
+        default: 300
+    delay:
+        description:
+            - Initial delay in seconds between two polls.
+        required: false
+        default: 2
+    max_delay:
+        description:
+            - Maximum delay in seconds between two polls.
+        required: false
+        default: 30
+'''
+
+EXAMPLES = '''
+- name: wait for all pgs to be active+clean
+  ceph_wait_for:
+    condition: pgs_active_clean
+    timeout: 1200
+
+- name: wait for the monitor to join the quorum
+  ceph_wait_for:
+    condition: quorum
+    name: mon0
+
+- name: wait for osd.0 and osd.1 to be up
+  ceph_wait_for:
+    condition: osds_up
+    osds: [0, 1]
+
+- name: wait for osd.0 to be ok to stop, find up to 8 osds to stop with it
+  ceph_wait_for:
+    condition: ok_to_stop
+    osds: [0]
+    max: 8
+
+- name: wait for the mds to be active
+  ceph_wait_for:
+    condition: mds_state
+    name: mds0
+    state: ['up:active']
+'''
+
+RETURN = '''
+polls:
+    description: number of polls
+    returned: always
+    type: int
+    sample: 3
+status:
+    description: the evaluation of the condition at the last poll
+    returned: always
+    type: dict
+    sample: {"pgs_clean": 128, "pgs_total": 128}
+progress:
+    description: the evaluation of the condition at each poll
+    returned: always
+    type: list
+    sample: [{"elapsed": 0.2, "pgs_clean": 96, "pgs_total": 128},
+             {"elapsed": 2.4, "pgs_clean": 128, "pgs_total": 128}]
+'''
+
+BACKOFF_FACTOR = 2
+
+CONDITION_COMMANDS = {
+    'pgs_active_clean': (['status'], []),
+    'quorum': (['quorum_status'], []),
+    'osds_up': (['osd'], ['dump']),
+    'mds_state': (['fs'], ['dump']),
+    'ok_to_stop': (['osd'], ['ok-to-stop']),
+}
+
+
+def eval_pgs_active_clean(data, params):
+    '''
+    Count the active+clean PGs
+    '''
+
+    pgmap = data['pgmap']
+    total = pgmap['num_pgs']
+    clean = sum(state['count'] for state in pgmap.get('pgs_by_state', []) if 'active+clean' in state['state_name'])  # noqa: E501
+
+    return clean == total, dict(pgs_clean=clean, pgs_total=total)
+
+
+def eval_quorum(data, params):
+    '''
+    Check if the monitor is in the quorum
+    '''
+
+    quorum = data['quorum_names']
+
+    return params['name'] in quorum, dict(quorum=quorum)
+
+
+def eval_osds_up(data, params):
+    '''
+    Count the up OSDs
+    '''
+
+    if params['osds']:
+        osds = [osd for osd in data['osds'] if osd['osd'] in params['osds']]
+        total = len(params['osds'])
+    else:
+        osds = [osd for osd in data['osds'] if osd['in']]
+        total = len(osds)
+    up = len([osd for osd in osds if osd['up']])
+
+    return up == total, dict(osds_up=up, osds_total=total)
+
+
+def eval_mds_state(data, params):
+    '''
+    Find the state of the MDS
+    '''
+
+    daemons = list(data.get('standbys', []))
+    for fs in data.get('filesystems', []):
+        daemons.extend(fs['mdsmap'].get('info', {}).values())
+
+    state = None
+    for daemon in daemons:
+        if daemon['name'] == params['name']:
+            state = daemon['state']
+            break
+
+    return state in params['state'], dict(mds_state=state)
+
+
+def eval_ok_to_stop(data, params):
+    '''
+    List the OSDs that are ok to stop
+    '''
+
+    osds = data.get('osds', [])
+
+    return data.get('ok_to_stop', True) and len(osds) > 0, dict(ok_to_stop=osds)  # noqa: E501
+
+
+CONDITIONS = {
+    'pgs_active_clean': eval_pgs_active_clean,
+    'quorum': eval_quorum,
+    'osds_up': eval_osds_up,
+    'mds_state': eval_mds_state,
+    'ok_to_stop': eval_ok_to_stop,
+}
+
+
+def generate_status_cmd(condition, cluster, params, container_image=None):
+    '''
+    Generate the command returning the status needed by the condition
+    '''
+
+    sub_cmd, args = CONDITION_COMMANDS[condition]
+    if condition == 'ok_to_stop':
+        args = args + [str(osd) for osd in params['osds']]
+        if params['max']:
+            args.append('--max={}'.format(params['max']))
+
+    return generate_ceph_cmd(sub_cmd, args + ['--format', 'json'], cluster=cluster, container_image=container_image)  # noqa: E501
+
+
+def poll(module, cmd, condition, params):
+    '''
+    Fetch the status once and evaluate the condition.
+    A failing command (e.g: the daemon being restarted was the one
+    answering) means the condition isn't met yet.
+    '''
+
+    rc, _cmd, out, err = exec_command(module, cmd)
+    if condition == 'ok_to_stop' and rc == errno.EINVAL and params['max']:
+        # before Octopus 'osd ok-to-stop' has no --max, check the OSDs alone
+        params['max'] = 0
+        cmd[:] = [arg for arg in cmd if not arg.startswith('--max=')]
+        return poll(module, cmd, condition, params)
+    if rc != 0:
+        return False, dict(error=err.strip())
+    if condition == 'ok_to_stop' and not out.strip():
+        # before Octopus 'osd ok-to-stop' has no JSON output, rc 0 means
+        # the requested OSDs are ok to stop
+        return True, dict(ok_to_stop=params['osds'])
+
+    try:
+        return CONDITIONS[condition](json.loads(out), params)
+    except (ValueError, KeyError, TypeError) as e:
+        return False, dict(error='Could not evaluate {}: {}'.format(condition, e))  # noqa: E501
+
+
+def next_delay(delay, params, status, previous):
+    '''
+    Poll again quickly when the condition makes progress, back off otherwise
+    '''
+
+    if previous is not None and status != previous and 'error' not in status:
+        return params['delay']
+
+    return min(delay * BACKOFF_FACTOR, params['max_delay'])
+
+
+def wait_for(module, cmd, condition, params):
+    '''
+    Poll until the condition is met or the timeout expires
+    '''
+
+    start = time.time()
+    deadline = start + params['timeout']
+    delay = params['delay']
+    progress = []
+    previous = None
+
+    while True:
+        met, status = poll(module, cmd, condition, params)
+        progress.append(dict(elapsed=round(time.time() - start, 1), **status))
+        if met:
+            return True, progress
+
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return False, progress
+
+        time.sleep(min(delay, remaining))
+        delay = next_delay(delay, params, status, previous)
+        previous = status
+
+
+def main():
+    module = AnsibleModule(
+        argument_spec=dict(
+            condition=dict(type='str', required=True, choices=list(CONDITIONS)),  # noqa: E501
+            cluster=dict(type='str', required=False, default='ceph'),
+            name=dict(type='str', required=False),
+            osds=dict(type='list', elements='int', required=False, default=[]),  # noqa: E501
+            max=dict(type='int', required=False, default=0),
+            state=dict(type='list', elements='str', required=False, default=['up:active', 'up:standby', 'up:standby-replay']),  # noqa: E501
+            timeout=dict(type='int', required=False, default=300),
+            delay=dict(type='float', required=False, default=2),
+            max_delay=dict(type='float', required=False, default=30),
+        ),
+        supports_check_mode=True,
+        required_if=[
+            ['condition', 'quorum', ['name']],
+            ['condition', 'mds_state', ['name']],
+            ['condition', 'ok_to_stop', ['osds']],
+        ],
+    )
+
+    condition = module.params.get('condition')
+    cluster = module.params.get('cluster')
+
+    startd = datetime.datetime.now()
+
+    container_image = is_containerized()
+
+    cmd = generate_status_cmd(condition, cluster, module.params, container_image)
+    met, progress = wait_for(module, cmd, condition, module.params)
+
+    endd = datetime.datetime.now()
+    delta = endd - startd
+
+    result = dict(
+        cmd=' '.join(cmd),
+        start=str(startd),
+        end=str(endd),
+        delta=str(delta),
+        polls=len(progress),
+        status=progress[-1],
+        progress=progress,
+    )
+
+    if not met:
+        module.fail_json(msg='Timed out after {}s waiting for {}'.format(module.params['timeout'], condition), **result)  # noqa: E501
+
+    module.exit_json(changed=False, **result)
+
+
+if __name__ == '__main__':
+    main()
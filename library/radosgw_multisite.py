@@ -0,0 +1,466 @@
+# Copyright 2020, Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+from ansible.module_utils.basic import AnsibleModule
+try:
+    from ansible.module_utils.ca_common import container_exec, is_containerized
+except ImportError:
+    from module_utils.ca_common import container_exec, is_containerized
+import datetime
+import json
+
+
+ANSIBLE_METADATA = {
+    'metadata_version': '1.1',
+    'status': ['preview'],
+    'supported_by': 'community'
+}
+
+DOCUMENTATION = '''
+---
+module: radosgw_multisite
+
+short_description: Reconcile a RADOS Gateway multisite topology
+
+version_added: "2.8"
+
+description:
+    - Create or update the RADOS Gateway realms, zonegroups and zones of a
+      multisite topology in a single invocation.
+    - The current topology is read once (the realm, zonegroup and zone lists
+      and the period of each realm), only the objects that differ are
+      created or modified and the period of each changed realm is committed
+      once at the end.
+    - Objects that aren't listed are left untouched.
+options:
+    cluster:
+        description:
+            - The ceph cluster name.
+        required: false
+        default: ceph
+    realms:
+        description:
+            - List of the realms, each realm is a dict with a C(name) and an
+              optional C(default) flag.
+        required: false
+        default: []
+    zonegroups:
+        description:
+            - List of the zonegroups, each zonegroup is a dict with a
+              C(name), a C(realm), optional C(endpoints) and optional
+              C(master) and C(default) flags.
+            - The endpoints of a zonegroup default to the endpoints of its
+              master zone when it is listed in C(zones).
+        required: false
+        default: []
+    zones:
+        description:
+            - List of the zones, each zone is a dict with a C(name), a
+              C(realm), a C(zonegroup), optional C(endpoints), optional
+              C(access_key) and C(secret_key) system keys and optional
+              C(master) and C(default) flags.
+        required: false
+        default: []
+    commit:
+        description:
+            - Commit the period of each realm with changes.
+        required: false
+        default: true
+
+author:
+    - Dimitri Savineau <dsavinea@redhat.com>
+'''
+
+EXAMPLES = '''
+- name: reconcile the multisite topology
+  radosgw_multisite:
+    realms:
+      - name: foo
+        default: true
+    zonegroups:
+      - name: bar
+        realm: foo
+        master: true
+        default: true
+    zones:
+      - name: z1
+        realm: foo
+        zonegroup: bar
+        endpoints:
+          - http://192.168.1.10:8080
+          - http://192.168.1.11:8080
+        access_key: 8T6K4PCSLKHQXU1C6CDE
+        secret_key: NdYrrumC7w6Mj9G8KsDJmZwAgMoSu4q2Fd3MEfJs
+        master: true
+        default: true
+'''
+
+RETURN = '''
+actions:
+    description: the objects created or modified
+    returned: always
+    type: list
+    sample: [{"type": "zone", "name": "z1", "action": "modify"},
+             {"type": "period", "name": "foo", "action": "commit"}]
+'''
+
+
+def generate_radosgw_cmd(cluster, args, container_image=None):
+    '''
+    Generate 'radosgw-admin' command line to execute
+    '''
+
+    if container_image:
+        cmd = container_exec('radosgw-admin', container_image)
+    else:
+        cmd = ['radosgw-admin']
+
+    cmd.extend(['--cluster', cluster] + args)
+
+    return cmd
+
+
+def exec_commands(module, cmd):
+    '''
+    Execute command(s)
+    '''
+
+    rc, out, err = module.run_command(cmd)
+
+    return rc, cmd, out, err
+
+
+def exec_json(module, cmd):
+    '''
+    Execute a command returning json, None if it fails
+    '''
+
+    rc, cmd, out, err = exec_commands(module, cmd)
+    if rc != 0:
+        return None
+
+    return json.loads(out)
+
+
+def get_snapshot(module, cluster, realms, container_image=None):
+    '''
+    Read the current topology: the realm, zonegroup and zone names and the
+    period of each realm
+    '''
+
+    snapshot = {}
+    for kind in ['realm', 'zonegroup', 'zone']:
+        data = exec_json(module, generate_radosgw_cmd(cluster, [kind, 'list', '--format=json'], container_image)) or {}
+        snapshot[kind + 's'] = data.get(kind + 's', [])
+
+    snapshot['periods'] = {}
+    for realm in realms:
+        if realm in snapshot['realms']:
+            args = ['period', 'get', '--rgw-realm=' + realm, '--format=json']
+            snapshot['periods'][realm] = exec_json(module, generate_radosgw_cmd(cluster, args, container_image)) or {}
+
+    return snapshot
+
+
+def get_period_zonegroup(period, name):
+    '''
+    Find a zonegroup in a period, None if it isn't committed yet
+    '''
+
+    for zonegroup in period.get('period_map', {}).get('zonegroups', []):
+        if zonegroup['name'] == name:
+            return zonegroup
+
+    return None
+
+
+def get_period_zone(period, zonegroup, name):
+    '''
+    Find a zone in a period, None if it isn't committed yet
+    '''
+
+    _zonegroup = get_period_zonegroup(period, zonegroup)
+    for zone in (_zonegroup or {}).get('zones', []):
+        if zone['name'] == name:
+            return zone
+
+    return None
+
+
+def zonegroup_endpoints(zonegroup, zones):
+    '''
+    Return the endpoints of a zonegroup, defaulting to the endpoints of its
+    master zone
+    '''
+
+    if zonegroup.get('endpoints') is not None:
+        return zonegroup['endpoints']
+
+    for zone in zones:
+        if zone['realm'] == zonegroup['realm'] and zone['zonegroup'] == zonegroup['name'] and zone.get('master'):
+            return zone.get('endpoints') or []
+
+    return None
+
+
+def zonegroup_args(action, zonegroup, endpoints):
+    '''
+    Generate the arguments to create or modify a zonegroup
+    '''
+
+    args = [
+        'zonegroup',
+        action,
+        '--rgw-realm=' + zonegroup['realm'],
+        '--rgw-zonegroup=' + zonegroup['name']
+    ]
+
+    if endpoints:
+        args.extend(['--endpoints=' + ','.join(endpoints)])
+
+    if zonegroup.get('default'):
+        args.append('--default')
+
+    if zonegroup.get('master'):
+        args.append('--master')
+
+    return args
+
+
+def zone_args(action, zone):
+    '''
+    Generate the arguments to create or modify a zone
+    '''
+
+    args = [
+        'zone',
+        action,
+        '--rgw-realm=' + zone['realm'],
+        '--rgw-zonegroup=' + zone['zonegroup'],
+        '--rgw-zone=' + zone['name']
+    ]
+
+    if zone.get('endpoints'):
+        args.extend(['--endpoints=' + ','.join(zone['endpoints'])])
+
+    if zone.get('access_key'):
+        args.extend(['--access-key=' + zone['access_key']])
+
+    if zone.get('secret_key'):
+        args.extend(['--secret-key=' + zone['secret_key']])
+
+    if zone.get('default'):
+        args.append('--default')
+
+    if zone.get('master'):
+        args.append('--master')
+
+    return args
+
+
+def plan_realms(realms, snapshot):
+    '''
+    Return the (action, args) needed for the realms
+    '''
+
+    plan = []
+    for realm in realms:
+        if realm['name'] not in snapshot['realms']:
+            args = ['realm', 'create', '--rgw-realm=' + realm['name']]
+            if realm.get('default'):
+                args.append('--default')
+            plan.append((dict(type='realm', name=realm['name'], realm=realm['name'], action='create'), args))
+
+    return plan
+
+
+def plan_zonegroups(module, cluster, zonegroups, zones, snapshot, container_image=None):
+    '''
+    Return the (action, args) needed for the zonegroups
+    '''
+
+    plan = []
+    for zonegroup in zonegroups:
+        action = dict(type='zonegroup', name=zonegroup['name'], realm=zonegroup['realm'])
+        endpoints = zonegroup_endpoints(zonegroup, zones)
+        if zonegroup['name'] not in snapshot['zonegroups']:
+            action['action'] = 'create'
+            plan.append((action, zonegroup_args('create', zonegroup, endpoints)))
+            continue
+
+        period = snapshot['periods'].get(zonegroup['realm'], {})
+        current = get_period_zonegroup(period, zonegroup['name'])
+        if current is None:
+            # not committed yet, only the zonegroup itself knows its state
+            args = ['zonegroup', 'get', '--rgw-realm=' + zonegroup['realm'], '--rgw-zonegroup=' + zonegroup['name'], '--format=json']
+            current = exec_json(module, generate_radosgw_cmd(cluster, args, container_image)) or {}
+
+        # a modify can't drop the endpoints or the master flag, only
+        # compare what is asked
+        modified = endpoints is not None and current.get('endpoints') != endpoints
+        if zonegroup.get('master') and str(current.get('is_master', 'false')).lower() != 'true':
+            modified = True
+
+        if modified:
+            action['action'] = 'modify'
+            plan.append((action, zonegroup_args('modify', zonegroup, endpoints)))
+
+    return plan
+
+
+def plan_zones(module, cluster, zones, snapshot, container_image=None):
+    '''
+    Return the (action, args) needed for the zones
+    '''
+
+    plan = []
+    for zone in zones:
+        action = dict(type='zone', name=zone['name'], realm=zone['realm'])
+        if zone['name'] not in snapshot['zones']:
+            action['action'] = 'create'
+            plan.append((action, zone_args('create', zone)))
+            continue
+
+        period = snapshot['periods'].get(zone['realm'], {})
+        current = get_period_zone(period, zone['zonegroup'], zone['name'])
+        if current is None:
+            # not committed yet, the zonegroup knows the zone endpoints
+            args = ['zonegroup', 'get', '--rgw-realm=' + zone['realm'], '--rgw-zonegroup=' + zone['zonegroup'], '--format=json']
+            zonegroup = exec_json(module, generate_radosgw_cmd(cluster, args, container_image)) or {}
+            current = next((z for z in zonegroup.get('zones', []) if z['name'] == zone['name']), {})
+
+        modified = bool(zone.get('endpoints')) and current.get('endpoints') != zone['endpoints']
+        if not modified and (zone.get('access_key') or zone.get('secret_key')):
+            # the system keys aren't part of the period
+            args = ['zone', 'get', '--rgw-realm=' + zone['realm'], '--rgw-zonegroup=' + zone['zonegroup'], '--rgw-zone=' + zone['name'], '--format=json']
+            system_key = (exec_json(module, generate_radosgw_cmd(cluster, args, container_image)) or {}).get('system_key', {})
+            modified = system_key.get('access_key') != (zone.get('access_key') or '') or \
+                system_key.get('secret_key') != (zone.get('secret_key') or '')
+
+        if modified:
+            action['action'] = 'modify'
+            plan.append((action, zone_args('modify', zone)))
+
+    return plan
+
+
+def plan_commits(plan, zones):
+    '''
+    Return the (action, args) committing the period of each changed realm,
+    from the master zone of the realm when it is listed
+    '''
+
+    commits = []
+    for realm in sorted(set(action['realm'] for action, args in plan)):
+        args = ['period', 'update', '--commit', '--rgw-realm=' + realm]
+        realm_zones = [zone for zone in zones if zone['realm'] == realm]
+        realm_zones.sort(key=lambda zone: not zone.get('master'))
+        if realm_zones:
+            args.extend(['--rgw-zonegroup=' + realm_zones[0]['zonegroup'], '--rgw-zone=' + realm_zones[0]['name']])
+        commits.append((dict(type='period', name=realm, realm=realm, action='commit'), args))
+
+    return commits
+
+
+def run_module():
+    module_args = dict(
+        cluster=dict(type='str', required=False, default='ceph'),
+        realms=dict(type='list', elements='dict', required=False, default=[], options=dict(
+            name=dict(type='str', required=True),
+            default=dict(type='bool', required=False, default=False),
+        )),
+        zonegroups=dict(type='list', elements='dict', required=False, default=[], options=dict(
+            name=dict(type='str', required=True),
+            realm=dict(type='str', required=True),
+            endpoints=dict(type='list', elements='str', required=False),
+            default=dict(type='bool', required=False, default=False),
+            master=dict(type='bool', required=False, default=False),
+        )),
+        zones=dict(type='list', elements='dict', required=False, default=[], options=dict(
+            name=dict(type='str', required=True),
+            realm=dict(type='str', required=True),
+            zonegroup=dict(type='str', required=True),
+            endpoints=dict(type='list', elements='str', required=False, default=[]),
+            access_key=dict(type='str', required=False, no_log=True),
+            secret_key=dict(type='str', required=False, no_log=True),
+            default=dict(type='bool', required=False, default=False),
+            master=dict(type='bool', required=False, default=False),
+        )),
+        commit=dict(type='bool', required=False, default=True),
+    )
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=True,
+    )
+
+    # Gather module parameters in variables
+    cluster = module.params.get('cluster')
+    realms = module.params.get('realms')
+    zonegroups = module.params.get('zonegroups')
+    zones = module.params.get('zones')
+    commit = module.params.get('commit')
+
+    startd = datetime.datetime.now()
+
+    # will return either the image name or None
+    container_image = is_containerized()
+
+    realm_names = set([realm['name'] for realm in realms] +
+                      [zonegroup['realm'] for zonegroup in zonegroups] +
+                      [zone['realm'] for zone in zones])
+    snapshot = get_snapshot(module, cluster, sorted(realm_names), container_image)
+
+    plan = plan_realms(realms, snapshot)
+    plan.extend(plan_zonegroups(module, cluster, zonegroups, zones, snapshot, container_image))
+    plan.extend(plan_zones(module, cluster, zones, snapshot, container_image))
+    if commit:
+        plan.extend(plan_commits(plan, zones))
+
+    cmds = []
+    rc, out, err = 0, '', ''
+    if not module.check_mode:
+        for action, args in plan:
+            rc, cmd, out, err = exec_commands(module, generate_radosgw_cmd(cluster, args, container_image))
+            cmds.append(cmd)
+            if rc != 0:
+                module.fail_json(msg='Failed to {} {} {}'.format(action['action'], action['type'], action['name']),
+                                 cmd=cmds, rc=rc, stdout=out.rstrip("\r\n"), stderr=err.rstrip("\r\n"))
+
+    endd = datetime.datetime.now()
+    delta = endd - startd
+
+    result = dict(
+        cmd=cmds,
+        actions=[action for action, args in plan],
+        start=str(startd),
+        end=str(endd),
+        delta=str(delta),
+        rc=rc,
+        stdout=out.rstrip("\r\n"),
+        stderr=err.rstrip("\r\n"),
+        changed=len(plan) > 0,
+    )
+    module.exit_json(**result)
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
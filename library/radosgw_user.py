@@ -16,6 +16,11 @@ from __future__ import absolute_import, division, print_function
 __metaclass__ = type
 
 from ansible.module_utils.basic import AnsibleModule
+try:
+    from ansible.module_utils.ca_common import fatal
+except ImportError:
+    from module_utils.ca_common import fatal
+from multiprocessing.pool import ThreadPool
 import datetime
 import json
 import os
@@ -46,7 +51,8 @@ options:
     name:
         description:
             - name of the RADOS Gateway user (uid).
-        required: true
+            - Required unless users is set.
+        required: false
     state:
         description:
             If 'present' is used, the module creates a user if it doesn't
@@ -102,6 +108,25 @@ options:
             - set the admin flag on the user.
         required: false
         default: false
+    users:
+        description:
+            - A list of users to create or update in a single invocation.
+            - Each item accepts the name, display_name, email, access_key,
+              secret_key, realm, zonegroup, zone, system and admin keys, the
+              options set at the module level are used as default values.
+            - The existing users are read with a single
+              'metadata list user' per realm/zonegroup/zone and their
+              'metadata get', the needed creates and modifies are then run
+              concurrently.
+            - Only applicable if state is 'present'.
+        required: false
+    workers:
+        description:
+            - The maximum number of users read, created or modified
+              concurrently.
+            - Only applicable if users is set.
+        required: false
+        default: 1
 
 author:
     - Dimitri Savineau <dsavinea@redhat.com>
@@ -121,6 +146,15 @@ EXAMPLES = '''
     secret_key: FavL6ueQWcWuWn0YXyQ3TnJ3mT3Uj5SGVHCUXC5K
     state: present
 
+- name: create RADOS Gateway users, 4 at a time
+  radosgw_user:
+    users:
+      - name: foo
+        system: true
+      - name: bar
+        email: bar@foo.io
+    workers: 4
+
 - name: get a RADOS Gateway user information
   radosgw_user:
     name: foo
@@ -134,6 +168,9 @@ EXAMPLES = '''
 
 RETURN = '''#  '''
 
+USER_KEYS = ['name', 'display_name', 'email', 'access_key', 'secret_key',
+             'realm', 'zonegroup', 'zone', 'system', 'admin']
+
 
 def container_exec(binary, container_image):
     '''
@@ -205,24 +242,27 @@ def exec_commands(module, cmd):
     return rc, cmd, out, err
 
 
-def create_user(module, container_image=None):
+def create_user(module, container_image=None, params=None):
     '''
     Create a new user
     '''
 
-    cluster = module.params.get('cluster')
-    name = module.params.get('name')
-    display_name = module.params.get('display_name')
+    if params is None:
+        params = module.params
+
+    cluster = params.get('cluster')
+    name = params.get('name')
+    display_name = params.get('display_name')
     if not display_name:
         display_name = name
-    email = module.params.get('email', None)
-    access_key = module.params.get('access_key', None)
-    secret_key = module.params.get('secret_key', None)
-    realm = module.params.get('realm', None)
-    zonegroup = module.params.get('zonegroup', None)
-    zone = module.params.get('zone', None)
-    system = module.params.get('system', False)
-    admin = module.params.get('admin', False)
+    email = params.get('email', None)
+    access_key = params.get('access_key', None)
+    secret_key = params.get('secret_key', None)
+    realm = params.get('realm', None)
+    zonegroup = params.get('zonegroup', None)
+    zone = params.get('zone', None)
+    system = params.get('system', False)
+    admin = params.get('admin', False)
 
     args = ['create', '--uid=' + name, '--display_name=' + display_name]
 
@@ -255,24 +295,27 @@ def create_user(module, container_image=None):
     return cmd
 
 
-def modify_user(module, container_image=None):
+def modify_user(module, container_image=None, params=None):
     '''
     Modify an existing user
     '''
 
-    cluster = module.params.get('cluster')
-    name = module.params.get('name')
-    display_name = module.params.get('display_name')
+    if params is None:
+        params = module.params
+
+    cluster = params.get('cluster')
+    name = params.get('name')
+    display_name = params.get('display_name')
     if not display_name:
         display_name = name
-    email = module.params.get('email', None)
-    access_key = module.params.get('access_key', None)
-    secret_key = module.params.get('secret_key', None)
-    realm = module.params.get('realm', None)
-    zonegroup = module.params.get('zonegroup', None)
-    zone = module.params.get('zone', None)
-    system = module.params.get('system', False)
-    admin = module.params.get('admin', False)
+    email = params.get('email', None)
+    access_key = params.get('access_key', None)
+    secret_key = params.get('secret_key', None)
+    realm = params.get('realm', None)
+    zonegroup = params.get('zonegroup', None)
+    zone = params.get('zone', None)
+    system = params.get('system', False)
+    admin = params.get('admin', False)
 
     args = ['modify', '--uid=' + name]
 
@@ -308,16 +351,19 @@ def modify_user(module, container_image=None):
     return cmd
 
 
-def get_user(module, container_image=None):
+def get_user(module, container_image=None, params=None):
     '''
     Get existing user
     '''
 
-    cluster = module.params.get('cluster')
-    name = module.params.get('name')
-    realm = module.params.get('realm', None)
-    zonegroup = module.params.get('zonegroup', None)
-    zone = module.params.get('zone', None)
+    if params is None:
+        params = module.params
+
+    cluster = params.get('cluster')
+    name = params.get('name')
+    realm = params.get('realm', None)
+    zonegroup = params.get('zonegroup', None)
+    zone = params.get('zone', None)
 
     args = ['info', '--uid=' + name, '--format=json']
 
@@ -337,6 +383,153 @@ def get_user(module, container_image=None):
     return cmd
 
 
+def list_users_metadata(module, container_image=None, params=None):
+    '''
+    List the existing users
+    '''
+
+    if params is None:
+        params = module.params
+
+    cluster = params.get('cluster')
+    realm = params.get('realm', None)
+    zonegroup = params.get('zonegroup', None)
+    zone = params.get('zone', None)
+
+    cmd = pre_generate_radosgw_cmd(container_image=container_image)
+
+    args = ['--cluster', cluster, 'metadata', 'list', 'user', '--format=json']
+
+    if realm:
+        args.extend(['--rgw-realm=' + realm])
+
+    if zonegroup:
+        args.extend(['--rgw-zonegroup=' + zonegroup])
+
+    if zone:
+        args.extend(['--rgw-zone=' + zone])
+
+    cmd.extend(args)
+
+    return cmd
+
+
+def get_user_metadata(module, container_image=None, params=None):
+    '''
+    Get the metadata of an existing user
+    '''
+
+    if params is None:
+        params = module.params
+
+    cluster = params.get('cluster')
+    name = params.get('name')
+    realm = params.get('realm', None)
+    zonegroup = params.get('zonegroup', None)
+    zone = params.get('zone', None)
+
+    cmd = pre_generate_radosgw_cmd(container_image=container_image)
+
+    args = ['--cluster', cluster, 'metadata', 'get', 'user:' + name, '--format=json']
+
+    if realm:
+        args.extend(['--rgw-realm=' + realm])
+
+    if zonegroup:
+        args.extend(['--rgw-zonegroup=' + zonegroup])
+
+    if zone:
+        args.extend(['--rgw-zone=' + zone])
+
+    cmd.extend(args)
+
+    return cmd
+
+
+def user_changed(user, params):
+    '''
+    Compare an existing user ('user info' or the data of 'metadata get')
+    with the asked parameters
+    '''
+
+    current = {
+        'display_name': user['display_name'],
+        'system': str(user.get('system', 'false')).lower(),
+        'admin': str(user.get('admin', 'false')).lower()
+    }
+    asked = {
+        'display_name': params.get('display_name') or params['name'],
+        'system': str(params.get('system')).lower(),
+        'admin': str(params.get('admin')).lower()
+    }
+    if params.get('email'):
+        current['email'] = user['email']
+        asked['email'] = params['email']
+    if params.get('access_key'):
+        current['access_key'] = user['keys'][0]['access_key'] if user['keys'] else None
+        asked['access_key'] = params['access_key']
+    if params.get('secret_key'):
+        current['secret_key'] = user['keys'][0]['secret_key'] if user['keys'] else None
+        asked['secret_key'] = params['secret_key']
+
+    return current != asked
+
+
+def reconcile_users(module, container_image=None):
+    '''
+    Create or modify all the users passed with the 'users' parameter
+    '''
+
+    users = []
+    for user in module.params['users']:
+        params = dict(module.params)
+        params.update(dict((k, v) for k, v in user.items()
+                           if k in USER_KEYS and v is not None))
+        users.append(params)
+
+    # a single 'metadata list user' per realm/zonegroup/zone instead of
+    # a 'user info' per user
+    existing = {}
+    for params in users:
+        context = (params.get('realm'), params.get('zonegroup'), params.get('zone'))
+        if context in existing:
+            continue
+        rc, cmd, out, err = exec_commands(module, list_users_metadata(module, container_image, params))
+        if rc != 0:
+            fatal("Could not list the existing users: {}".format(err), module)
+        try:
+            existing[context] = set(json.loads(out))
+        except ValueError:
+            fatal("Could not decode json output: {} from the command {}".format(out, cmd), module)
+
+    def reconcile_user(params):
+        context = (params.get('realm'), params.get('zonegroup'), params.get('zone'))
+        startd = datetime.datetime.now()
+        if params['name'] in existing[context]:
+            rc, cmd, out, err = exec_commands(module, get_user_metadata(module, container_image, params))
+            if rc == 0 and not user_changed(json.loads(out)['data'], params):
+                return dict(name=params['name'], rc=0, changed=False, cmd=cmd,
+                            stdout='', stderr='', delta=str(datetime.datetime.now() - startd))
+            action = modify_user if rc == 0 else create_user
+        else:
+            action = create_user
+        rc, cmd, out, err = exec_commands(module, action(module, container_image, params))
+        return dict(name=params['name'], rc=rc, changed=rc == 0, cmd=cmd,
+                    stdout=out.rstrip('\r\n'), stderr=err.rstrip('\r\n'),
+                    delta=str(datetime.datetime.now() - startd))
+
+    workers = max(1, min(module.params['workers'], len(users)))
+    pool = ThreadPool(workers)
+    try:
+        # a failure on one user doesn't stop the other ones
+        results = pool.map(reconcile_user, users)
+    finally:
+        pool.close()
+        pool.join()
+
+    return results
+
+
 def remove_user(module, container_image=None):
     '''
     Remove a user
@@ -384,7 +577,7 @@ def exit_module(module, out, rc, cmd, err, startd, changed=False):
 def run_module():
     module_args = dict(
         cluster=dict(type='str', required=False, default='ceph'),
-        name=dict(type='str', required=True),
+        name=dict(type='str', required=False),
         state=dict(type='str', required=False, choices=['present', 'absent', 'info'], default='present'),
         display_name=dict(type='str', required=False),
         email=dict(type='str', required=False),
@@ -394,25 +587,32 @@ def run_module():
         zonegroup=dict(type='str', required=False),
         zone=dict(type='str', required=False),
         system=dict(type='bool', required=False, default=False),
-        admin=dict(type='bool', required=False, default=False)
+        admin=dict(type='bool', required=False, default=False),
+        users=dict(type='list', elements='dict', required=False, options=dict(
+            name=dict(type='str', required=True),
+            display_name=dict(type='str', required=False),
+            email=dict(type='str', required=False),
+            access_key=dict(type='str', required=False, no_log=True),
+            secret_key=dict(type='str', required=False, no_log=True),
+            realm=dict(type='str', required=False),
+            zonegroup=dict(type='str', required=False),
+            zone=dict(type='str', required=False),
+            system=dict(type='bool', required=False),
+            admin=dict(type='bool', required=False),
+        )),
+        workers=dict(type='int', required=False, default=1),
     )
 
     module = AnsibleModule(
         argument_spec=module_args,
         supports_check_mode=True,
+        required_one_of=[['name', 'users']],
+        mutually_exclusive=[['name', 'users']],
     )
 
     # Gather module parameters in variables
     name = module.params.get('name')
     state = module.params.get('state')
-    display_name = module.params.get('display_name')
-    if not display_name:
-        display_name = name
-    email = module.params.get('email')
-    access_key = module.params.get('access_key')
-    secret_key = module.params.get('secret_key')
-    system = str(module.params.get('system')).lower()
-    admin = str(module.params.get('admin')).lower()
 
     if module.check_mode:
         module.exit_json(
@@ -431,31 +631,36 @@ def run_module():
     # will return either the image name or None
     container_image = is_containerized()
 
+    if module.params.get('users'):
+        if state != "present":
+            fatal("users is only applicable if state is 'present'", module)
+
+        results = reconcile_users(module, container_image=container_image)
+        failed = [r for r in results if r['rc'] != 0]
+
+        endd = datetime.datetime.now()
+        delta = endd - startd
+
+        result = dict(
+            start=str(startd),
+            end=str(endd),
+            delta=str(delta),
+            rc=failed[0]['rc'] if failed else 0,
+            stdout='\n'.join(r['stdout'] for r in results if r['stdout']),
+            stderr='\n'.join(r['stderr'] for r in failed),
+            changed=any(r['changed'] for r in results),
+            results=results,
+        )
+
+        if failed:
+            module.fail_json(msg='failed to create or modify {}'.format(', '.join(r['name'] for r in failed)), **result)
+
+        module.exit_json(**result)
+
     if state == "present":
         rc, cmd, out, err = exec_commands(module, get_user(module, container_image=container_image))
         if rc == 0:
-            user = json.loads(out)
-            current = {
-                'display_name': user['display_name'],
-                'system': user.get('system', 'false'),
-                'admin': user.get('admin', 'false')
-            }
-            asked = {
-                'display_name': display_name,
-                'system': system,
-                'admin': admin
-            }
-            if email:
-                current['email'] = user['email']
-                asked['email'] = email
-            if access_key:
-                current['access_key'] = user['keys'][0]['access_key']
-                asked['access_key'] = access_key
-            if secret_key:
-                current['secret_key'] = user['keys'][0]['secret_key']
-                asked['secret_key'] = secret_key
-
-            if current != asked:
+            if user_changed(json.loads(out), module.params):
                 rc, cmd, out, err = exec_commands(module, modify_user(module, container_image=container_image))
                 changed = True
         else:
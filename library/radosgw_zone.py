@@ -353,6 +353,44 @@ def get_realm(module, container_image=None):
     return cmd
 
 
+def get_period(module, container_image=None):
+    '''
+    Get the current period of the realm
+    '''
+
+    cluster = module.params.get('cluster')
+    realm = module.params.get('realm')
+
+    cmd = pre_generate_radosgw_cmd(container_image=container_image)
+
+    args = [
+        '--cluster',
+        cluster,
+        'period',
+        'get',
+        '--rgw-realm=' + realm,
+        '--format=json'
+    ]
+
+    cmd.extend(args)
+
+    return cmd
+
+
+def get_period_zone(period, zonegroup, name):
+    '''
+    Find a zone in the zonegroups of a period, None if it isn't committed yet
+    '''
+
+    for _zonegroup in period.get('period_map', {}).get('zonegroups', []):
+        if _zonegroup['name'] == zonegroup:
+            for zone in _zonegroup.get('zones', []):
+                if zone['name'] == name:
+                    return zone
+
+    return None
+
+
 def remove_zone(module, container_image=None):
     '''
     Remove a zone
@@ -436,39 +474,69 @@ def run_module():
     container_image = is_containerized()
 
     if state == "present":
-        rc, cmd, out, err = exec_commands(module, get_zone(module, container_image=container_image))
+        # the period holds the realm, the zonegroups and the endpoints of
+        # their zones, a single call is enough to compare a committed zone
+        period = None
+        rc, cmd, out, err = exec_commands(module, get_period(module, container_image=container_image))
         if rc == 0:
-            zone = json.loads(out)
-            _rc, _cmd, _out, _err = exec_commands(module, get_realm(module, container_image=container_image))
-            if _rc != 0:
-                fatal(_err, module)
-            realm = json.loads(_out)
-            _rc, _cmd, _out, _err = exec_commands(module, get_zonegroup(module, container_image=container_image))
-            if _rc != 0:
-                fatal(_err, module)
-            zonegroup = json.loads(_out)
-            if not access_key:
-                access_key = ''
-            if not secret_key:
-                secret_key = ''
-            current = {
-                'endpoints': next(zone['endpoints'] for zone in zonegroup['zones'] if zone['name'] == name),
-                'access_key': zone['system_key']['access_key'],
-                'secret_key': zone['system_key']['secret_key'],
-                'realm_id': zone['realm_id']
-            }
-            asked = {
-                'endpoints': endpoints,
-                'access_key': access_key,
-                'secret_key': secret_key,
-                'realm_id': realm['id']
-            }
+            period = json.loads(out)
+            period_zone = get_period_zone(period, module.params.get('zonegroup'), name)
+        if period is not None and period_zone is not None:
+            current = {'endpoints': period_zone['endpoints']}
+            asked = {'endpoints': endpoints}
+            if access_key or secret_key:
+                rc, cmd, out, err = exec_commands(module, get_zone(module, container_image=container_image))
+                if rc != 0:
+                    fatal(err, module)
+                zone = json.loads(out)
+                current.update({
+                    'access_key': zone['system_key']['access_key'],
+                    'secret_key': zone['system_key']['secret_key']
+                })
+                asked.update({
+                    'access_key': access_key or '',
+                    'secret_key': secret_key or ''
+                })
             if current != asked:
                 rc, cmd, out, err = exec_commands(module, modify_zone(module, container_image=container_image))
                 changed = True
         else:
-            rc, cmd, out, err = exec_commands(module, create_zone(module, container_image=container_image))
-            changed = True
+            rc, cmd, out, err = exec_commands(module, get_zone(module, container_image=container_image))
+            if rc == 0:
+                zone = json.loads(out)
+                if period is not None:
+                    realm = {'id': period['realm_id']}
+                else:
+                    _rc, _cmd, _out, _err = exec_commands(module, get_realm(module, container_image=container_image))
+                    if _rc != 0:
+                        fatal(_err, module)
+                    realm = json.loads(_out)
+                _rc, _cmd, _out, _err = exec_commands(module, get_zonegroup(module, container_image=container_image))
+                if _rc != 0:
+                    fatal(_err, module)
+                zonegroup = json.loads(_out)
+                if not access_key:
+                    access_key = ''
+                if not secret_key:
+                    secret_key = ''
+                current = {
+                    'endpoints': next(zone['endpoints'] for zone in zonegroup['zones'] if zone['name'] == name),
+                    'access_key': zone['system_key']['access_key'],
+                    'secret_key': zone['system_key']['secret_key'],
+                    'realm_id': zone['realm_id']
+                }
+                asked = {
+                    'endpoints': endpoints,
+                    'access_key': access_key,
+                    'secret_key': secret_key,
+                    'realm_id': realm['id']
+                }
+                if current != asked:
+                    rc, cmd, out, err = exec_commands(module, modify_zone(module, container_image=container_image))
+                    changed = True
+            else:
+                rc, cmd, out, err = exec_commands(module, create_zone(module, container_image=container_image))
+                changed = True
 
     elif state == "absent":
         rc, cmd, out, err = exec_commands(module, get_zone(module, container_image=container_image))
@@ -279,6 +279,42 @@ def get_realm(module, container_image=None):
     return cmd
 
 
+def get_period(module, container_image=None):
+    '''
+    Get the current period of the realm
+    '''
+
+    cluster = module.params.get('cluster')
+    realm = module.params.get('realm')
+
+    cmd = pre_generate_radosgw_cmd(container_image=container_image)
+
+    args = [
+        '--cluster',
+        cluster,
+        'period',
+        'get',
+        '--rgw-realm=' + realm,
+        '--format=json'
+    ]
+
+    cmd.extend(args)
+
+    return cmd
+
+
+def get_period_zonegroup(period, name):
+    '''
+    Find a zonegroup in a period, None if it isn't committed yet
+    '''
+
+    for zonegroup in period.get('period_map', {}).get('zonegroups', []):
+        if zonegroup['name'] == name:
+            return zonegroup
+
+    return None
+
+
 def remove_zonegroup(module, container_image=None):
     '''
     Remove a zonegroup
@@ -352,16 +388,27 @@ def run_module():
     container_image = is_containerized()
 
     if state == "present":
-        rc, cmd, out, err = exec_commands(module, get_zonegroup(module, container_image=container_image))
+        # the period holds the realm id and the committed zonegroups, a
+        # single call is enough to compare a committed zonegroup
+        period = None
+        rc, cmd, out, err = exec_commands(module, get_period(module, container_image=container_image))
         if rc == 0:
-            zonegroup = json.loads(out)
-            _rc, _cmd, _out, _err = exec_commands(module, get_realm(module, container_image=container_image))
-            if _rc != 0:
-                fatal(_err, module)
-            realm = json.loads(_out)
+            period = json.loads(out)
+            zonegroup = get_period_zonegroup(period, name)
+        if period is None or zonegroup is None:
+            rc, cmd, out, err = exec_commands(module, get_zonegroup(module, container_image=container_image))
+            zonegroup = json.loads(out) if rc == 0 else None
+        if zonegroup is not None:
+            if period is not None:
+                realm = {'id': period['realm_id']}
+            else:
+                _rc, _cmd, _out, _err = exec_commands(module, get_realm(module, container_image=container_image))
+                if _rc != 0:
+                    fatal(_err, module)
+                realm = json.loads(_out)
             current = {
                 'endpoints': zonegroup['endpoints'],
-                'master': zonegroup.get('is_master', 'false'),
+                'master': str(zonegroup.get('is_master', 'false')).lower(),
                 'realm_id': zonegroup['realm_id']
             }
             asked = {
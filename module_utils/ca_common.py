@@ -1,5 +1,34 @@
 import os
+import atexit
 import datetime
+import errno
+import hashlib
+import subprocess
+import threading
+
+try:
+    import rados
+    from ceph_argparse import json_command, parse_json_funcsigs, validate_command
+except ImportError:
+    rados = None
+
+CONTAINER_SESSION_DIR = '/var/lib/ceph/tmp'
+
+# helper containers already known to be running by this process
+_container_sessions = set()
+
+# 'ceph' CLI global options handled by the librados backend
+RADOS_CMD_OPTIONS = {
+    '-f': 'format',
+    '--format': 'format',
+    '-i': 'infile',
+    '--in-file': 'infile',
+    '-o': 'outfile',
+    '--out-file': 'outfile',
+}
+
+# librados handles (and their command descriptions) opened by this process
+_rados_handles = {}
 
 
 def generate_ceph_cmd(sub_cmd, args, user_key=None, cluster='ceph', user='client.admin', container_image=None, interactive=False):
@@ -46,6 +75,169 @@ def container_exec(binary, container_image, interactive=False):
     return command_exec
 
 
+def container_session_timeout():
+    '''
+    Return the idle timeout (in seconds) of the container session,
+    0 means the container session is disabled
+    '''
+
+    try:
+        timeout = int(os.getenv('CEPH_CONTAINER_SESSION_TIMEOUT', 0))
+    except ValueError:
+        timeout = 0
+
+    return max(timeout, 0)
+
+
+def container_session_name(container_image):
+    '''
+    Return the name of the helper container for a given image
+    '''
+
+    digest = hashlib.sha1(container_image.encode('utf-8')).hexdigest()[:12]
+
+    return 'ceph-ansible-session-' + digest
+
+
+def container_session_heartbeat(container_image):
+    '''
+    Return the path of the heartbeat file of the helper container
+    '''
+
+    return os.path.join(CONTAINER_SESSION_DIR, container_session_name(container_image))
+
+
+def container_session_refresh(container_image):
+    '''
+    Refresh the heartbeat file of the helper container
+    Returns False when the heartbeat file can't be written.
+    '''
+
+    heartbeat = container_session_heartbeat(container_image)
+    try:
+        if not os.path.isdir(CONTAINER_SESSION_DIR):
+            os.makedirs(CONTAINER_SESSION_DIR)
+        with open(heartbeat, 'a'):
+            os.utime(heartbeat, None)
+    except (IOError, OSError):
+        return False
+
+    return True
+
+
+def container_session_exec(cmd):
+    '''
+    Convert a command built by container_exec into the same command
+    executed in the helper container.
+    Returns (container image, command) or None if this isn't such a command:
+    any other container command (e.g. with more volumes or privileges than
+    the helper container) is run as is.
+    '''
+
+    entrypoint = [i for i, arg in enumerate(cmd) if arg.startswith('--entrypoint=')]
+    if not entrypoint or entrypoint[0] + 1 >= len(cmd):
+        return None
+    i = entrypoint[0]
+    binary = cmd[i].split('=', 1)[1]
+    container_image = cmd[i + 1]
+    interactive = '--interactive' in cmd[:i]
+
+    # the exact command line of container_exec, whatever the engine binary
+    if cmd[1:i + 2] != container_exec(binary, container_image, interactive)[1:]:
+        return None
+
+    exec_cmd = [cmd[0], 'exec']
+    if interactive:
+        exec_cmd.append('--interactive')
+    exec_cmd.extend([container_session_name(container_image), binary])
+    exec_cmd.extend(cmd[i + 2:])
+
+    return container_image, exec_cmd
+
+
+def container_session_start(container_binary, container_image, timeout):
+    '''
+    Make sure the long-lived helper container is running.
+    The helper container exits by itself once its heartbeat file
+    hasn't been refreshed for 'timeout' seconds.
+    Returns False when the helper container can't be used.
+    '''
+
+    if not container_binary:
+        return False
+
+    name = container_session_name(container_image)
+    heartbeat = container_session_heartbeat(container_image)
+
+    # refresh the heartbeat before checking the helper container so it
+    # can't reach its idle timeout between the check and the exec
+    if not container_session_refresh(container_image):
+        return False
+
+    if name in _container_sessions:
+        return True
+
+    if not container_session_is_running(container_binary, name):
+        # /var/lib/ceph is bind mounted so the heartbeat file has the same
+        # path on the host and inside the helper container
+        script = ('while [ -f {hb} ] && '
+                  '[ $(( $(date +%s) - $(stat -c %Y {hb}) )) -lt {timeout} ]; '
+                  'do sleep {interval}; done; rm -f {hb}').format(
+                      hb=heartbeat, timeout=timeout,
+                      interval=min(10, timeout))
+        cmd = [container_binary, 'run', '--detach', '--rm',
+               '--name', name,
+               '--net=host',
+               '-v', '/etc/ceph:/etc/ceph:z',
+               '-v', '/var/lib/ceph/:/var/lib/ceph/:z',
+               '-v', '/var/log/ceph/:/var/log/ceph/:z',
+               '--entrypoint=/bin/bash', container_image,
+               '-c', script]
+        try:
+            with open(os.devnull, 'w') as devnull:
+                subprocess.call(cmd, stdout=devnull, stderr=devnull)
+        except OSError:
+            return False
+        # another task could have started the same helper container
+        # concurrently, so check again rather than trusting the return code
+        if not container_session_is_running(container_binary, name):
+            return False
+
+    _container_sessions.add(name)
+
+    return True
+
+
+def container_session_is_running(container_binary, name):
+    '''
+    Check if the helper container is running
+    '''
+
+    cmd = [container_binary, 'inspect', '--format', '{{.State.Running}}', name]
+    try:
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE)
+        out, _ = process.communicate()
+    except OSError:
+        return False
+
+    return process.returncode == 0 and out.strip() == b'true'
+
+
+def container_session_stop(container_image):
+    '''
+    Stop the helper container by removing its heartbeat file
+    '''
+
+    heartbeat = container_session_heartbeat(container_image)
+    _container_sessions.discard(container_session_name(container_image))
+    if os.path.exists(heartbeat):
+        os.unlink(heartbeat)
+        return True
+
+    return False
+
+
 def is_containerized():
     '''
     Check if we are running on a containerized cluster
@@ -71,14 +263,188 @@ def pre_generate_ceph_cmd(container_image=None, interactive=False):
     return cmd
 
 
+def rados_enabled():
+    '''
+    Check if the 'ceph' commands can be sent through librados, this needs
+    the rados and ceph_argparse python modules on the host.
+    The backend can be disabled with CEPH_RADOS_BACKEND=false.
+    '''
+
+    if rados is None:
+        return False
+
+    return os.getenv('CEPH_RADOS_BACKEND', 'true').lower() not in ['0', 'false', 'no']
+
+
+def split_ceph_cmd(cmd):
+    '''
+    Split a command generated by generate_ceph_cmd into its cluster, user,
+    keyring, global options and command arguments.
+    Returns None if this isn't such a command or if it uses an option not
+    handled by the librados backend.
+    '''
+
+    try:
+        i = cmd.index('-n')
+    except ValueError:
+        return None
+
+    prefix = cmd[:i]
+    if not prefix or not (prefix[-1] == 'ceph' or (len(prefix) > 1 and prefix[-2] == '--entrypoint=ceph')):
+        return None
+
+    base = cmd[i:i + 6]
+    if len(base) != 6 or base[2] != '-k' or base[4] != '--cluster':
+        return None
+
+    parsed = dict(user=base[1], keyring=base[3], cluster=base[5],
+                  containerized=prefix != ['ceph'],
+                  format=None, infile=None, outfile=None, args=[])
+    args = iter(cmd[i + 6:])
+    for arg in args:
+        option, sep, value = arg.partition('=')
+        if option in RADOS_CMD_OPTIONS:
+            if not sep:
+                value = next(args, None)
+                if value is None:
+                    return None
+            parsed[RADOS_CMD_OPTIONS[option]] = value
+        elif arg in ['-n', '--name', '-k', '--keyring', '--cluster', '-c', '--conf']:
+            return None
+        else:
+            parsed['args'].append(arg)
+
+    return parsed
+
+
+def rados_connect(cluster, user, keyring):
+    '''
+    Return a connected librados handle and the command descriptions,
+    one handle is opened per cluster/user for the whole module execution.
+    Returns None if the cluster can't be reached.
+    '''
+
+    key = (cluster, user, keyring)
+    if key in _rados_handles:
+        return _rados_handles[key]
+
+    handle = None
+    try:
+        handle = rados.Rados(name=user,
+                             clustername=cluster,
+                             conffile='/etc/ceph/{}.conf'.format(cluster),
+                             conf=dict(keyring=keyring))
+        handle.connect(timeout=30)
+        ret, outbuf, outs = json_command(handle, prefix='get_command_descriptions', timeout=30)
+        if ret != 0:
+            raise rados.Error(outs)
+        sigdict = parse_json_funcsigs(outbuf.decode('utf-8'), 'cli')
+    except Exception:
+        if handle is not None:
+            handle.shutdown()
+        _rados_handles[key] = None
+        return None
+
+    atexit.register(handle.shutdown)
+    _rados_handles[key] = (handle, sigdict)
+
+    return _rados_handles[key]
+
+
+def rados_command(cmd, stdin=None):
+    '''
+    Execute a 'ceph' command through librados, the arguments are validated
+    and converted to a mon command exactly like the 'ceph' CLI does.
+    Returns None when the command has to be executed by the 'ceph' CLI.
+    '''
+
+    parsed = split_ceph_cmd(cmd)
+    if parsed is None:
+        return None
+
+    # files are read and written by the 'ceph' CLI from the container
+    for path in [parsed['infile'], parsed['outfile']]:
+        if parsed['containerized'] and path not in [None, '-']:
+            return None
+
+    connection = rados_connect(parsed['cluster'], parsed['user'], parsed['keyring'])
+    if connection is None:
+        return None
+    handle, sigdict = connection
+
+    argdict = validate_command(sigdict, parsed['args'])
+    if not argdict or 'target' in argdict:
+        return None
+    if parsed['format']:
+        argdict['format'] = parsed['format']
+
+    inbuf = b''
+    if parsed['infile'] == '-':
+        inbuf = stdin or b''
+    elif parsed['infile']:
+        with open(parsed['infile'], 'rb') as f:
+            inbuf = f.read()
+    if not isinstance(inbuf, bytes):
+        inbuf = inbuf.encode('utf-8')
+
+    try:
+        ret, outbuf, outs = json_command(handle, argdict=argdict, inbuf=inbuf)
+    except rados.Error:
+        return None
+
+    if parsed['outfile'] and parsed['outfile'] != '-':
+        with open(parsed['outfile'], 'wb') as f:
+            f.write(outbuf)
+        outbuf = b''
+
+    # same return code and error message as the 'ceph' CLI
+    if ret < 0:
+        ret = -ret
+        outs = 'Error {}: {}'.format(errno.errorcode.get(ret, 'Unknown'), outs)
+
+    return ret, outbuf.decode('utf-8'), outs
+
+
 def exec_command(module, cmd, stdin=None):
     '''
     Execute command(s)
     '''
 
+    if rados_enabled():
+        result = rados_command(cmd, stdin=stdin)
+        if result is not None:
+            rc, out, err = result
+            return rc, cmd, out, err
+
     binary_data = False
     if stdin:
         binary_data = True
+
+    # the helper container is never started in check mode
+    timeout = container_session_timeout()
+    session = container_session_exec(cmd) if timeout and not getattr(module, 'check_mode', False) else None
+    if session is not None:
+        container_image, exec_cmd = session
+        if container_session_start(cmd[0], container_image, timeout):
+            # keep the helper container alive while the command runs,
+            # whatever its duration
+            done = threading.Event()
+
+            def heartbeat():
+                while not done.wait(max(1, timeout // 3)):
+                    container_session_refresh(container_image)
+
+            thread = threading.Thread(target=heartbeat)
+            thread.daemon = True
+            thread.start()
+            try:
+                rc, out, err = module.run_command(exec_cmd, data=stdin, binary_data=binary_data)
+            finally:
+                done.set()
+                thread.join()
+                container_session_refresh(container_image)
+            return rc, exec_cmd, out, err
+
     rc, out, err = module.run_command(cmd, data=stdin, binary_data=binary_data)
 
     return rc, cmd, out, err
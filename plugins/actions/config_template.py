@@ -27,6 +27,8 @@ try:
 except ImportError:
     from io import StringIO
 import base64
+import collections
+import hashlib
 import json
 import os
 import pwd
@@ -41,6 +43,7 @@ from ansible.module_utils._text import to_bytes, to_text
 from ansible import constants as C
 from ansible import errors
 from ansible.parsing.yaml.dumper import AnsibleDumper
+from ansible.utils.hashing import checksum_s
 from distutils.version import LooseVersion
 from ansible import __version__ as __ansible_version__
 
@@ -53,164 +56,142 @@ CONFIG_TYPES = {
     'yaml': 'return_config_overrides_yaml'
 }
 
+# Arguments of the copy module changing the file attributes, they still
+# have to be enforced when the content of the destination is up to date.
+FILE_ATTRIBUTE_ARGS = [
+    'owner',
+    'group',
+    'mode',
+    'seuser',
+    'serole',
+    'setype',
+    'selevel',
+    'attributes',
+    'unsafe_writes',
+]
+
+# Every host runs the action plugin in its own worker process so the merged
+# configs are memoized in the controller temporary directory of the run.
+MERGE_CACHE_DIR = os.path.join(C.DEFAULT_LOCAL_TMP, 'config_template')
+
 
 class IDumper(AnsibleDumper):
     def increase_indent(self, flow=False, indentless=False):
         return super(IDumper, self).increase_indent(flow, False)
 
 
-class MultiKeyDict(dict):
-    """Dictionary class which supports duplicate keys.
-    This class allows for an item to be added into a standard python dictionary
-    however if a key is created more than once the dictionary will convert the
-    singular value to a python tuple. This tuple type forces all values to be a
-    string.
-    Example Usage:
-    >>> z = MultiKeyDict()
-    >>> z['a'] = 1
-    >>> z['b'] = ['a', 'b', 'c']
-    >>> z['c'] = {'a': 1}
-    >>> print(z)
-    ... {'a': 1, 'b': ['a', 'b', 'c'], 'c': {'a': 1}}
-    >>> z['a'] = 2
-    >>> print(z)
-    ... {'a': tuple(['1', '2']), 'c': {'a': 1}, 'b': ['a', 'b', 'c']}
-    """
+class MultiValue(list):
+    """List of the values of a key defined more than once.
 
-    def __setitem__(self, key, value):
-        if key in self:
-            if isinstance(self[key], tuple):
-                items = self[key]
-                if str(value) not in items:
-                    items += tuple([str(value)])
-                    super(MultiKeyDict, self).__setitem__(key, items)
-            else:
-                if str(self[key]) != str(value):
-                    items = tuple([str(self[key]), str(value)])
-                    super(MultiKeyDict, self).__setitem__(key, items)
-        else:
-            return dict.__setitem__(self, key, value)
-
-
-class ConfigTemplateParser(ConfigParser.RawConfigParser):
-    """ConfigParser which supports multi key value.
-    The parser will use keys with multiple variables in a set as a multiple
-    key value within a configuration file.
-    Default Configuration file:
-    [DEFAULT]
-    things =
-        url1
-        url2
-        url3
-    other = 1,2,3
-    [section1]
-    key = var1
-    key = var2
-    key = var3
-    Example Usage:
-    >>> cp = ConfigTemplateParser(dict_type=MultiKeyDict)
-    >>> cp.read('/tmp/test.ini')
-    ... ['/tmp/test.ini']
-    >>> cp.get('DEFAULT', 'things')
-    ... \nurl1\nurl2\nurl3
-    >>> cp.get('DEFAULT', 'other')
-    ... '1,2,3'
-    >>> cp.set('DEFAULT', 'key1', 'var1')
-    >>> cp.get('DEFAULT', 'key1')
-    ... 'var1'
-    >>> cp.get('section1', 'key')
-    ... {'var1', 'var2', 'var3'}
-    >>> cp.set('section1', 'key', 'var4')
-    >>> cp.get('section1', 'key')
-    ... {'var1', 'var2', 'var3', 'var4'}
-    >>> with open('/tmp/test2.ini', 'w') as f:
-    ...     cp.write(f)
-    Output file:
-    [DEFAULT]
-    things =
-        url1
-        url2
-        url3
-    key1 = var1
-    other = 1,2,3
-    [section1]
-    key = var4
-    key = var1
-    key = var3
-    key = var2
+    Values are stored as strings and duplicates are dropped, the lookup is
+    done in a set.
     """
 
-    def __init__(self, *args, **kwargs):
-        self._comments = {}
-        self.ignore_none_type = bool(kwargs.pop('ignore_none_type', True))
-        self.default_section = str(kwargs.pop('default_section', 'DEFAULT'))
-        ConfigParser.RawConfigParser.__init__(self, *args, **kwargs)
-
-    def _write(self, fp, section, key, item, entry):
-        if section:
-            # If we are not ignoring a none type value, then print out
-            # the option name only if the value type is None.
-            if not self.ignore_none_type and item is None:
-                fp.write(key + '\n')
-            elif (item is not None) or (self._optcre == self.OPTCRE):
-                fp.write(entry)
-        else:
-            fp.write(entry)
+    def __init__(self, values=()):
+        super(MultiValue, self).__init__()
+        self._index = set()
+        for value in values:
+            self.add(value)
 
-    def _write_check(self, fp, key, value, section=False):
-        if isinstance(value, (tuple, set)):
-            for item in value:
-                item = str(item).replace('\n', '\n\t')
-                entry = "%s = %s\n" % (key, item)
-                self._write(fp, section, key, item, entry)
-        else:
-            if isinstance(value, list):
-                _value = [str(i.replace('\n', '\n\t')) for i in value]
-                entry = '%s = %s\n' % (key, ','.join(_value))
-            else:
-                entry = '%s = %s\n' % (key, str(value).replace('\n', '\n\t'))
-            self._write(fp, section, key, value, entry)
+    def add(self, value):
+        value = str(value)
+        if value not in self._index:
+            self._index.add(value)
+            self.append(value)
 
-    def write(self, fp):
-        def _do_write(section_name, section, section_bool=False):
-            _write_comments(section_name)
-            fp.write("[%s]\n" % section_name)
-            for key, value in sorted(section.items()):
-                _write_comments(section_name, optname=key)
-                self._write_check(fp, key=key, value=value,
-                                  section=section_bool)
-            else:
-                fp.write("\n")
 
-        def _write_comments(section, optname=None):
-            comsect = self._comments.get(section, {})
-            if optname in comsect:
-                fp.write(''.join(comsect[optname]))
+class IniConfig(object):
+    """Ordered INI model used to merge the config overrides.
 
-        if self.default_section != 'DEFAULT' and self._sections.get(
-                self.default_section, False):
-            _do_write(self.default_section,
-                      self._sections[self.default_section],
-                      section_bool=True)
-            self._sections.pop(self.default_section)
+    This implements the subset of the RawConfigParser interface used by
+    the config_template action (read_file, defaults, sections, has_section,
+    items, add_section, remove_option, set and write), keys defined more
+    than once are kept.
+    Sections are kept in an ordered dict of plain dicts so that every lookup
+    is a hash lookup, keys defined multiple times are stored as MultiValue
+    and the merged dict of a section is built without copying the defaults.
 
-        if self._defaults:
-            _do_write('DEFAULT', self._defaults)
+    Example Usage:
+    >>> config = IniConfig()
+    >>> config.read_file(StringIO('[global]\nkey = var1\nkey = var2\n'))
+    >>> config.set('global', 'other', 'var3')
+    >>> config.write(fp)
+    ... [global]
+    ... key = var1
+    ... key = var2
+    ... other = var3
+    """
 
-        for section in sorted(self._sections):
-            _do_write(section, self._sections[section], section_bool=True)
+    SECTCRE = ConfigParser.RawConfigParser.SECTCRE
+    OPTCRE = ConfigParser.RawConfigParser.OPTCRE_NV
 
-    def _read(self, fp, fpname):
+    def __init__(self, ignore_none_type=True, default_section='DEFAULT'):
+        self.ignore_none_type = bool(ignore_none_type)
+        self.default_section = str(default_section)
+        self._defaults = {}
+        self._sections = collections.OrderedDict()
+        self._comments = {}
+
+    def _section(self, section):
+        if not section or section == 'DEFAULT':
+            return self._defaults
+        try:
+            return self._sections[section]
+        except KeyError:
+            raise ConfigParser.NoSectionError(section)
+
+    def defaults(self):
+        return self._defaults
+
+    def sections(self):
+        return list(self._sections)
+
+    def has_section(self, section):
+        return section in self._sections
+
+    def items(self, section):
+        options = self._section(section)
+        for key, value in self._defaults.items():
+            yield key, options.get(key, value)
+        for key, value in options.items():
+            if key not in self._defaults:
+                yield key, value
+
+    def add_section(self, section):
+        if section == 'DEFAULT':
+            raise ValueError('Invalid section name: %r' % section)
+        if section in self._sections:
+            raise ConfigParser.DuplicateSectionError(section)
+        self._sections[section] = {}
+
+    def remove_option(self, section, option):
+        options = self._section(section)
+        existed = option in options
+        if existed:
+            del options[option]
+        return existed
+
+    def set(self, section, option, value=None):
+        self._section(section)[option] = value
+
+    @staticmethod
+    def _add(options, option, value):
+        if option not in options:
+            options[option] = value
+            return
+        current = options[option]
+        if isinstance(current, MultiValue):
+            current.add(value)
+        elif str(current) != str(value):
+            options[option] = MultiValue([current, value])
+
+    def read_file(self, fp, source='<???>'):
         comments = []
-        cursect = None
+        comsect = None
+        options = None
         optname = None
-        lineno = 0
         e = None
-        while True:
-            line = fp.readline()
-            if not line:
-                break
-            lineno += 1
+        for lineno, line in enumerate(fp, start=1):
             if line.strip() == '':
                 if comments:
                     comments.append('')
@@ -222,80 +203,112 @@ class ConfigTemplateParser(ConfigParser.RawConfigParser):
 
             if line.split(None, 1)[0].lower() == 'rem' and line[0] in "rR":
                 continue
-            if line[0].isspace() and cursect is not None and optname:
+
+            if line[0].isspace() and options is not None and optname:
                 value = line.strip()
                 if value:
-                    try:
-                        if isinstance(cursect[optname], (tuple, set)):
-                            _temp_item = list(cursect[optname])
-                            del cursect[optname]
-                            cursect[optname] = _temp_item
-                        elif isinstance(cursect[optname], six.text_type):
-                            _temp_item = [cursect[optname]]
-                            del cursect[optname]
-                            cursect[optname] = _temp_item
-                    except NameError:
-                        if isinstance(cursect[optname], (bytes, str)):
-                            _temp_item = [cursect[optname]]
-                            del cursect[optname]
-                            cursect[optname] = _temp_item
-                    cursect[optname].append(value)
+                    current = options[optname]
+                    if isinstance(current, MultiValue):
+                        options[optname] = current = list(current)
+                    elif isinstance(current, six.text_type):
+                        options[optname] = current = [current]
+                    current.append(value)
+                continue
+
+            mo = self.SECTCRE.match(line)
+            if mo:
+                sectname = mo.group('header')
+                if sectname == 'DEFAULT' and sectname not in self._sections:
+                    options = self._defaults
+                else:
+                    options = self._sections.setdefault(sectname, {})
+                optname = None
+
+                comsect = self._comments.setdefault(sectname, {})
+                if comments:
+                    # NOTE(flaper87): Using none as the key for
+                    # section level comments
+                    comsect[None] = comments
+                    comments = []
+            elif options is None:
+                raise ConfigParser.MissingSectionHeaderError(
+                    source,
+                    lineno,
+                    line
+                )
             else:
-                mo = self.SECTCRE.match(line)
+                mo = self.OPTCRE.match(line)
                 if mo:
-                    sectname = mo.group('header')
-                    if sectname in self._sections:
-                        cursect = self._sections[sectname]
-                    elif sectname == 'DEFAULT':
-                        cursect = self._defaults
-                    else:
-                        cursect = self._dict()
-                        self._sections[sectname] = cursect
-                    optname = None
-
-                    comsect = self._comments.setdefault(sectname, {})
+                    optname, vi, optval = mo.group('option', 'vi', 'value')
+                    optname = optname.rstrip()
+                    if optval is not None:
+                        if vi in ('=', ':') and ';' in optval:
+                            pos = optval.find(';')
+                            if pos != -1 and optval[pos - 1].isspace():
+                                optval = optval[:pos]
+                        optval = optval.strip()
+                        if optval == '""':
+                            optval = ''
+                    self._add(options, optname, optval)
                     if comments:
-                        # NOTE(flaper87): Using none as the key for
-                        # section level comments
-                        comsect[None] = comments
+                        comsect[optname] = comments
                         comments = []
-                elif cursect is None:
-                    raise ConfigParser.MissingSectionHeaderError(
-                        fpname,
-                        lineno,
-                        line
-                    )
                 else:
-                    mo = self._optcre.match(line)
-                    if mo:
-                        optname, vi, optval = mo.group('option', 'vi', 'value')
-                        optname = self.optionxform(optname.rstrip())
-                        if optval is not None:
-                            if vi in ('=', ':') and ';' in optval:
-                                pos = optval.find(';')
-                                if pos != -1 and optval[pos - 1].isspace():
-                                    optval = optval[:pos]
-                            optval = optval.strip()
-                            if optval == '""':
-                                optval = ''
-                        cursect[optname] = optval
-                        if comments:
-                            comsect[optname] = comments
-                            comments = []
-                    else:
-                        if not e:
-                            e = ConfigParser.ParsingError(fpname)
-                        e.append(lineno, repr(line))
+                    if not e:
+                        e = ConfigParser.ParsingError(source)
+                    e.append(lineno, repr(line))
         if e:
             raise e
-        all_sections = [self._defaults]
-        all_sections.extend(self._sections.values())
-        for options in all_sections:
+        for options in [self._defaults] + list(self._sections.values()):
             for name, val in options.items():
-                if isinstance(val, list):
-                    _temp_item = '\n'.join(val)
-                    del options[name]
-                    options[name] = _temp_item
+                if type(val) is list:
+                    options[name] = '\n'.join(val)
+
+    def _write_option(self, fp, key, value, section=False):
+        if isinstance(value, (tuple, set, MultiValue)):
+            items = [str(i).replace('\n', '\n\t') for i in value]
+        elif isinstance(value, list):
+            items = [','.join(str(i.replace('\n', '\n\t')) for i in value)]
+        elif value is not None:
+            items = [str(value).replace('\n', '\n\t')]
+        else:
+            items = [None]
+
+        for item in items:
+            if section and item is None:
+                # If we are not ignoring a none type value, then print out
+                # the option name only if the value type is None.
+                if not self.ignore_none_type:
+                    fp.write(key + '\n')
+            else:
+                fp.write('%s = %s\n' % (key, item))
+
+    def _write_section(self, fp, section_name, options, section=False):
+        comsect = self._comments.get(section_name, {})
+        if None in comsect:
+            fp.write(''.join(comsect[None]))
+        fp.write('[%s]\n' % section_name)
+        for key in sorted(options):
+            if key in comsect:
+                fp.write(''.join(comsect[key]))
+            self._write_option(fp, key, options[key], section=section)
+        fp.write('\n')
+
+    def write(self, fp):
+        sections = self._sections.copy()
+        # like ConfigTemplateParser, whose default_section was reset to
+        # DEFAULT by the RawConfigParser constructor on python 3
+        if six.PY2 and self.default_section != 'DEFAULT' and sections.get(
+                self.default_section, False):
+            self._write_section(fp, self.default_section,
+                                sections.pop(self.default_section),
+                                section=True)
+
+        if self._defaults:
+            self._write_section(fp, 'DEFAULT', self._defaults)
+
+        for section in sorted(sections):
+            self._write_section(fp, section, sections[section], section=True)
 
 
 class DictCompare(object):
@@ -406,22 +419,13 @@ class ActionModule(ActionBase):
         :param resultant: ``str`` || ``unicode``
         :returns: ``str``, ``dict``
         """
-        # If there is an exception loading the RawConfigParser The config obj
-        #  is loaded again without the extra option. This is being done to
-        #  support older python.
-        try:
-            config = ConfigTemplateParser(
-                allow_no_value=True,
-                dict_type=MultiKeyDict,
-                ignore_none_type=ignore_none_type,
-                default_section=default_section
-            )
-            config.optionxform = str
-        except Exception:
-            config = ConfigTemplateParser(dict_type=MultiKeyDict)
+        config = IniConfig(
+            ignore_none_type=ignore_none_type,
+            default_section=default_section
+        )
 
         config_object = StringIO(resultant)
-        config.readfp(config_object)
+        config.read_file(config_object)
 
         for section, items in config_overrides.items():
             # If the items value is not a dictionary it is assumed that the
@@ -440,7 +444,8 @@ class ActionModule(ActionBase):
                 #  an error is raised that is related to the section
                 #  already existing.
                 try:
-                    config.add_section(section)
+                    if not config.has_section(section):
+                        config.add_section(section)
                 except (ConfigParser.DuplicateSectionError, ValueError):
                     pass
                 for key, value in items.items():
@@ -579,6 +584,57 @@ class ActionModule(ActionBase):
                 base_items[key] = new_items[key]
         return base_items
 
+    def _merge_config(self, _vars, resultant):
+        """Return the resultant merged with the config overrides.
+
+        The result is memoized across hosts: hosts sharing the same rendered
+        template and the same overrides get the merged config from the cache.
+
+        :param _vars: ``dict``
+        :param resultant: ``str`` || ``unicode``
+        :returns: ``str``
+        """
+        try:
+            key = hashlib.sha1(to_bytes(json.dumps(
+                [resultant, _vars['config_overrides'], _vars['config_type'],
+                 _vars.get('list_extend', True),
+                 _vars.get('ignore_none_type', True),
+                 _vars.get('default_section', 'DEFAULT')],
+                sort_keys=True
+            ))).hexdigest()
+        except (TypeError, ValueError):
+            key = None
+
+        if key:
+            cache_path = os.path.join(MERGE_CACHE_DIR, key)
+            try:
+                with open(cache_path, 'rb') as f:
+                    return to_text(f.read())
+            except (IOError, OSError):
+                pass
+
+        type_merger = getattr(self, CONFIG_TYPES.get(_vars['config_type']))
+        resultant, _ = type_merger(
+            config_overrides=_vars['config_overrides'],
+            resultant=resultant,
+            list_extend=_vars.get('list_extend', True),
+            ignore_none_type=_vars.get('ignore_none_type', True),
+            default_section=_vars.get('default_section', 'DEFAULT')
+        )
+
+        if key:
+            try:
+                if not os.path.isdir(MERGE_CACHE_DIR):
+                    os.makedirs(MERGE_CACHE_DIR)
+                fd, tmp_path = tmpfilelib.mkstemp(dir=MERGE_CACHE_DIR)
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(to_bytes(resultant))
+                os.rename(tmp_path, cache_path)
+            except (IOError, OSError):
+                pass
+
+        return resultant
+
     def _load_options_and_status(self, task_vars):
         """Return options and status from module load."""
 
@@ -656,7 +712,7 @@ class ActionModule(ActionBase):
         # options that don't have a '=' or ':' suffix. In these cases,
         # ConfigParser gives these options a "None" value. If ignore_none_type
         # is set to true, these key/value options will be ignored, if it's set
-        # to false, then ConfigTemplateParser will write out only the option
+        # to false, then IniConfig will write out only the option
         # name with out the '=' or ':' suffix. The default is true.
         ignore_none_type = self._task.args.get('ignore_none_type', True)
 
@@ -673,6 +729,35 @@ class ActionModule(ActionBase):
             default_section=default_section
         )
 
+    def _ensure_file_attributes(self, _vars, task_vars):
+        """Enforce the file attributes of an up to date destination.
+
+        The file module is only called if attributes were requested.
+
+        :param _vars: ``dict``
+        :param task_vars: ``dict``
+        :returns: ``dict``
+        """
+        file_args = dict(
+            (k, v) for k, v in self._task.args.items()
+            if k in FILE_ATTRIBUTE_ARGS and v is not None
+        )
+        if not file_args:
+            return dict(changed=False, dest=_vars['dest'])
+
+        file_args.update(
+            dict(
+                path=_vars['dest'],
+                state='file',
+                follow=True,
+            )
+        )
+        return self._execute_module(
+            module_name='file',
+            module_args=file_args,
+            task_vars=task_vars
+        )
+
     def run(self, tmp=None, task_vars=None):
         """Run the method"""
 
@@ -739,15 +824,49 @@ class ActionModule(ActionBase):
         )
 
         config_dict_base = {}
-        type_merger = getattr(self, CONFIG_TYPES.get(_vars['config_type']))
-        resultant, config_dict_base = type_merger(
-            config_overrides=_vars['config_overrides'],
-            resultant=resultant,
-            list_extend=_vars.get('list_extend', True),
-            ignore_none_type=_vars.get('ignore_none_type', True),
-            default_section=_vars.get('default_section', 'DEFAULT')
+        if self._play_context.diff:
+            type_merger = getattr(self,
+                                  CONFIG_TYPES.get(_vars['config_type']))
+            resultant, config_dict_base = type_merger(
+                config_overrides=_vars['config_overrides'],
+                resultant=resultant,
+                list_extend=_vars.get('list_extend', True),
+                ignore_none_type=_vars.get('ignore_none_type', True),
+                default_section=_vars.get('default_section', 'DEFAULT')
+            )
+        else:
+            resultant = self._merge_config(_vars, resultant)
+
+        # Re-template the resultant object as it may have new data within it
+        #  as provided by an override variable.
+        resultant = self._templar.template(
+            resultant,
+            preserve_trailing_newlines=True,
+            escape_backslashes=False,
+            convert_data=False
         )
 
+        # Compare the checksum of the result with the destination one, there's
+        #  nothing to transfer nor to diff when they match.
+        try:
+            dest_stat = self._execute_remote_stat(
+                _vars['dest'],
+                all_vars=task_vars,
+                follow=True
+            )
+        except errors.AnsibleError:
+            dest_stat = {}
+        if dest_stat.get('checksum') == checksum_s(resultant):
+            rc = self._ensure_file_attributes(_vars, task_vars)
+            if self._play_context.diff:
+                rc['diff'] = []
+                rc['diff'].append({'prepared': json.dumps(
+                    {'added': {}, 'removed': {}, 'changed': {}},
+                    indent=4, sort_keys=True)})
+            if self._task.args.get('content'):
+                os.remove(_vars['source'])
+            return rc
+
         changed = False
         if self._play_context.diff:
             slurpee = self._execute_module(
@@ -781,15 +900,6 @@ class ActionModule(ActionBase):
             cmp_dicts = DictCompare(config_dict_new, config_dict_base)
             mods, changed = cmp_dicts.get_changes()
 
-        # Re-template the resultant object as it may have new data within it
-        #  as provided by an override variable.
-        resultant = self._templar.template(
-            resultant,
-            preserve_trailing_newlines=True,
-            escape_backslashes=False,
-            convert_data=False
-        )
-
         # run the copy module
         new_module_args = self._task.args.copy()
         # Access to protected method is unavoidable in Ansible
@@ -0,0 +1,242 @@
+"""Ansible callback plugin to profile the wall time of the tasks per host and
+per loop item.
+
+Enable it by adding installer_profile to callback_whitelist in ansible.cfg.
+"""
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import json
+import time
+from collections import OrderedDict
+from datetime import datetime
+from ansible.plugins.callback import CallbackBase
+
+DOCUMENTATION = '''
+    callback: installer_profile
+    type: aggregate
+    short_description: profile the tasks per host and per loop item
+    description:
+        - Record the wall time of each task, of each task on each host and of
+          each loop item, print the slowest ones at the end of the run and
+          write them to a Chrome trace file (chrome://tracing, perfetto)
+          that can be compared between runs.
+    requirements:
+        - enable in configuration
+    options:
+        top:
+            description: Number of the slowest tasks, hosts and items to print.
+            default: 20
+            type: int
+            env:
+                - name: CEPH_ANSIBLE_PROFILE_TOP
+            ini:
+                - section: callback_installer_profile
+                  key: top
+        trace_file:
+            description: Path of the Chrome trace file, an empty value disables it.
+            default: ceph-ansible-profile.json
+            type: path
+            env:
+                - name: CEPH_ANSIBLE_PROFILE_TRACE_FILE
+            ini:
+                - section: callback_installer_profile
+                  key: trace_file
+'''
+
+
+class CallbackModule(CallbackBase):
+    """This callback profiles the tasks per host and per loop item."""
+
+    CALLBACK_VERSION = 2.0
+    CALLBACK_TYPE = 'aggregate'
+    CALLBACK_NAME = 'installer_profile'
+    CALLBACK_NEEDS_WHITELIST = True
+
+    def __init__(self):
+        super(CallbackModule, self).__init__()
+        self.top = 20
+        self.trace_file = 'ceph-ansible-profile.json'
+        self.playbook = None
+        self.start = time.time()
+        self.tasks = OrderedDict()
+        self.items = []
+        self._item_marks = {}
+
+    def set_options(self, task_keys=None, var_options=None, direct=None):
+        super(CallbackModule, self).set_options(task_keys=task_keys, var_options=var_options, direct=direct)
+        self.top = self.get_option('top')
+        self.trace_file = self.get_option('trace_file')
+
+    def v2_playbook_on_start(self, playbook):
+        self.playbook = playbook._file_name
+        self.start = time.time()
+
+    def _task_start(self, task):
+        now = time.time()
+        self.tasks[task._uuid] = dict(
+            name=task.get_name().strip(),
+            role=task._role.get_name() if task._role else None,
+            path=task.get_path(),
+            start=now,
+            end=now,
+            hosts=OrderedDict(),
+        )
+
+    def v2_playbook_on_task_start(self, task, is_conditional):
+        self._task_start(task)
+
+    def v2_playbook_on_handler_task_start(self, task):
+        self._task_start(task)
+
+    def v2_runner_on_start(self, host, task):
+        now = time.time()
+        record = self.tasks.get(task._uuid)
+        if record is not None:
+            record['hosts'][host.get_name()] = dict(start=now, end=now, status=None)
+        self._item_marks[(task._uuid, host.get_name())] = now
+
+    def _host_end(self, result, status):
+        now = time.time()
+        record = self.tasks.get(result._task._uuid)
+        if record is None:
+            return
+        host = record['hosts'].setdefault(result._host.get_name(), dict(start=record['start']))
+        host['end'] = now
+        host['status'] = status
+        record['end'] = max(record['end'], now)
+
+    def v2_runner_on_ok(self, result):
+        self._host_end(result, 'ok')
+
+    def v2_runner_on_failed(self, result, ignore_errors=False):
+        self._host_end(result, 'ignored' if ignore_errors else 'failed')
+
+    def v2_runner_on_skipped(self, result):
+        self._host_end(result, 'skipped')
+
+    def v2_runner_on_unreachable(self, result):
+        self._host_end(result, 'unreachable')
+
+    def _item_end(self, result, status):
+        # the items of a host are run one after the other, an item starts
+        # when the previous one (or the task on the host) ends
+        now = time.time()
+        record = self.tasks.get(result._task._uuid)
+        host = result._host.get_name()
+        key = (result._task._uuid, host)
+        start = self._item_marks.get(key, record['start'] if record else now)
+        self._item_marks[key] = now
+        label = result._result.get('_ansible_item_label', result._result.get('item'))
+        self.items.append(dict(
+            task=record['name'] if record else result._task.get_name().strip(),
+            role=record['role'] if record else None,
+            host=host,
+            item=label if isinstance(label, str) else json.dumps(label, sort_keys=True, default=str),
+            start=start,
+            end=now,
+            status=status,
+        ))
+
+    def v2_runner_item_on_ok(self, result):
+        self._item_end(result, 'ok')
+
+    def v2_runner_item_on_failed(self, result):
+        self._item_end(result, 'failed')
+
+    def v2_runner_item_on_skipped(self, result):
+        self._item_end(result, 'skipped')
+
+    def v2_playbook_on_stats(self, stats):
+        self._display.banner('INSTALLER PROFILE')
+
+        self._display.display('Slowest tasks:')
+        for record in top(self.tasks.values(), self.top):
+            self._display.display('{}  {}'.format(format_duration(record), task_label(record['name'], record['role'])))
+
+        self._display.display('Slowest tasks per host:')
+        for host, record in top(host_records(self.tasks.values()), self.top, key=lambda r: r[1]):
+            self._display.display('{}  {} | {}'.format(format_duration(record), host, task_label(record['task']['name'], record['task']['role'])))
+
+        if self.items:
+            self._display.display('Slowest loop items:')
+            for item in top(self.items, self.top):
+                self._display.display('{}  {} | {} | {}'.format(format_duration(item), item['host'], task_label(item['task'], item['role']), item['item']))
+
+        if self.trace_file:
+            with open(self.trace_file, 'w') as f:
+                json.dump(chrome_trace(self.playbook, self.start, self.tasks.values(), self.items), f)
+            self._display.display('Profile written to {}'.format(self.trace_file))
+
+        self._display.display("", screen_only=True)
+
+
+def duration(record):
+    """ Return the duration of a task, a host or an item record """
+    return record['end'] - record['start']
+
+
+def format_duration(record):
+    """ Format the duration of a record in seconds """
+    return '{:>9.2f}s'.format(duration(record))
+
+
+def task_label(name, role):
+    """ Prefix the task name with its role """
+    if role:
+        return '{} : {}'.format(role, name)
+    return name
+
+
+def top(records, count, key=lambda r: r):
+    """ Return the count longest records """
+    return sorted(records, key=lambda r: duration(key(r)), reverse=True)[:count]
+
+
+def host_records(tasks):
+    """ Yield (host, record) for each host of each task """
+    for task in tasks:
+        for host, record in task['hosts'].items():
+            yield host, dict(record, task=task)
+
+
+def chrome_trace(playbook, start, tasks, items):
+    """ Build a Chrome trace, a thread per host """
+    tids = OrderedDict()
+    events = []
+
+    def event(name, category, record, tid, args):
+        return dict(
+            name=name,
+            cat=category,
+            ph='X',
+            ts=int((record['start'] - start) * 1000000),
+            dur=int(duration(record) * 1000000),
+            pid=1,
+            tid=tid,
+            args=args,
+        )
+
+    for task in tasks:
+        for host, record in task['hosts'].items():
+            tid = tids.setdefault(host, len(tids) + 1)
+            events.append(event(task['name'], task['role'] or 'playbook', record, tid,
+                                dict(status=record.get('status'), path=task['path'])))
+    for item in items:
+        tid = tids.setdefault(item['host'], len(tids) + 1)
+        events.append(event('{} [{}]'.format(item['task'], item['item']), 'item', item, tid,
+                            dict(status=item['status'])))
+
+    for host, tid in tids.items():
+        events.append(dict(name='thread_name', ph='M', pid=1, tid=tid, args=dict(name=host)))
+
+    return dict(
+        traceEvents=events,
+        displayTimeUnit='ms',
+        otherData=dict(
+            playbook=playbook,
+            start=datetime.utcfromtimestamp(start).strftime('%Y%m%d%H%M%SZ'),
+            tasks=[dict(name=task['name'], role=task['role'], path=task['path'],
+                        duration=round(duration(task), 3)) for task in tasks],
+        ),
+    )
@@ -3,6 +3,8 @@ __metaclass__ = type
 
 from ansible import errors
 
+import bisect
+
 try:
     import netaddr
 except ImportError:
@@ -13,12 +15,54 @@ except ImportError:
 class FilterModule(object):
     ''' IP addresses within IP ranges '''
 
+    # compiled ranges, keyed by the list of ranges
+    _ranges_cache = {}
+
+    def compile_ranges(self, ip_ranges):
+        '''
+        Build a sorted, non overlapping, interval index of the ranges for each
+        IP version: {version: ([first, ...], [last, ...])}
+        '''
+        key = tuple(ip_ranges)
+        if key in self._ranges_cache:
+            return self._ranges_cache[key]
+
+        intervals = {}
+        for ip_range in ip_ranges:
+            network = netaddr.IPNetwork(ip_range)
+            intervals.setdefault(network.version, []).append(
+                (network.first, network.last))
+
+        index = {}
+        for version, items in intervals.items():
+            firsts, lasts = [], []
+            for first, last in sorted(items):
+                if lasts and first <= lasts[-1] + 1:
+                    # overlapping or adjacent ranges
+                    lasts[-1] = max(lasts[-1], last)
+                else:
+                    firsts.append(first)
+                    lasts.append(last)
+            index[version] = (firsts, lasts)
+
+        self._ranges_cache[key] = index
+        return index
+
     def ips_in_ranges(self, ip_addresses, ip_ranges):
+        index = self.compile_ranges(ip_ranges)
         ips_in_ranges = list()
+        seen = set()
         for ip_addr in ip_addresses:
-            for ip_range in ip_ranges:
-                if netaddr.IPAddress(ip_addr) in netaddr.IPNetwork(ip_range):
-                    ips_in_ranges.append(ip_addr)
+            if ip_addr in seen:
+                continue
+            seen.add(ip_addr)
+            ip = netaddr.IPAddress(ip_addr)
+            if ip.version not in index:
+                continue
+            firsts, lasts = index[ip.version]
+            i = bisect.bisect_right(firsts, int(ip)) - 1
+            if i >= 0 and int(ip) <= lasts[i]:
+                ips_in_ranges.append(ip_addr)
         return ips_in_ranges
 
     def filters(self):
@@ -0,0 +1,125 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+DOCUMENTATION = '''
+    lookup: ceph_facts_cache
+    short_description: Controller side cache of the Ceph cluster facts
+    description:
+        - Read, update or invalidate the cluster wide facts (fsid, running
+          monitor, ...) cached on the controller, so they are queried from
+          the monitors once instead of in every play.
+        - Each fact expires C(ttl) seconds after it was cached.
+    options:
+        _terms:
+            description: The cache key, e.g. the cluster name and its monitors.
+            required: true
+        facts:
+            description: Facts to add to the cache.
+            type: dict
+        ttl:
+            description: Time to live of the cached facts, in seconds.
+            type: int
+            default: 300
+        path:
+            description: Directory of the cache files.
+            type: path
+            default: ~/.ansible/ceph_facts
+        invalidate:
+            description: Drop all the facts cached for the key.
+            type: bool
+            default: False
+'''
+
+EXAMPLES = '''
+- name: read the cached facts
+  set_fact:
+    _cached: "{{ lookup('ceph_facts_cache', cluster ~ ':' ~ groups[mon_group_name] | join(','), ttl=600) }}"
+
+- name: cache the fsid
+  set_fact:
+    _cached: "{{ lookup('ceph_facts_cache', cluster ~ ':' ~ groups[mon_group_name] | join(','), facts={'fsid': fsid}) }}"
+'''
+
+RETURN = '''
+    _raw:
+        description: The facts that haven't expired, after the update.
+        type: dict
+'''
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+from ansible.errors import AnsibleError
+from ansible.module_utils._text import to_bytes
+from ansible.plugins.lookup import LookupBase
+from ansible.utils.display import Display
+
+display = Display()
+
+
+def cache_file(path, key):
+    '''
+    Return the cache file of a key
+    '''
+
+    return os.path.join(path, hashlib.sha1(to_bytes(key)).hexdigest() + '.json')
+
+
+def read_cache(filename, ttl, now=None):
+    '''
+    Return the cached entries younger than ttl: {fact: {value, time}}
+    '''
+
+    now = time.time() if now is None else now
+    try:
+        with open(filename) as f:
+            entries = json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+
+    return dict((fact, entry) for fact, entry in entries.items() if now - entry['time'] < ttl)
+
+
+def write_cache(filename, entries):
+    '''
+    Atomically replace the cache file
+    '''
+
+    dirname = os.path.dirname(filename)
+    if not os.path.isdir(dirname):
+        os.makedirs(dirname, 0o700)
+
+    fd, tmp = tempfile.mkstemp(dir=dirname, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(entries, f)
+    os.rename(tmp, filename)
+
+
+class LookupModule(LookupBase):
+
+    def run(self, terms, variables=None, facts=None, ttl=300, path='~/.ansible/ceph_facts', invalidate=False, **kwargs):
+        if len(terms) != 1:
+            raise AnsibleError('ceph_facts_cache expects a single cache key')
+
+        filename = cache_file(os.path.expanduser(path), terms[0])
+
+        if invalidate:
+            if os.path.exists(filename):
+                os.unlink(filename)
+            return [{}]
+
+        now = time.time()
+        entries = read_cache(filename, int(ttl), now)
+
+        if facts:
+            for fact, value in facts.items():
+                entries[fact] = dict(value=value, time=now)
+            try:
+                write_cache(filename, entries)
+            except (IOError, OSError) as e:
+                display.warning('Could not write the ceph facts cache {}: {}'.format(filename, e))
+
+        return [dict((fact, entry['value']) for fact, entry in entries.items())]
@@ -0,0 +1,191 @@
+import json
+import os
+import stat
+import sys
+import time
+import tracemalloc
+
+from mock.mock import patch
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'library'))
+import ca_test_common  # noqa: E402
+
+BASELINES = os.path.join(HERE, 'baselines.json')
+BINARIES = ['ceph', 'ceph-volume', 'radosgw-admin']
+WRAPPER = '''#!{python}
+import sys
+sys.path.insert(0, {here!r})
+import fake_ceph
+sys.exit(fake_ceph.main(sys.argv))
+'''
+
+WALL_SLACK = 0.25
+
+# the measures of the session, written to BASELINES with --benchmark-update
+RESULTS = {}
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('benchmarks')
+    group.addoption('--benchmark-items', type=int, default=10,
+                    help='number of items (pools, keys, users, ...) of each workload')
+    group.addoption('--benchmark-latency', type=float, default=0.01,
+                    help='seconds added to each fake ceph command')
+    group.addoption('--benchmark-resources', action='store_true',
+                    help='also check the wall time and peak memory against the baselines')
+    group.addoption('--benchmark-tolerance', type=float, default=1.5,
+                    help='allowed wall time and peak memory growth over the baselines')
+    group.addoption('--benchmark-update', action='store_true',
+                    help='record the measures as the new baselines')
+
+
+def load_baselines():
+    if not os.path.exists(BASELINES):
+        return dict(latency=None, benchmarks={})
+    with open(BASELINES) as f:
+        return json.load(f)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    config = session.config
+    if not config.getoption('--benchmark-update', default=False) or not RESULTS:
+        return
+    baselines = load_baselines()
+    if baselines['latency'] != config.getoption('--benchmark-latency'):
+        baselines = dict(benchmarks={})
+    baselines['latency'] = config.getoption('--benchmark-latency')
+    baselines['benchmarks'].update(RESULTS)
+    with open(BASELINES, 'w') as f:
+        json.dump(baselines, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def pytest_terminal_summary(terminalreporter):
+    if not RESULTS:
+        return
+    terminalreporter.section('benchmarks')
+    terminalreporter.write_line('{:<40} {:>9} {:>10} {:>10}'.format('benchmark', 'commands', 'wall (s)', 'peak (KiB)'))
+    for name, measure in sorted(RESULTS.items()):
+        terminalreporter.write_line('{:<40} {:>9} {:>10.3f} {:>10}'.format(name, measure['calls'], measure['wall'], measure['peak_kb']))
+
+
+class FakeCeph(object):
+    '''
+    The fake ceph binaries installed in a temporary directory
+    '''
+
+    def __init__(self, path):
+        self.bindir = os.path.join(path, 'bin')
+        self.state_file = os.path.join(path, 'state.json')
+        self.log_file = os.path.join(path, 'commands.log')
+        os.makedirs(self.bindir)
+        for binary in BINARIES:
+            wrapper = os.path.join(self.bindir, binary)
+            with open(wrapper, 'w') as f:
+                f.write(WRAPPER.format(python=sys.executable, here=HERE))
+            os.chmod(wrapper, os.stat(wrapper).st_mode | stat.S_IXUSR)
+        self.reset_calls()
+
+    def reset_calls(self):
+        open(self.log_file, 'w').close()
+
+    def calls(self):
+        with open(self.log_file) as f:
+            return [json.loads(line) for line in f]
+
+    def state(self):
+        with open(self.state_file) as f:
+            return json.load(f)
+
+
+@pytest.fixture
+def fake_ceph(tmpdir, monkeypatch, request):
+    fake = FakeCeph(str(tmpdir))
+    monkeypatch.setenv('PATH', fake.bindir + os.pathsep + os.environ.get('PATH', ''))
+    monkeypatch.setenv('FAKE_CEPH_STATE', fake.state_file)
+    monkeypatch.setenv('FAKE_CEPH_LOG', fake.log_file)
+    monkeypatch.setenv('FAKE_CEPH_LATENCY', str(request.config.getoption('--benchmark-latency')))
+    monkeypatch.setenv('CEPH_RADOS_BACKEND', 'false')
+    monkeypatch.delenv('CEPH_CONTAINER_IMAGE', raising=False)
+    return fake
+
+
+@pytest.fixture
+def items(request):
+    return request.config.getoption('--benchmark-items')
+
+
+def run_module(module, args):
+    '''
+    Run a module in process, return its result
+    '''
+
+    ca_test_common.set_module_args(dict(args))
+    with patch('ansible.module_utils.basic.AnsibleModule.exit_json') as m_exit_json, \
+            patch('ansible.module_utils.basic.AnsibleModule.fail_json') as m_fail_json:
+        m_exit_json.side_effect = ca_test_common.exit_json
+        m_fail_json.side_effect = ca_test_common.fail_json
+        try:
+            module.main()
+        except ca_test_common.AnsibleExitJson as e:
+            return e.args[0]
+        except ca_test_common.AnsibleFailJson as e:
+            pytest.fail('{} failed: {}'.format(module.__name__, e.args[0]))
+
+
+@pytest.fixture
+def run(fake_ceph):
+    '''
+    Run a module against the fake ceph without measuring it
+    '''
+
+    return run_module
+
+
+@pytest.fixture
+def benchmark(request, fake_ceph, items):
+    '''
+    Run a workload (a list of module invocations) and check its number of
+    commands (and with --benchmark-resources its wall time and peak memory)
+    against the baselines
+    '''
+
+    config = request.config
+    baselines = load_baselines()
+
+    def run(name, module, invocations):
+        key = '{}[{}]'.format(name, items)
+        fake_ceph.reset_calls()
+        tracemalloc.start()
+        start = time.time()
+        try:
+            results = [run_module(module, args) for args in invocations]
+        finally:
+            wall = time.time() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        measure = dict(calls=len(fake_ceph.calls()), wall=round(wall, 3), peak_kb=peak // 1024)
+        RESULTS[key] = measure
+
+        baseline = baselines['benchmarks'].get(key)
+        if baseline is not None and not config.getoption('--benchmark-update'):
+            # the number of commands is deterministic, it can't grow
+            assert measure['calls'] <= baseline['calls'], \
+                '{}: {} commands, the baseline is {}'.format(key, measure['calls'], baseline['calls'])
+            # the wall time and the peak memory depend on the machine and the
+            # python version the baselines were recorded with
+            if config.getoption('--benchmark-resources'):
+                tolerance = config.getoption('--benchmark-tolerance')
+                # the wall time is only comparable at the same latency, the
+                # slack absorbs the noise of the short workloads
+                if baselines['latency'] == config.getoption('--benchmark-latency'):
+                    assert measure['wall'] <= baseline['wall'] * tolerance + WALL_SLACK, \
+                        '{}: {}s, the baseline is {}s'.format(key, measure['wall'], baseline['wall'])
+                assert measure['peak_kb'] <= baseline['peak_kb'] * tolerance, \
+                    '{}: {}KiB peak memory, the baseline is {}KiB'.format(key, measure['peak_kb'], baseline['peak_kb'])
+
+        return results
+
+    return run
@@ -0,0 +1,461 @@
+"""Stateful stand-in for the ceph, ceph-volume and radosgw-admin CLIs.
+
+Only the commands run by the benchmarked modules are implemented. The
+cluster state is a json file shared by all the invocations
+(FAKE_CEPH_STATE), each invocation is appended to FAKE_CEPH_LOG and
+sleeps FAKE_CEPH_LATENCY seconds to simulate the CLI (or container)
+startup.
+"""
+from __future__ import absolute_import, division, print_function
+
+import fcntl
+import json
+import os
+import sys
+import time
+import uuid
+
+# options followed by a separate value
+VALUE_OPTIONS = {
+    'ceph': ['-n', '-k', '--cluster', '-f', '--format', '-o', '-i',
+             '--pg_num', '--pgp_num', '--size', '--target_size_ratio',
+             '--expected_num_objects', '--autoscale-mode'],
+    'ceph-volume': ['--cluster', '--data', '--block.db', '--block.wal',
+                    '--journal', '--crush-device-class'],
+    'radosgw-admin': ['--cluster'],
+}
+
+
+def empty_state():
+    return dict(pools={}, auth={}, crush={}, config={}, lvs={}, realms={},
+                zonegroups={}, zones={}, periods={}, users={})
+
+
+def parse(binary, args):
+    '''
+    Split the arguments into positionals and {option: value}
+    '''
+
+    positionals = []
+    options = {}
+    args = iter(args)
+    for arg in args:
+        if arg.startswith('-') and arg != '-':
+            option, sep, value = arg.partition('=')
+            if sep:
+                options[option] = value
+            elif option in VALUE_OPTIONS[binary]:
+                options[option] = next(args, None)
+            else:
+                options[option] = True
+        else:
+            positionals.append(arg)
+
+    return positionals, options
+
+
+def error(code, message):
+    return code, '', message
+
+
+def ok(out=''):
+    if not isinstance(out, str):
+        out = json.dumps(out)
+    return 0, out, ''
+
+
+# ceph
+
+def pool_details(name, pool):
+    return dict(pool_name=name, pg_num=pool['pg_num'],
+                pg_placement_num=pool['pg_num'], size=pool['size'],
+                min_size=pool['size'] - 1,
+                pg_autoscale_mode=pool['pg_autoscale_mode'],
+                erasure_code_profile=pool['erasure_code_profile'],
+                crush_rule=0, type=1 if pool['type'] == 'replicated' else 3,
+                options=pool['options'],
+                application_metadata=dict((app, {}) for app in pool['applications']))  # noqa: E501
+
+
+def ceph_osd_pool(state, args, options):
+    pools = state['pools']
+    action = args[0]
+    name = args[1] if len(args) > 1 else None
+
+    if action == 'ls':
+        if 'detail' in args:
+            return ok([pool_details(n, p) for n, p in sorted(pools.items())])
+        return ok(sorted(pools))
+    if action == 'create':
+        if name in pools:
+            return ok()
+        pool_type = args[2] if len(args) > 2 else 'replicated'
+        pools[name] = dict(
+            type=pool_type,
+            pg_num=int(options.get('--pg_num', 32)),
+            size=int(options.get('--size', 3)),
+            pg_autoscale_mode=options.get('--autoscale-mode', 'on'),
+            erasure_code_profile=args[3] if pool_type == 'erasure' else '',
+            options={}, applications=[])
+        if '--target_size_ratio' in options:
+            pools[name]['options']['target_size_ratio'] = float(options['--target_size_ratio'])  # noqa: E501
+        return ok()
+    if action == 'application':
+        name = args[2]
+    if name not in pools:
+        return error(2, "Error ENOENT: unrecognized pool '{}'".format(name))
+    if action == 'stats':
+        return ok([dict(pool_name=name, pool_id=0)])
+    if action == 'application':
+        if args[1] == 'get':
+            return ok(dict((app, {}) for app in pools[name]['applications']))
+        if args[1] == 'enable':
+            pools[name]['applications'] = [args[3]]
+        elif args[1] == 'disable':
+            pools[name]['applications'] = []
+        return ok()
+    if action == 'set':
+        key, value = args[2], args[3]
+        if key in ['pg_num', 'pgp_num', 'size']:
+            pools[name]['pg_num' if key == 'pgp_num' else key] = int(value)
+        elif key == 'target_size_ratio':
+            pools[name]['options']['target_size_ratio'] = float(value)
+        else:
+            pools[name][key] = value
+        return ok()
+    if action == 'rm':
+        del pools[name]
+        return ok()
+
+    return error(22, 'Error EINVAL: unsupported osd pool command')
+
+
+def parse_keyring(data):
+    '''
+    Parse a keyring into {entity: {key, caps}}
+    '''
+
+    entities = {}
+    entity = None
+    for line in data.splitlines():
+        line = line.strip()
+        if line.startswith('[') and line.endswith(']'):
+            entity = entities.setdefault(line[1:-1], dict(key=None, caps={}))
+        elif entity is not None and line.startswith('key'):
+            entity['key'] = line.split('=', 1)[1].strip()
+        elif entity is not None and line.startswith('caps'):
+            cap, value = line[len('caps'):].split('=', 1)
+            entity['caps'][cap.strip()] = value.strip().strip('"')
+
+    return entities
+
+
+def format_keyring(name, entity):
+    lines = ['[{}]'.format(name), '\tkey = {}'.format(entity['key'])]
+    for cap in sorted(entity['caps']):
+        lines.append('\tcaps {} = "{}"'.format(cap, entity['caps'][cap]))
+    return '\n'.join(lines) + '\n'
+
+
+def ceph_auth(state, args, options, stdin):
+    auth = state['auth']
+    action = args[0]
+
+    if action in ['ls', 'list']:
+        return ok(dict(auth_dump=[dict(entity=n, key=e['key'], caps=e['caps'])
+                                  for n, e in sorted(auth.items())]))
+    if action == 'import':
+        if options.get('-i') == '-':
+            data = stdin
+        else:
+            with open(options['-i']) as f:
+                data = f.read()
+        auth.update(parse_keyring(data))
+        return ok()
+    if action == 'get-or-create':
+        name = args[1]
+        if name not in auth:
+            caps = dict(zip(args[2::2], args[3::2]))
+            auth[name] = dict(key=uuid.uuid4().hex, caps=caps)
+        out = format_keyring(name, auth[name])
+    elif args[1] not in auth:
+        return error(2, 'Error ENOENT: failed to find {} in keyring'.format(args[1]))  # noqa: E501
+    elif action == 'get':
+        name = args[1]
+        if options.get('-f', options.get('--format')) == 'json':
+            out = json.dumps([dict(entity=name, key=auth[name]['key'], caps=auth[name]['caps'])])  # noqa: E501
+        else:
+            out = format_keyring(name, auth[name])
+    elif action == 'del':
+        del auth[args[1]]
+        return ok()
+    else:
+        return error(22, 'Error EINVAL: unsupported auth command')
+
+    if options.get('-o'):
+        with open(options['-o'], 'w') as f:
+            f.write(out)
+        return ok()
+    return ok(out)
+
+
+def ceph_osd_crush(state, args, options):
+    crush = state['crush']
+    action = args[0]
+
+    if action == 'dump':
+        ids = dict((name, -1 - i) for i, name in enumerate(sorted(crush)))
+        buckets = []
+        for name in sorted(crush):
+            children = [child for child, bucket in crush.items() if bucket['parent'] == name]  # noqa: E501
+            buckets.append(dict(id=ids[name], name=name,
+                                type_name=crush[name]['type'],
+                                items=[dict(id=ids[child]) for child in sorted(children)]))  # noqa: E501
+        return ok(dict(buckets=buckets))
+    if action == 'add-bucket':
+        crush.setdefault(args[1], dict(type=args[2], parent=None))
+        return ok()
+    if action == 'move':
+        if args[1] not in crush:
+            return error(2, 'Error ENOENT: item {} does not exist'.format(args[1]))  # noqa: E501
+        crush[args[1]]['parent'] = args[2].split('=', 1)[1]
+        return ok()
+
+    return error(22, 'Error EINVAL: unsupported osd crush command')
+
+
+def ceph_config(state, args, options):
+    config = state['config']
+    action = args[0]
+
+    if action == 'dump':
+        entries = []
+        for key in sorted(config):
+            who, name = key.split(' ', 1)
+            section, _, mask = who.partition('/')
+            entries.append(dict(section=section, name=name, value=config[key],
+                                level='advanced', mask=mask))
+        return ok(entries)
+    if action == 'set':
+        config['{} {}'.format(args[1], args[2])] = args[3]
+        return ok()
+    if action == 'rm':
+        config.pop('{} {}'.format(args[1], args[2]), None)
+        return ok()
+
+    return error(22, 'Error EINVAL: unsupported config command')
+
+
+def ceph(state, args, stdin):
+    args, options = parse('ceph', args)
+    if args[:2] == ['osd', 'pool']:
+        return ceph_osd_pool(state, args[2:], options)
+    if args[:2] == ['osd', 'crush']:
+        return ceph_osd_crush(state, args[2:], options)
+    if args[:1] == ['auth']:
+        return ceph_auth(state, args[1:], options, stdin)
+    if args[:1] == ['config']:
+        return ceph_config(state, args[1:], options)
+
+    return error(22, 'Error EINVAL: unsupported command {}'.format(' '.join(args)))  # noqa: E501
+
+
+# ceph-volume
+
+def ceph_volume(state, args, stdin):
+    args, options = parse('ceph-volume', args)
+    lvs = state['lvs']
+
+    if args[:2] == ['lvm', 'list']:
+        return ok(dict((osd_id, [lv]) for osd_id, lv in lvs.items()
+                       if len(args) < 3 or args[2] in lv['devices']))
+    if args[:2] in [['lvm', 'create'], ['lvm', 'prepare']]:
+        data = options['--data']
+        for lv in lvs.values():
+            if data in lv['devices']:
+                return error(1, 'RuntimeError: {} is already used'.format(data))  # noqa: E501
+        osd_id = str(len(lvs))
+        lvs[osd_id] = dict(devices=[data], type='block',
+                           lv_name='osd-block-' + osd_id,
+                           vg_name='ceph-' + osd_id,
+                           lv_path='/dev/ceph-{0}/osd-block-{0}'.format(osd_id))  # noqa: E501
+        return ok('--> ceph-volume lvm {} successful for: {}'.format(args[1], data))  # noqa: E501
+
+    return error(1, 'unsupported ceph-volume command {}'.format(' '.join(args)))  # noqa: E501
+
+
+# radosgw-admin
+
+def get_realm(state, options):
+    realm = options.get('--rgw-realm')
+    if realm not in state['realms']:
+        return None
+    return state['realms'][realm]
+
+
+def zonegroup_json(state, name):
+    zonegroup = state['zonegroups'][name]
+    zones = [dict(id=zone['id'], name=zone_name, endpoints=zone['endpoints'])
+             for zone_name, zone in sorted(state['zones'].items())
+             if zone['zonegroup'] == name]
+    return dict(id=zonegroup['id'], name=name, endpoints=zonegroup['endpoints'],  # noqa: E501
+                is_master=str(zonegroup['master']).lower(),
+                realm_id=state['realms'][zonegroup['realm']]['id'],
+                zones=zones)
+
+
+def set_zone_or_zonegroup(obj, options):
+    if '--endpoints' in options:
+        obj['endpoints'] = options['--endpoints'].split(',')
+    if options.get('--master'):
+        obj['master'] = True
+
+
+def radosgw_admin(state, args, stdin):
+    args, options = parse('radosgw-admin', args)
+    kind, action = args[0], args[1] if len(args) > 1 else None
+
+    if kind == 'realm':
+        if action == 'list':
+            return ok(dict(default_info='', realms=sorted(state['realms'])))
+        if action == 'create':
+            name = options['--rgw-realm']
+            if name in state['realms']:
+                return error(17, 'ERROR: couldn\'t create realm {}: (17) File exists'.format(name))  # noqa: E501
+            state['realms'][name] = dict(id=uuid.uuid4().hex, name=name)
+            return ok(state['realms'][name])
+        realm = get_realm(state, options)
+        if realm is None:
+            return error(2, 'failed to init realm: (2) No such file or directory')  # noqa: E501
+        return ok(realm)
+
+    if kind == 'zonegroup':
+        name = options.get('--rgw-zonegroup')
+        if action == 'list':
+            return ok(dict(default_info='', zonegroups=sorted(state['zonegroups'])))  # noqa: E501
+        if action == 'create':
+            if name in state['zonegroups']:
+                return error(17, 'failed to create zonegroup {}: (17) File exists'.format(name))  # noqa: E501
+            state['zonegroups'][name] = dict(id=uuid.uuid4().hex, realm=options['--rgw-realm'],  # noqa: E501
+                                             endpoints=[], master=False)
+            set_zone_or_zonegroup(state['zonegroups'][name], options)
+            return ok(zonegroup_json(state, name))
+        if name not in state['zonegroups']:
+            return error(2, 'failed to init zonegroup: (2) No such file or directory')  # noqa: E501
+        if action == 'modify':
+            set_zone_or_zonegroup(state['zonegroups'][name], options)
+        return ok(zonegroup_json(state, name))
+
+    if kind == 'zone':
+        name = options.get('--rgw-zone')
+        if action == 'list':
+            return ok(dict(default_info='', zones=sorted(state['zones'])))
+        if action == 'create':
+            if name in state['zones']:
+                return error(17, 'failed to create zone {}: (17) File exists'.format(name))  # noqa: E501
+            state['zones'][name] = dict(id=uuid.uuid4().hex, zonegroup=options['--rgw-zonegroup'],  # noqa: E501
+                                        realm=options['--rgw-realm'],
+                                        endpoints=[], master=False,
+                                        access_key='', secret_key='')
+        elif name not in state['zones']:
+            return error(2, 'failed to init zone: (2) No such file or directory')  # noqa: E501
+        elif action == 'delete':
+            del state['zones'][name]
+            return ok()
+        zone = state['zones'][name]
+        if action in ['create', 'modify']:
+            set_zone_or_zonegroup(zone, options)
+            zone['access_key'] = options.get('--access-key', zone['access_key'])  # noqa: E501
+            zone['secret_key'] = options.get('--secret-key', zone['secret_key'])  # noqa: E501
+        return ok(dict(id=zone['id'], name=name,
+                       realm_id=state['realms'][zone['realm']]['id'],
+                       system_key=dict(access_key=zone['access_key'], secret_key=zone['secret_key'])))  # noqa: E501
+
+    if kind == 'period':
+        realm = get_realm(state, options)
+        if realm is None:
+            return error(2, 'failed to init realm: (2) No such file or directory')  # noqa: E501
+        if action == 'update' and options.get('--commit'):
+            zonegroups = [zonegroup_json(state, name) for name, zonegroup in sorted(state['zonegroups'].items())  # noqa: E501
+                          if zonegroup['realm'] == realm['name']]
+            state['periods'][realm['name']] = dict(id=uuid.uuid4().hex, realm_id=realm['id'],  # noqa: E501
+                                                   period_map=dict(zonegroups=zonegroups))  # noqa: E501
+        if realm['name'] not in state['periods']:
+            return error(2, 'failed to load current period: (2) No such file or directory')  # noqa: E501
+        return ok(state['periods'][realm['name']])
+
+    if kind == 'metadata' and action == 'list':
+        return ok(sorted(state['users']))
+    if kind == 'metadata' and action == 'get':
+        uid = args[2].split(':', 1)[1]
+        if uid not in state['users']:
+            return error(2, 'ERROR: can\'t get key: (2) No such file or directory')  # noqa: E501
+        return ok(dict(key=args[2], data=state['users'][uid]))
+
+    if kind == 'user':
+        uid = options.get('--uid')
+        if action == 'create':
+            if uid in state['users']:
+                return error(17, 'could not create user: unable to create user, user: {} exists'.format(uid))  # noqa: E501
+            state['users'][uid] = dict(user_id=uid, display_name=uid, email='',
+                                       keys=[], system='false', admin='false')
+        elif uid not in state['users']:
+            return error(2, 'could not fetch user info: no user info saved')
+        user = state['users'][uid]
+        if action in ['create', 'modify']:
+            user['display_name'] = options.get('--display_name', user['display_name'])  # noqa: E501
+            user['email'] = options.get('--email', user['email'])
+            if '--access-key' in options or '--secret-key' in options:
+                user['keys'] = [dict(user=uid, access_key=options.get('--access-key', ''),  # noqa: E501
+                                     secret_key=options.get('--secret-key', ''))]  # noqa: E501
+            if options.get('--system'):
+                user['system'] = 'true'
+            if options.get('--admin'):
+                user['admin'] = 'true'
+        elif action == 'rm':
+            del state['users'][uid]
+            return ok()
+        return ok(user)
+
+    return error(22, 'ERROR: unsupported command {}'.format(' '.join(args)))
+
+
+HANDLERS = {
+    'ceph': ceph,
+    'ceph-volume': ceph_volume,
+    'radosgw-admin': radosgw_admin,
+}
+
+
+def main(argv):
+    binary = os.path.basename(argv[0])
+    args = argv[1:]
+    stdin = sys.stdin.read() if '-' in args else ''
+
+    # the startup cost, paid concurrently by the parallel invocations
+    time.sleep(float(os.environ.get('FAKE_CEPH_LATENCY', 0)))
+
+    with open(os.environ['FAKE_CEPH_LOG'], 'a') as log:
+        log.write(json.dumps([binary] + args) + '\n')
+
+    path = os.environ['FAKE_CEPH_STATE']
+    with open(path + '.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        state = empty_state()
+        if os.path.exists(path):
+            with open(path) as f:
+                state.update(json.load(f))
+        rc, out, err = HANDLERS[binary](state, args, stdin)
+        if rc == 0:
+            with open(path + '.tmp', 'w') as f:
+                json.dump(state, f)
+            os.rename(path + '.tmp', path)
+
+    sys.stdout.write(out)
+    sys.stderr.write(err)
+
+    return rc
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
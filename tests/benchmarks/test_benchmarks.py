@@ -0,0 +1,119 @@
+import ceph_config
+import ceph_crush
+import ceph_key
+import ceph_pool
+import ceph_volume
+import radosgw_multisite
+import radosgw_user
+import radosgw_zone
+
+
+class TestCephPool(object):
+
+    def test_single(self, benchmark, fake_ceph, items):
+        invocations = [dict(name='pool{}'.format(i), application='rbd') for i in range(items)]
+
+        benchmark('ceph_pool_single_create', ceph_pool, invocations)
+        assert len(fake_ceph.state()['pools']) == items
+        results = benchmark('ceph_pool_single_noop', ceph_pool, invocations)
+        assert not any(r['changed'] for r in results)
+
+    def test_pools(self, benchmark, fake_ceph, items):
+        pools = [dict(name='pool{}'.format(i), application='rbd') for i in range(items)]
+
+        benchmark('ceph_pool_pools_create', ceph_pool, [dict(pools=pools)])
+        assert len(fake_ceph.state()['pools']) == items
+        results = benchmark('ceph_pool_pools_noop', ceph_pool, [dict(pools=pools)])
+        assert not results[0]['changed']
+
+
+class TestCephKey(object):
+
+    def test_keys(self, benchmark, fake_ceph, items, tmpdir):
+        keys = [dict(name='client.test{}'.format(i), caps={'mon': 'allow r', 'osd': 'allow rw'})
+                for i in range(items)]
+        args = dict(keys=keys, dest=str(tmpdir.mkdir('keys')))
+
+        benchmark('ceph_key_keys_create', ceph_key, [args])
+        assert len(fake_ceph.state()['auth']) == items
+        results = benchmark('ceph_key_keys_noop', ceph_key, [args])
+        assert not results[0]['changed']
+
+
+class TestCephConfig(object):
+
+    def test_config(self, benchmark, fake_ceph, items):
+        config = [dict(who='mgr', option='mgr/dashboard/OPTION_{}'.format(i), value=i)
+                  for i in range(items)]
+
+        benchmark('ceph_config_config_create', ceph_config, [dict(config=config)])
+        assert len(fake_ceph.state()['config']) == items
+        results = benchmark('ceph_config_config_noop', ceph_config, [dict(config=config)])
+        assert not results[0]['changed']
+
+
+class TestCephVolume(object):
+
+    def test_volumes(self, benchmark, fake_ceph, items, monkeypatch, tmpdir):
+        monkeypatch.setattr(ceph_volume, 'CACHE_DIR', str(tmpdir.join('cache')))
+        args = dict(action='create', workers=4,
+                    volumes=[dict(data='/dev/sd{}'.format(chr(ord('b') + i))) for i in range(items)])
+
+        benchmark('ceph_volume_volumes_create', ceph_volume, [args])
+        assert len(fake_ceph.state()['lvs']) == items
+        results = benchmark('ceph_volume_volumes_noop', ceph_volume, [args])
+        assert not results[0]['changed']
+
+
+class TestCephCrush(object):
+
+    def test_locations(self, benchmark, fake_ceph, items):
+        locations = [dict(host='host{}'.format(i), rack='rack{}'.format(i % 2), root='default')
+                     for i in range(items)]
+        args = dict(locations=locations, containerized='')
+
+        benchmark('ceph_crush_locations_create', ceph_crush, [args])
+        assert len(fake_ceph.state()['crush']) == items + 3
+        results = benchmark('ceph_crush_locations_noop', ceph_crush, [args])
+        assert not results[0]['changed']
+
+
+class TestRadosgw(object):
+
+    def multisite(self, items):
+        return dict(
+            realms=[dict(name='foo', default=True)],
+            zonegroups=[dict(name='bar', realm='foo', master=True, default=True)],
+            zones=[dict(name='z{}'.format(i), realm='foo', zonegroup='bar',
+                        endpoints=['http://192.168.1.{}:8080'.format(i)],
+                        access_key='access{}'.format(i), secret_key='secret{}'.format(i),
+                        master=i == 0)
+                   for i in range(items)],
+        )
+
+    def test_multisite(self, benchmark, fake_ceph, items):
+        args = self.multisite(items)
+
+        benchmark('radosgw_multisite_create', radosgw_multisite, [args])
+        assert len(fake_ceph.state()['zones']) == items
+        results = benchmark('radosgw_multisite_noop', radosgw_multisite, [args])
+        assert not results[0]['changed']
+
+    def test_zone(self, benchmark, run, items):
+        args = self.multisite(items)
+        run(radosgw_multisite, args)
+        invocations = [dict(zone, zonegroup='bar') for zone in args['zones']]
+
+        results = benchmark('radosgw_zone_single_noop', radosgw_zone, invocations)
+        assert not any(r['changed'] for r in results)
+
+    def test_users(self, benchmark, fake_ceph, items):
+        args = dict(users=[dict(name='user{}'.format(i), access_key='access{}'.format(i),
+                                secret_key='secret{}'.format(i), system=True)
+                           for i in range(items)],
+                    workers=4)
+
+        benchmark('radosgw_user_users_create', radosgw_user, [args])
+        assert len(fake_ceph.state()['users']) == items
+        results = benchmark('radosgw_user_users_noop', radosgw_user, [args])
+        assert not results[0]['changed']
@@ -0,0 +1,116 @@
+from mock.mock import patch, MagicMock
+import threading
+import radosgw
+import ceph_add_users_buckets
+
+
+def fake_user(username, **kwargs):
+    user = dict(username=username, fullname=username, email=None,
+                maxbucket=1000, suspend=False, autogenkey=True,
+                accesskey=None, secretkey=None, userquota=False,
+                usermaxsize='-1', usermaxobjects=-1, bucketquota=False,
+                bucketmaxsize='-1', bucketmaxobjects=-1)
+    user.update(kwargs)
+    return user
+
+
+def new_result():
+    return dict(changed=False, error_messages=[], added_users='',
+                failed_users='', added_buckets='', failed_buckets='')
+
+
+class TestCephAddUsersBuckets(object):
+
+    def test_split_duplicates(self):
+        users = [fake_user('foo'), fake_user('bar'), fake_user('foo', fullname='other')]
+        unique, duplicates = ceph_add_users_buckets.split_duplicates(users, 'username')
+        assert unique == users[:2]
+        assert duplicates == users[2:]
+
+    def test_create_users_concurrent(self):
+        rgw = MagicMock()
+        created = []
+        lock = threading.Lock()
+        barrier = threading.Event()
+
+        def create_user(username, fullname, **kwargs):
+            with lock:
+                created.append(username)
+                if len(created) == 4:
+                    barrier.set()
+            # the users are created at the same time by the workers
+            assert barrier.wait(5)
+        rgw.create_user.side_effect = create_user
+
+        users = [fake_user('user{}'.format(i)) for i in range(4)]
+        result = new_result()
+        uids = set()
+        ceph_add_users_buckets.create_users(rgw, users, result, uids, workers=4)
+
+        assert sorted(created) == ['user0', 'user1', 'user2', 'user3']
+        # the result keeps the order of the users
+        assert result['added_users'] == 'user0, user1, user2, user3'
+        assert result['failed_users'] == ''
+        assert result['error_messages'] == []
+        assert uids == set(['user0', 'user1', 'user2', 'user3'])
+
+    def test_create_users_duplicates(self):
+        rgw = MagicMock()
+        users = [fake_user('foo'), fake_user('bar'), fake_user('foo'), fake_user('foo')]
+        result = new_result()
+        ceph_add_users_buckets.create_users(rgw, users, result, set(), workers=4)
+
+        # the user is created once
+        assert [c[0][0] for c in rgw.create_user.call_args_list].count('foo') == 1
+        assert result['added_users'] == 'foo, bar'
+        assert result['failed_users'] == 'foo, foo'
+        assert result['error_messages'] == ['foo UserExists', 'foo UserExists']
+
+    def test_create_users_existing(self):
+        rgw = MagicMock()
+        result = new_result()
+        ceph_add_users_buckets.create_users(rgw, [fake_user('foo'), fake_user('bar')], result,
+                                            set(['foo']), workers=2)
+
+        assert [c[0][0] for c in rgw.create_user.call_args_list] == ['bar']
+        assert result['added_users'] == 'bar'
+        assert result['failed_users'] == 'foo'
+        assert result['error_messages'] == ['foo UserExists']
+
+    def test_create_user_not_created_not_deleted(self):
+        rgw = MagicMock()
+        # created by someone else since the users were listed
+        rgw.create_user.side_effect = radosgw.exception.UserExists(409, 'Conflict')
+        result = new_result()
+        ceph_add_users_buckets.create_users(rgw, [fake_user('foo')], result, set(), workers=2)
+
+        rgw.delete_user.assert_not_called()
+        assert result['added_users'] == ''
+        assert result['failed_users'] == 'foo'
+        assert result['error_messages'] == ['foo UserExists']
+
+    def test_create_user_quota_failure_deleted(self):
+        rgw = MagicMock()
+        rgw.set_quota.side_effect = radosgw.exception.RadosGWAdminError(400, 'Bad Request', '{"Code": "InvalidArgument"}')
+        result = new_result()
+        ceph_add_users_buckets.create_users(rgw, [fake_user('foo', userquota=True)], result,
+                                            set(), workers=2)
+
+        rgw.delete_user.assert_called_once_with('foo')
+        assert result['failed_users'] == 'foo'
+        assert result['error_messages'] == ['foo InvalidArgument']
+
+    @patch('ceph_add_users_buckets.connect_s3')
+    def test_create_buckets_duplicates(self, m_connect_s3):
+        rgw = MagicMock()
+        rgw.get_bucket.side_effect = [None, MagicMock(id='1'), None, MagicMock(id='2')]
+        buckets = [dict(bucket='b1', user='foo'), dict(bucket='b1', user='foo'),
+                   dict(bucket='b2', user='foo')]
+        conn = m_connect_s3.return_value
+        result = new_result()
+        ceph_add_users_buckets.create_buckets(rgw, buckets, result, set(['foo']), workers=1)
+
+        assert [c[1]['bucket_name'] for c in conn.create_bucket.call_args_list] == ['b1', 'b2']
+        assert result['added_buckets'] == 'b1, b2'
+        assert result['failed_buckets'] == 'b1'
+        assert result['error_messages'] == ['b1 BucketExists']
@@ -0,0 +1,158 @@
+from mock.mock import patch
+import json
+import pytest
+import ca_test_common
+import ceph_config
+
+fake_cluster = 'ceph'
+fake_user = 'client.admin'
+fake_keyring = '/etc/ceph/{}.{}.keyring'.format(fake_cluster, fake_user)
+fake_base_cmd = ['ceph', '-n', fake_user, '-k', fake_keyring, '--cluster', fake_cluster, 'config']
+fake_dump = [
+    {'section': 'global', 'name': 'osd_pool_default_size', 'value': '3', 'level': 'advanced', 'mask': ''},
+    {'section': 'mgr', 'name': 'mgr/dashboard/ssl', 'value': 'false', 'level': 'advanced', 'mask': ''},
+    {'section': 'mgr', 'name': 'mgr/dashboard/GRAFANA_API_SSL_VERIFY', 'value': 'False', 'level': 'advanced', 'mask': ''},
+    {'section': 'osd', 'name': 'osd_max_backfills', 'value': '2', 'level': 'advanced', 'mask': 'class:ssd'},
+]
+
+
+class TestCephConfigModule(object):
+
+    def test_dump_config(self):
+        assert ceph_config.dump_config(fake_cluster) == fake_base_cmd + ['dump', '--format=json']
+
+    def test_set_config(self):
+        assert ceph_config.set_config(fake_cluster, 'mgr', 'mgr/dashboard/ssl', 'true') == \
+            fake_base_cmd + ['set', 'mgr', 'mgr/dashboard/ssl', 'true']
+
+    def test_remove_config(self):
+        assert ceph_config.remove_config(fake_cluster, 'global', 'osd_pool_default_size') == \
+            fake_base_cmd + ['rm', 'global', 'osd_pool_default_size']
+
+    @pytest.mark.parametrize('value,expected', [(True, 'true'), ('False', 'false'), (8443, '8443'), (' foo ', 'foo')])
+    def test_normalize_value(self, value, expected):
+        assert ceph_config.normalize_value(value) == expected
+
+    def test_parse_config_dump(self):
+        current = ceph_config.parse_config_dump(json.dumps(fake_dump))
+        assert current[('global', 'osd_pool_default_size')] == '3'
+        assert current[('osd/class:ssd', 'osd_max_backfills')] == '2'
+
+    def test_plan_config(self):
+        current = ceph_config.parse_config_dump(json.dumps(fake_dump))
+        config = [
+            {'who': 'global', 'option': 'osd_pool_default_size', 'value': '3', 'state': 'present'},
+            {'who': 'mgr', 'option': 'mgr/dashboard/GRAFANA_API_SSL_VERIFY', 'value': 'false', 'state': 'present'},
+            {'who': 'mgr', 'option': 'mgr/dashboard/ssl', 'value': 'true', 'state': 'present'},
+            {'who': 'osd/class:ssd', 'option': 'osd_max_backfills', 'value': None, 'state': 'absent'},
+            {'who': 'osd', 'option': 'osd_max_backfills', 'value': None, 'state': 'absent'},
+            {'who': 'mgr', 'option': 'mgr/dashboard/server_port', 'value': '8443', 'state': 'present'},
+        ]
+        assert ceph_config.plan_config(config, current) == [config[2], config[3], config[5]]
+
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_up_to_date(self, m_run_command, m_exit_json):
+        ca_test_common.set_module_args({
+            'config': [
+                {'who': 'global', 'option': 'osd_pool_default_size', 'value': 3},
+                {'who': 'mgr', 'option': 'mgr/dashboard/ssl', 'value': False},
+            ],
+        })
+        m_exit_json.side_effect = ca_test_common.exit_json
+        m_run_command.return_value = 0, json.dumps(fake_dump), ''
+
+        with pytest.raises(ca_test_common.AnsibleExitJson) as result:
+            ceph_config.main()
+
+        result = result.value.args[0]
+        assert not result['changed']
+        assert result['cmd'] == []
+        assert result['results'] == []
+        m_run_command.assert_called_once()
+
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_apply_differences(self, m_run_command, m_exit_json):
+        ca_test_common.set_module_args({
+            'config': [
+                {'who': 'global', 'option': 'osd_pool_default_size', 'value': 3},
+                {'who': 'mgr', 'option': 'mgr/dashboard/ssl', 'value': True},
+                {'who': 'osd/class:ssd', 'option': 'osd_max_backfills', 'state': 'absent'},
+            ],
+        })
+        m_exit_json.side_effect = ca_test_common.exit_json
+        m_run_command.side_effect = [
+            (0, json.dumps(fake_dump), ''),
+            (0, '', ''),
+            (0, '', ''),
+        ]
+
+        with pytest.raises(ca_test_common.AnsibleExitJson) as result:
+            ceph_config.main()
+
+        result = result.value.args[0]
+        assert result['changed']
+        assert result['cmd'] == [
+            fake_base_cmd + ['set', 'mgr', 'mgr/dashboard/ssl', 'true'],
+            fake_base_cmd + ['rm', 'osd/class:ssd', 'osd_max_backfills'],
+        ]
+        assert [(r['who'], r['option']) for r in result['results']] == [
+            ('mgr', 'mgr/dashboard/ssl'), ('osd/class:ssd', 'osd_max_backfills')
+        ]
+
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_check_mode(self, m_run_command, m_exit_json):
+        ca_test_common.set_module_args({
+            'config': [{'who': 'mgr', 'option': 'mgr/dashboard/server_port', 'value': 8443}],
+            '_ansible_check_mode': True,
+        })
+        m_exit_json.side_effect = ca_test_common.exit_json
+        m_run_command.return_value = 0, json.dumps(fake_dump), ''
+
+        with pytest.raises(ca_test_common.AnsibleExitJson) as result:
+            ceph_config.main()
+
+        result = result.value.args[0]
+        assert result['changed']
+        assert result['cmd'] == []
+        assert result['results'][0]['value'] == '8443'
+        m_run_command.assert_called_once()
+
+    @patch('ansible.module_utils.basic.AnsibleModule.fail_json')
+    def test_missing_value(self, m_fail_json):
+        ca_test_common.set_module_args({
+            'config': [{'who': 'mgr', 'option': 'mgr/dashboard/ssl'}],
+        })
+        m_fail_json.side_effect = ca_test_common.fail_json
+
+        with pytest.raises(ca_test_common.AnsibleFailJson) as result:
+            ceph_config.main()
+
+        assert result.value.args[0]['msg'] == 'mgr mgr/dashboard/ssl needs a value'
+
+    @patch('ansible.module_utils.basic.AnsibleModule.fail_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_failure(self, m_run_command, m_fail_json):
+        ca_test_common.set_module_args({
+            'config': [
+                {'who': 'mgr', 'option': 'mgr/dashboard/foo', 'value': 'bar'},
+                {'who': 'mgr', 'option': 'mgr/dashboard/ssl', 'value': True},
+            ],
+        })
+        m_fail_json.side_effect = ca_test_common.fail_json
+        m_run_command.side_effect = [
+            (0, json.dumps(fake_dump), ''),
+            (22, '', 'Error EINVAL: unrecognized config option'),
+            (0, '', ''),
+        ]
+
+        with pytest.raises(ca_test_common.AnsibleFailJson) as result:
+            ceph_config.main()
+
+        result = result.value.args[0]
+        assert result['msg'] == 'failed to apply the configuration'
+        assert result['rc'] == 22
+        assert result['stderr'] == 'Error EINVAL: unrecognized config option'
+        assert [r['changed'] for r in result['results']] == [False, True]
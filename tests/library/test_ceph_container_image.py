@@ -0,0 +1,263 @@
+from ansible.module_utils.six.moves import BaseHTTPServer
+from mock.mock import patch
+import json
+import pytest
+import threading
+import ca_test_common
+import ceph_container_image
+
+fake_image = 'docker.io/ceph/daemon:latest-master'
+fake_image_id = 'sha256:new'
+fake_digest = 'sha256:93b1'
+fake_containers = [
+    {'Id': 'c1', 'Name': '/ceph-mon-mon0', 'Image': 'sha256:old', 'State': {'Running': True}},
+    {'Id': 'c2', 'Name': '/ceph-osd-0', 'Image': fake_image_id, 'State': {'Running': True}},
+    {'Id': 'c3', 'Name': '/ceph-rbd-mirror-mon0', 'Image': fake_image_id, 'State': {'Running': True}},
+    {'Id': 'c4', 'Name': '/ceph-container-session', 'Image': 'sha256:old', 'State': {'Running': True}},
+]
+fake_image_inspect = {'Id': fake_image_id, 'RepoTags': [fake_image],
+                      'RepoDigests': ['docker.io/ceph/daemon@' + fake_digest]}
+
+
+class FakeRegistry(BaseHTTPServer.HTTPServer):
+    '''
+    A registry stand-in answering the manifest requests with a digest,
+    behind a bearer token authentication when 'token' is set
+    '''
+
+    def __init__(self, digest, token=None):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0), FakeRegistryHandler)
+        self.digest = digest
+        self.token = token
+        self.requests = []
+        self.url = 'http://127.0.0.1:{}'.format(self.server_address[1])
+
+
+class FakeRegistryHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self.server.requests.append((self.command, self.path))
+        if self.server.token and self.headers.get('Authorization') != 'Bearer ' + self.server.token:
+            self.send_response(401)
+            self.send_header('WWW-Authenticate', 'Bearer realm="{}/token",service="registry"'.format(self.server.url))
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Docker-Content-Digest', self.server.digest)
+        self.end_headers()
+
+    def do_GET(self):
+        self.server.requests.append((self.command, self.path))
+        body = json.dumps({'token': self.server.token}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def registry(request):
+    server = FakeRegistry(fake_digest, token=getattr(request, 'param', None))
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def fake_engine(pulled_image=None, image=fake_image_inspect, partial_output=True):
+    '''
+    Answer the ps, inspect and pull commands, the image is replaced by
+    pulled_image on pull. When a name is missing, inspect prints the others
+    unless partial_output is False.
+    '''
+
+    images = {fake_image: image} if image else {}
+
+    def run_command(cmd, **kwargs):
+        if cmd[1] == 'ps':
+            return 0, '\n'.join(c['Id'] for c in fake_containers) + '\n', ''
+        if cmd[1] == 'inspect':
+            found = [c for c in fake_containers if c['Id'] in cmd[2:]]
+            found += [images[name] for name in cmd[2:] if name in images]
+            if len(found) == len(cmd) - 2:
+                return 0, json.dumps(found), ''
+            return 1, json.dumps(found) if partial_output else '', 'Error: no such object'
+        if 'pull' in cmd:
+            images[fake_image] = pulled_image
+            return 0, '', ''
+        raise AssertionError(cmd)
+
+    return run_command
+
+
+class TestCephContainerImageModule(object):
+
+    @pytest.mark.parametrize('image,expected', [
+        ('docker.io/ceph/daemon:latest-master', ('docker.io', 'ceph/daemon', 'latest-master')),
+        ('docker.io/centos', ('docker.io', 'library/centos', 'latest')),
+        ('quay.io/ceph/ceph:v15', ('quay.io', 'ceph/ceph', 'v15')),
+        ('127.0.0.1:5000/ceph/daemon@sha256:93b1', ('127.0.0.1:5000', 'ceph/daemon', 'sha256:93b1')),
+    ])
+    def test_parse_image(self, image, expected):
+        assert ceph_container_image.parse_image(image) == expected
+
+    def test_get_daemon(self):
+        assert [ceph_container_image.get_daemon(c['Name']) for c in fake_containers] == ['mon', 'osd', 'rbd_mirror', None]
+
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_inventory(self, m_run_command, m_exit_json):
+        ca_test_common.set_module_args({
+            'image': fake_image,
+            'container_binary': 'podman',
+        })
+        m_exit_json.side_effect = ca_test_common.exit_json
+        m_run_command.side_effect = fake_engine()
+
+        with pytest.raises(ca_test_common.AnsibleExitJson) as result:
+            ceph_container_image.main()
+
+        result = result.value.args[0]
+        # a single ps and a single inspect for the containers and the image
+        assert [c[0][0][:2] for c in m_run_command.call_args_list] == [['podman', 'ps'], ['podman', 'inspect']]
+        assert m_run_command.call_args_list[1][0][0] == ['podman', 'inspect', 'c1', 'c2', 'c3', 'c4', fake_image]
+        facts = result['ansible_facts']
+        assert sorted(facts['ceph_containers']) == ['mon', 'osd', 'rbd_mirror']
+        assert facts['ceph_containers']['mon'] == [{'id': 'c1', 'name': 'ceph-mon-mon0', 'image_id': 'sha256:old'}]
+        assert facts['ceph_container_image']['id'] == fake_image_id
+        assert facts['ceph_container_image']['digests'] == [fake_digest]
+        assert facts['ceph_container_image']['updated'] == ['mon']
+        assert not facts['ceph_container_image']['pulled']
+
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_pull_skipped(self, m_run_command, m_exit_json, registry):
+        ca_test_common.set_module_args({
+            'image': fake_image,
+            'container_binary': 'podman',
+            'pull': True,
+            'registry_url': registry.url,
+        })
+        m_exit_json.side_effect = ca_test_common.exit_json
+        m_run_command.side_effect = fake_engine()
+
+        with pytest.raises(ca_test_common.AnsibleExitJson) as result:
+            ceph_container_image.main()
+
+        image = result.value.args[0]['ansible_facts']['ceph_container_image']
+        assert registry.requests == [('HEAD', '/v2/ceph/daemon/manifests/latest-master')]
+        assert image['registry_digest'] == fake_digest
+        assert not image['pulled']
+        assert m_run_command.call_count == 2
+
+    @pytest.mark.parametrize('registry', [None, 'secret'], indirect=True)
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_pull(self, m_run_command, m_exit_json, registry):
+        registry.digest = 'sha256:c0ff'
+        ca_test_common.set_module_args({
+            'image': fake_image,
+            'container_binary': 'docker',
+            'pull': True,
+            'pull_timeout': '300s',
+            'registry_url': registry.url,
+        })
+        m_exit_json.side_effect = ca_test_common.exit_json
+        m_run_command.side_effect = fake_engine(dict(fake_image_inspect, Id='sha256:newer',
+                                                     RepoDigests=['docker.io/ceph/daemon@sha256:c0ff']))
+
+        with pytest.raises(ca_test_common.AnsibleExitJson) as result:
+            ceph_container_image.main()
+
+        result = result.value.args[0]
+        image = result['ansible_facts']['ceph_container_image']
+        if registry.token:
+            assert [r[0] for r in registry.requests] == ['HEAD', 'GET', 'HEAD']
+            assert registry.requests[1][1] == '/token?service=registry&scope=repository%3Aceph%2Fdaemon%3Apull'
+        assert image['registry_digest'] == 'sha256:c0ff'
+        assert image['pulled']
+        assert image['id'] == 'sha256:newer'
+        assert image['updated'] == ['mon', 'osd', 'rbd_mirror']
+        assert result['cmd'] == [['timeout', '--foreground', '-s', 'KILL', '300s', 'docker', 'pull', fake_image]]
+        # the image is inspected again after the pull
+        assert m_run_command.call_args_list[-1][0][0] == ['docker', 'inspect', fake_image]
+
+    @pytest.mark.parametrize('partial_output', [True, False])
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_pull_missing_image(self, m_run_command, m_exit_json, partial_output, registry):
+        ca_test_common.set_module_args({
+            'image': fake_image,
+            'container_binary': 'podman',
+            'pull': True,
+            'registry_url': registry.url,
+        })
+        m_exit_json.side_effect = ca_test_common.exit_json
+        m_run_command.side_effect = fake_engine(fake_image_inspect, image=None, partial_output=partial_output)
+
+        with pytest.raises(ca_test_common.AnsibleExitJson) as result:
+            ceph_container_image.main()
+
+        result = result.value.args[0]
+        # the containers and the image are inspected separately
+        assert [c[0][0] for c in m_run_command.call_args_list if c[0][0][1] == 'inspect'][1:3] == [
+            ['podman', 'inspect', 'c1', 'c2', 'c3', 'c4'], ['podman', 'inspect', fake_image]]
+        facts = result['ansible_facts']
+        assert sorted(facts['ceph_containers']) == ['mon', 'osd', 'rbd_mirror']
+        assert facts['ceph_container_image']['pulled']
+        assert facts['ceph_container_image']['id'] == fake_image_id
+        assert facts['ceph_container_image']['updated'] == ['mon']
+
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_pull_registry_unreachable(self, m_run_command, m_exit_json):
+        ca_test_common.set_module_args({
+            'image': '127.0.0.1:1/ceph/daemon:latest-master',
+            'container_binary': 'podman',
+            'pull': True,
+            'registry_url': 'http://127.0.0.1:1',
+        })
+        m_exit_json.side_effect = ca_test_common.exit_json
+        m_run_command.side_effect = [
+            (0, '', ''),
+            (125, '', 'Error: no such object'),
+            (0, '', ''),
+            (0, json.dumps([fake_image_inspect]), ''),
+        ]
+
+        with pytest.raises(ca_test_common.AnsibleExitJson) as result:
+            ceph_container_image.main()
+
+        image = result.value.args[0]['ansible_facts']['ceph_container_image']
+        # the digest is unknown, the image is pulled
+        assert image['registry_digest'] is None
+        assert image['pulled']
+        assert image['id'] == fake_image_id
+
+    @patch('ansible.module_utils.basic.AnsibleModule.fail_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_pull_failure(self, m_run_command, m_fail_json):
+        ca_test_common.set_module_args({
+            'image': fake_image,
+            'container_binary': 'podman',
+            'pull': True,
+            'registry_url': 'http://127.0.0.1:1',
+        })
+        m_fail_json.side_effect = ca_test_common.fail_json
+        m_run_command.side_effect = [
+            (0, '', ''),
+            (125, '', 'Error: no such object'),
+            (125, '', 'Error: manifest unknown'),
+        ]
+
+        with pytest.raises(ca_test_common.AnsibleFailJson) as result:
+            ceph_container_image.main()
+
+        result = result.value.args[0]
+        assert result['msg'] == 'failed to pull {}'.format(fake_image)
+        assert result['stderr'] == 'Error: manifest unknown'
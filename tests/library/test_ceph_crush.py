@@ -1,5 +1,8 @@
 import sys
+import json
+import mock
 import pytest
+import ca_test_common
 
 sys.path.append('./library')
 import ceph_crush  # noqa: E402
@@ -91,3 +94,101 @@ class TestCephCrushModule(object):
         ]
         result = ceph_crush.create_and_move_buckets_list(cluster, location, containerized)
         assert result == expected_command_list
+
+    fake_crush_dump = {
+        'buckets': [
+            {'id': -1, 'name': 'default', 'type_name': 'root',
+             'items': [{'id': -2, 'weight': 0, 'pos': 0}]},
+            {'id': -2, 'name': 'rack1', 'type_name': 'rack',
+             'items': [{'id': -3, 'weight': 0, 'pos': 0}]},
+            {'id': -3, 'name': 'host1', 'type_name': 'host',
+             'items': [{'id': 0, 'weight': 0, 'pos': 0}]},
+            {'id': -4, 'name': 'host2', 'type_name': 'host', 'items': []},
+        ]
+    }
+
+    def test_get_crush_tree(self):
+        tree = ceph_crush.get_crush_tree(self.fake_crush_dump)
+        assert tree == {
+            'default': {'type': 'root', 'parent': None},
+            'rack1': {'type': 'rack', 'parent': 'default'},
+            'host1': {'type': 'host', 'parent': 'rack1'},
+            'host2': {'type': 'host', 'parent': None},
+        }
+
+    def test_generate_commands_with_tree(self):
+        cluster = "test"
+        tree = ceph_crush.get_crush_tree(self.fake_crush_dump)
+        location = [
+            ("host", "host1"),
+            ("rack", "rack1"),
+            ("root", "default"),
+        ]
+        assert ceph_crush.create_and_move_buckets_list(cluster, location, tree=tree) == []
+
+        location = [
+            ("host", "host2"),
+            ("rack", "rack2"),
+            ("root", "default"),
+        ]
+        expected_command_list = [
+            ['ceph', '--cluster', cluster, 'osd', 'crush', "add-bucket", "rack2", "rack"],
+            ['ceph', '--cluster', cluster, 'osd', 'crush', "move", "host2", "rack=rack2"],
+            ['ceph', '--cluster', cluster, 'osd', 'crush', "move", "rack2", "root=default"],
+        ]
+        result = ceph_crush.create_and_move_buckets_list(cluster, location, tree=tree)
+        assert result == expected_command_list
+        # the planned changes are applied to the tree
+        assert ceph_crush.create_and_move_buckets_list(cluster, location, tree=tree) == []
+
+    @mock.patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @mock.patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_locations_unchanged(self, m_run_command, m_exit_json):
+        ca_test_common.set_module_args({
+            'locations': [
+                {'host': 'host1', 'rack': 'rack1', 'root': 'default'},
+                {'root': 'default', 'rack': 'rack1', 'host': 'host1'},
+            ],
+            'containerized': '',
+        })
+        m_exit_json.side_effect = ca_test_common.exit_json
+        m_run_command.return_value = 0, json.dumps(self.fake_crush_dump), ''
+
+        with pytest.raises(ca_test_common.AnsibleExitJson) as result:
+            ceph_crush.main()
+
+        result = result.value.args[0]
+        assert not result['changed']
+        assert result['commands'] == []
+        m_run_command.assert_called_once_with(['ceph', '--cluster', 'ceph', 'osd', 'crush', 'dump', '--format=json'])
+
+    @mock.patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @mock.patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_locations(self, m_run_command, m_exit_json):
+        ca_test_common.set_module_args({
+            'locations': [
+                {'host': 'host1', 'rack': 'rack1', 'root': 'default'},
+                {'host': 'host2', 'rack': 'rack1', 'root': 'default'},
+                {'host': 'host3', 'rack': 'rack1', 'root': 'default'},
+            ],
+            'containerized': '',
+        })
+        m_exit_json.side_effect = ca_test_common.exit_json
+        m_run_command.side_effect = [
+            (0, json.dumps(self.fake_crush_dump), ''),
+            (0, '', ''),
+            (0, '', ''),
+            (0, '', ''),
+        ]
+
+        with pytest.raises(ca_test_common.AnsibleExitJson) as result:
+            ceph_crush.main()
+
+        result = result.value.args[0]
+        assert result['changed']
+        assert result['commands'] == [
+            'ceph --cluster ceph osd crush move host2 rack=rack1',
+            'ceph --cluster ceph osd crush add-bucket host3 host',
+            'ceph --cluster ceph osd crush move host3 rack=rack1',
+        ]
+        assert m_run_command.call_count == 4
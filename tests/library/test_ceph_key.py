@@ -577,3 +577,98 @@ class TestCephKeyModule(object):
         with pytest.raises(ca_test_common.AnsibleExitJson) as result:
             ceph_key.run_module()
         assert result.value.args[0]['stdout'] == fake_secret.decode()
+
+    def test_generate_keyring(self):
+        fake_caps = {'osd': 'allow rwx', 'mon': 'allow r'}
+        result = ceph_key.generate_keyring('client.foo', 'AQAin8tUUK84ExAA/QgBtI7gEMWdmnvKBzlXdQ==', fake_caps)  # noqa: E501
+        assert result == ('[client.foo]\n'
+                          '\tkey = AQAin8tUUK84ExAA/QgBtI7gEMWdmnvKBzlXdQ==\n'
+                          '\tcaps mon = "allow r"\n'
+                          '\tcaps osd = "allow rwx"\n')
+
+    @mock.patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @mock.patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_batch_present(self, m_run_command, m_exit_json, tmpdir):
+        fake_secret = 'AQAin8tUUK84ExAA/QgBtI7gEMWdmnvKBzlXdQ=='
+        fake_caps = {'mon': 'allow r', 'osd': 'allow rwx'}
+        ca_test_common.set_module_args({
+            'keys': [
+                {'name': 'client.foo', 'caps': fake_caps},
+                {'name': 'client.bar', 'caps': fake_caps, 'key': fake_secret, 'mode': '0640'},
+            ],
+            'dest': str(tmpdir),
+        })
+        m_exit_json.side_effect = ca_test_common.exit_json
+        auth_dump = {'auth_dump': [{'entity': 'client.foo', 'key': fake_secret, 'caps': fake_caps}]}
+        m_run_command.side_effect = [
+            (0, json.dumps(auth_dump), ''),
+            (0, '', 'imported keyring'),
+        ]
+
+        with pytest.raises(ca_test_common.AnsibleExitJson) as result:
+            ceph_key.run_module()
+
+        result = result.value.args[0]
+        base_cmd = ['ceph', '-n', 'client.admin', '-k', '/etc/ceph/ceph.client.admin.keyring', '--cluster', 'ceph', 'auth']  # noqa: E501
+        assert m_run_command.call_count == 2
+        assert m_run_command.call_args_list[0][0][0] == base_cmd + ['ls', '-f', 'json']
+        # only the missing key is imported
+        assert m_run_command.call_args_list[1][0][0] == base_cmd + ['import', '-i', '-']
+        assert m_run_command.call_args_list[1][1]['data'] == ceph_key.generate_keyring('client.bar', fake_secret, fake_caps)  # noqa: E501
+        assert result['changed']
+        assert [r['name'] for r in result['results']] == ['client.foo', 'client.bar']
+        # the keyring of each entity is written locally
+        for entity in ['client.foo', 'client.bar']:
+            keyring = tmpdir.join('ceph.{}.keyring'.format(entity))
+            assert keyring.read() == ceph_key.generate_keyring(entity, fake_secret, fake_caps)
+        assert oct(os.stat(str(tmpdir.join('ceph.client.bar.keyring'))).st_mode & 0o777) == oct(0o640)
+
+    @mock.patch('ansible.module_utils.basic.AnsibleModule.exit_json', autospec=True)
+    @mock.patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_batch_no_log(self, m_run_command, m_exit_json, tmpdir):
+        fake_secret = 'AQAin8tUUK84ExAA/QgBtI7gEMWdmnvKBzlXdQ=='
+        fake_key = 'AQBin8tUUK84ExAA/QgBtI7gEMWdmnvKBzlXdQ=='
+        fake_caps = {'mon': 'allow r'}
+        ca_test_common.set_module_args({
+            'keys': [{'name': 'client.foo', 'caps': fake_caps, 'secret': fake_secret},
+                     {'name': 'client.bar', 'caps': fake_caps, 'key': fake_key}],
+            'dest': str(tmpdir),
+        })
+        modules = []
+
+        def exit_json(module, **kwargs):
+            modules.append(module)
+            ca_test_common.exit_json(**kwargs)
+        m_exit_json.side_effect = exit_json
+        m_run_command.side_effect = [
+            (0, json.dumps({'auth_dump': []}), ''),
+            (0, '', 'imported keyring'),
+        ]
+
+        with pytest.raises(ca_test_common.AnsibleExitJson):
+            ceph_key.run_module()
+
+        # the secrets of the items are masked in the output
+        assert fake_secret in modules[0].no_log_values
+        assert fake_key in modules[0].no_log_values
+
+    @mock.patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @mock.patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_batch_present_no_change(self, m_run_command, m_exit_json, tmpdir):
+        fake_secret = 'AQAin8tUUK84ExAA/QgBtI7gEMWdmnvKBzlXdQ=='
+        fake_caps = {'mon': 'allow r'}
+        tmpdir.join('ceph.client.foo.keyring').write(ceph_key.generate_keyring('client.foo', fake_secret, fake_caps))
+        ca_test_common.set_module_args({
+            'keys': [{'name': 'client.foo', 'caps': fake_caps}],
+            'dest': str(tmpdir),
+        })
+        m_exit_json.side_effect = ca_test_common.exit_json
+        auth_dump = {'auth_dump': [{'entity': 'client.foo', 'key': fake_secret, 'caps': fake_caps}]}
+        m_run_command.return_value = 0, json.dumps(auth_dump), ''
+
+        with pytest.raises(ca_test_common.AnsibleExitJson) as result:
+            ceph_key.run_module()
+
+        result = result.value.args[0]
+        assert m_run_command.call_count == 1
+        assert not result['changed']
@@ -1,4 +1,5 @@
 from mock.mock import patch
+import json
 import os
 import pytest
 import ca_test_common
@@ -10,6 +11,16 @@ fake_container_image = 'quay.ceph.io/ceph/daemon:latest'
 fake_module = 'noup'
 fake_user = 'client.admin'
 fake_keyring = '/etc/ceph/{}.{}.keyring'.format(fake_cluster, fake_user)
+fake_base_cmd = ['ceph', '-n', fake_user, '-k', fake_keyring, '--cluster', fake_cluster]
+fake_module_ls = {
+    'always_on_modules': {'octopus': ['balancer', 'crash', 'status']},
+    'enabled_modules': ['iostat', 'restful'],
+    'disabled_modules': [{'name': 'dashboard', 'can_run': True}, {'name': 'prometheus', 'can_run': True}],
+}
+
+
+def mgr_dump(gid, available=True, epoch=10, modules=('iostat', 'restful')):
+    return 0, json.dumps({'epoch': epoch, 'active_gid': gid, 'available': available, 'modules': list(modules)}), ''
 
 
 class TestCephMgrModuleModule(object):
@@ -23,7 +34,7 @@ class TestCephMgrModuleModule(object):
             ceph_mgr_module.main()
 
         result = result.value.args[0]
-        assert result['msg'] == 'missing required arguments: name'
+        assert result['msg'] == 'one of the following is required: name, modules'
 
     @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
     def test_with_check_mode(self, m_exit_json):
@@ -160,3 +171,173 @@ class TestCephMgrModuleModule(object):
         assert result['rc'] == rc
         assert result['stderr'] == stderr
         assert result['stdout'] == stdout
+
+    def test_plan_modules(self):
+        assert ceph_mgr_module.plan_modules(fake_module_ls, ['iostat', 'dashboard', 'crash']) == (['restful'], ['dashboard'])
+        assert ceph_mgr_module.plan_modules(fake_module_ls, ['iostat', 'restful']) == ([], [])
+
+    def test_always_on_modules(self):
+        assert ceph_mgr_module.always_on_modules(fake_module_ls) == set(['balancer', 'crash', 'status'])
+        assert ceph_mgr_module.always_on_modules({'always_on_modules': ['balancer']}) == set(['balancer'])
+        assert ceph_mgr_module.always_on_modules({}) == set()
+
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_modules_up_to_date(self, m_run_command, m_exit_json):
+        ca_test_common.set_module_args({
+            'modules': ['iostat', 'restful', 'crash'],
+        })
+        m_exit_json.side_effect = ca_test_common.exit_json
+        m_run_command.side_effect = [
+            (0, json.dumps(fake_module_ls), ''),
+            mgr_dump(4100),
+        ]
+
+        with pytest.raises(ca_test_common.AnsibleExitJson) as result:
+            ceph_mgr_module.main()
+
+        result = result.value.args[0]
+        assert not result['changed']
+        assert result['cmd'] == []
+        assert result['polls'] == 1
+        assert [c[0][0] for c in m_run_command.call_args_list] == [
+            fake_base_cmd + ['mgr', 'module', 'ls', '--format=json'],
+            fake_base_cmd + ['mgr', 'dump', '--format=json'],
+        ]
+
+    @patch('time.sleep')
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_modules(self, m_run_command, m_exit_json, m_sleep):
+        ca_test_common.set_module_args({
+            'modules': ['iostat', 'dashboard', 'prometheus'],
+        })
+        m_exit_json.side_effect = ca_test_common.exit_json
+        commands = {}
+
+        def run_command(cmd, data=None, binary_data=False):
+            if cmd[-2:] == ['ls', '--format=json']:
+                return 0, json.dumps(fake_module_ls), ''
+            if cmd[-2:] == ['dump', '--format=json']:
+                commands['dump'] = commands.get('dump', 0) + 1
+                new_modules = ('iostat', 'dashboard', 'prometheus', 'crash')
+                return [
+                    mgr_dump(4100),
+                    # the changes aren't in the mgr map yet
+                    mgr_dump(4100),
+                    # the previous mgr is still reported available right after the changes
+                    mgr_dump(4100, epoch=11, modules=new_modules),
+                    mgr_dump(4100, epoch=11, modules=new_modules),
+                    mgr_dump(4200, False, epoch=12, modules=new_modules),
+                    mgr_dump(4200, epoch=13, modules=new_modules),
+                ][commands['dump'] - 1]
+            return 0, '', ''
+        m_run_command.side_effect = run_command
+
+        with pytest.raises(ca_test_common.AnsibleExitJson) as result:
+            ceph_mgr_module.main()
+
+        result = result.value.args[0]
+        assert result['changed']
+        assert result['disabled'] == ['restful']
+        assert result['enabled'] == ['dashboard', 'prometheus']
+        assert sorted(result['cmd']) == sorted([
+            fake_base_cmd + ['mgr', 'module', 'disable', 'restful'],
+            fake_base_cmd + ['mgr', 'module', 'enable', 'dashboard'],
+            fake_base_cmd + ['mgr', 'module', 'enable', 'prometheus'],
+        ])
+        assert result['polls'] == 6
+        assert [c[0][0] for c in m_sleep.call_args_list] == [1, 1, 2]
+
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_modules_check_mode(self, m_run_command, m_exit_json):
+        ca_test_common.set_module_args({
+            'modules': ['iostat'],
+            '_ansible_check_mode': True,
+        })
+        m_exit_json.side_effect = ca_test_common.exit_json
+        m_run_command.return_value = 0, json.dumps(fake_module_ls), ''
+
+        with pytest.raises(ca_test_common.AnsibleExitJson) as result:
+            ceph_mgr_module.main()
+
+        result = result.value.args[0]
+        assert result['changed']
+        assert result['disabled'] == ['restful']
+        assert result['cmd'] == []
+        m_run_command.assert_called_once()
+
+    @patch('ansible.module_utils.basic.AnsibleModule.fail_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_modules_failure(self, m_run_command, m_fail_json):
+        ca_test_common.set_module_args({
+            'modules': ['iostat', 'restful', 'foo'],
+            'wait': False,
+        })
+        m_fail_json.side_effect = ca_test_common.fail_json
+        stderr = 'Error ENOENT: all mgr daemons do not support module \'foo\', pass --force to force enablement'
+        m_run_command.side_effect = [
+            (0, json.dumps(fake_module_ls), ''),
+            (2, '', stderr),
+        ]
+
+        with pytest.raises(ca_test_common.AnsibleFailJson) as result:
+            ceph_mgr_module.main()
+
+        result = result.value.args[0]
+        assert result['msg'] == 'failed to enable or disable the mgr modules'
+        assert result['rc'] == 2
+        assert result['stderr'] == stderr
+
+    @patch('time.time')
+    @patch('time.sleep')
+    @patch('ansible.module_utils.basic.AnsibleModule.fail_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_modules_timeout(self, m_run_command, m_fail_json, m_sleep, m_time):
+        ca_test_common.set_module_args({
+            'modules': ['iostat'],
+            'timeout': 10,
+        })
+        m_fail_json.side_effect = ca_test_common.fail_json
+        m_time.side_effect = [0, 4, 12]
+        m_run_command.side_effect = [
+            (0, json.dumps(fake_module_ls), ''),
+            mgr_dump(4100, False),
+            mgr_dump(4100, False),
+        ]
+
+        with pytest.raises(ca_test_common.AnsibleFailJson) as result:
+            ceph_mgr_module.main()
+
+        result = result.value.args[0]
+        assert result['msg'] == 'timed out waiting for the mgr to be available'
+        assert result['polls'] == 2
+        assert result['cmd'] == []
+
+    @patch('time.time')
+    @patch('time.sleep')
+    @patch('ansible.module_utils.basic.AnsibleModule.fail_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_modules_not_in_mgr_map(self, m_run_command, m_fail_json, m_sleep, m_time):
+        ca_test_common.set_module_args({
+            'modules': ['iostat'],
+            'timeout': 10,
+        })
+        m_fail_json.side_effect = ca_test_common.fail_json
+        m_time.side_effect = [0, 0, 4, 12]
+        m_run_command.side_effect = [
+            (0, json.dumps(fake_module_ls), ''),
+            mgr_dump(4100),
+            (0, '', ''),
+            # a new mgr without the changes isn't the respawn
+            mgr_dump(4200, epoch=11),
+            mgr_dump(4200, epoch=11),
+        ]
+
+        with pytest.raises(ca_test_common.AnsibleFailJson) as result:
+            ceph_mgr_module.main()
+
+        result = result.value.args[0]
+        assert result['msg'] == 'timed out waiting for the mgr map to have the new modules'
+        assert result['polls'] == 3
@@ -138,22 +138,51 @@ class TestCephOSDModule(object):
         assert result['stderr'] == stderr
         assert result['stdout'] == stdout
 
-    @patch('ansible.module_utils.basic.AnsibleModule.fail_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
     @patch('ansible.module_utils.basic.AnsibleModule.run_command')
     @pytest.mark.parametrize('state', ['destroy', 'purge'])
-    def test_invalid_state_multiple_ids(self, m_run_command, m_fail_json, state):
+    def test_destroy_purge_multiple_ids(self, m_run_command, m_exit_json, state):
         ca_test_common.set_module_args({
             'ids': fake_ids,
             'state': state
         })
-        m_fail_json.side_effect = ca_test_common.fail_json
+        m_exit_json.side_effect = ca_test_common.exit_json
+        m_run_command.side_effect = [(0, '', '{} osd.{}\n'.format(state, osd)) for osd in fake_ids]
+        cmds = [['ceph', '-n', fake_user, '-k', fake_keyring, '--cluster', fake_cluster,
+                 'osd', state, osd, '--yes-i-really-mean-it'] for osd in fake_ids]
 
-        with pytest.raises(ca_test_common.AnsibleFailJson) as result:
+        with pytest.raises(ca_test_common.AnsibleExitJson) as result:
+            ceph_osd.main()
+
+        result = result.value.args[0]
+        assert result['changed']
+        assert result['cmd'] == cmds
+        assert result['rc'] == 0
+        assert result['stderr'] == '\n'.join('{} osd.{}'.format(state, osd) for osd in fake_ids)
+        assert [c[0][0] for c in m_run_command.call_args_list] == cmds
+
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_purge_multiple_ids_with_failure(self, m_run_command, m_exit_json):
+        ca_test_common.set_module_args({
+            'ids': fake_ids,
+            'state': 'purge'
+        })
+        m_exit_json.side_effect = ca_test_common.exit_json
+        stderr = 'Error EBUSY: osd.{} is not `down`.'.format(fake_ids[1])
+        m_run_command.side_effect = [
+            (0, '', 'purged osd.{}'.format(fake_ids[0])),
+            (16, '', stderr),
+        ]
+
+        with pytest.raises(ca_test_common.AnsibleExitJson) as result:
             ceph_osd.main()
 
         result = result.value.args[0]
-        assert result['msg'] == 'destroy and purge only support one OSD at at time'
-        assert result['rc'] == 1
+        assert result['rc'] == 16
+        assert result['stderr'] == 'purged osd.{}\n{}'.format(fake_ids[0], stderr)
+        # the batch stops on the first failure
+        assert m_run_command.call_count == 2
 
     @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
     @patch('ansible.module_utils.basic.AnsibleModule.run_command')
@@ -0,0 +1,148 @@
+from mock.mock import patch
+import json
+import pytest
+import ca_test_common
+import ceph_osd_facts
+
+fake_cluster = 'ceph'
+fake_user = 'client.admin'
+fake_keyring = '/etc/ceph/{}.{}.keyring'.format(fake_cluster, fake_user)
+fake_metadata = [
+    {'id': 0, 'hostname': 'osd0', 'osd_objectstore': 'filestore', 'devices': 'sdb,sdc', 'ceph_version_short': '15.2.8'},
+    {'id': 1, 'hostname': 'osd1', 'osd_objectstore': 'bluestore', 'devices': 'sdb', 'ceph_version_short': '15.2.8'},
+    {'id': 2, 'hostname': 'osd0', 'osd_objectstore': 'bluestore', 'devices': 'sdd', 'ceph_version_short': '15.2.8'},
+]
+fake_tree = {
+    'nodes': [
+        {'id': -1, 'name': 'default', 'type': 'root', 'children': [-3, -5]},
+        {'id': -3, 'name': 'osd0', 'type': 'host', 'children': [2, 0]},
+        {'id': -5, 'name': 'osd1', 'type': 'host', 'children': [1]},
+        {'id': 0, 'name': 'osd.0', 'type': 'osd', 'device_class': 'hdd', 'crush_weight': 0.0488, 'status': 'up', 'reweight': 1},
+        {'id': 1, 'name': 'osd.1', 'type': 'osd', 'device_class': 'ssd', 'crush_weight': 0.0488, 'status': 'up', 'reweight': 1},
+        {'id': 2, 'name': 'osd.2', 'type': 'osd', 'device_class': 'hdd', 'crush_weight': 0.0488, 'status': 'down', 'reweight': 0},
+    ],
+    'stray': [
+        {'id': 3, 'name': 'osd.3', 'type': 'osd', 'status': 'down', 'reweight': 0},
+    ],
+}
+fake_dump = {
+    'osds': [
+        {'osd': 0, 'uuid': 'a0', 'up': 1, 'in': 1, 'weight': 1.0},
+        {'osd': 1, 'uuid': 'a1', 'up': 1, 'in': 1, 'weight': 1.0},
+        {'osd': 2, 'uuid': 'a2', 'up': 0, 'in': 0, 'weight': 0.0},
+        {'osd': 3, 'uuid': 'a3', 'up': 0, 'in': 0, 'weight': 0.0},
+    ],
+}
+
+
+def outputs():
+    return [
+        (0, json.dumps(fake_metadata), ''),
+        (0, json.dumps(fake_tree), ''),
+        (0, json.dumps(fake_dump), ''),
+    ]
+
+
+class TestCephOsdFactsModule(object):
+
+    def test_generate_osd_cmd(self):
+        assert ceph_osd_facts.generate_osd_cmd(fake_cluster, 'metadata') == [
+            'ceph', '-n', fake_user, '-k', fake_keyring, '--cluster', fake_cluster, 'osd', 'metadata', '--format=json'
+        ]
+
+    def test_build_osd_facts(self):
+        osds = ceph_osd_facts.build_osd_facts(fake_metadata, fake_tree, fake_dump)
+
+        assert sorted(osds) == ['0', '1', '2', '3']
+        assert osds['0'] == {
+            'id': 0, 'host': 'osd0', 'hostname': 'osd0', 'up': True, 'in': True, 'uuid': 'a0',
+            'objectstore': 'filestore', 'device_class': 'hdd', 'crush_weight': 0.0488, 'reweight': 1.0,
+            'devices': ['sdb', 'sdc'], 'ceph_version': '15.2.8',
+        }
+        # osd.3 isn't in the crush map and never reported its metadata
+        assert osds['3']['host'] is None
+        assert osds['3']['objectstore'] is None
+        assert osds['3']['devices'] == []
+
+    def test_build_host_facts(self):
+        osds = ceph_osd_facts.build_osd_facts(fake_metadata, fake_tree, fake_dump)
+
+        assert ceph_osd_facts.build_host_facts(osds) == {
+            'osd0': {'ids': [0, 2], 'objectstores': ['filestore', 'bluestore']},
+            'osd1': {'ids': [1], 'objectstores': ['bluestore']},
+        }
+
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_all_osds(self, m_run_command, m_exit_json):
+        ca_test_common.set_module_args({})
+        m_exit_json.side_effect = ca_test_common.exit_json
+        m_run_command.side_effect = outputs()
+
+        with pytest.raises(ca_test_common.AnsibleExitJson) as result:
+            ceph_osd_facts.main()
+
+        result = result.value.args[0]
+        assert not result['changed']
+        assert m_run_command.call_count == 3
+        assert [cmd[8] for cmd in result['cmd']] == ['metadata', 'tree', 'dump']
+        assert sorted(result['ansible_facts']['ceph_osds']) == ['0', '1', '2', '3']
+        assert sorted(result['ansible_facts']['ceph_osd_hosts']) == ['osd0', 'osd1']
+
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_filter_hosts(self, m_run_command, m_exit_json):
+        ca_test_common.set_module_args({'hosts': ['osd0']})
+        m_exit_json.side_effect = ca_test_common.exit_json
+        m_run_command.side_effect = outputs()
+
+        with pytest.raises(ca_test_common.AnsibleExitJson) as result:
+            ceph_osd_facts.main()
+
+        facts = result.value.args[0]['ansible_facts']
+        assert sorted(facts['ceph_osds']) == ['0', '2']
+        assert facts['ceph_osd_hosts'] == {'osd0': {'ids': [0, 2], 'objectstores': ['filestore', 'bluestore']}}
+
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_filter_ids(self, m_run_command, m_exit_json):
+        ca_test_common.set_module_args({'ids': [1, '3']})
+        m_exit_json.side_effect = ca_test_common.exit_json
+        m_run_command.side_effect = outputs()
+
+        with pytest.raises(ca_test_common.AnsibleExitJson) as result:
+            ceph_osd_facts.main()
+
+        facts = result.value.args[0]['ansible_facts']
+        assert sorted(facts['ceph_osds']) == ['1', '3']
+        assert facts['ceph_osds']['1']['uuid'] == 'a1'
+
+    @patch('ansible.module_utils.basic.AnsibleModule.fail_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_unknown_ids(self, m_run_command, m_fail_json):
+        ca_test_common.set_module_args({'ids': [1, 7, 8]})
+        m_fail_json.side_effect = ca_test_common.fail_json
+        m_run_command.side_effect = outputs()
+
+        with pytest.raises(ca_test_common.AnsibleFailJson) as result:
+            ceph_osd_facts.main()
+
+        assert result.value.args[0]['msg'] == 'osd(s) 7, 8 not found'
+
+    @patch('ansible.module_utils.basic.AnsibleModule.fail_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_failure(self, m_run_command, m_fail_json):
+        ca_test_common.set_module_args({})
+        m_fail_json.side_effect = ca_test_common.fail_json
+        m_run_command.side_effect = [
+            (0, json.dumps(fake_metadata), ''),
+            (1, '', 'Error EACCES: access denied'),
+        ]
+
+        with pytest.raises(ca_test_common.AnsibleFailJson) as result:
+            ceph_osd_facts.main()
+
+        result = result.value.args[0]
+        assert result['msg'] == 'failed to get the osd tree'
+        assert result['rc'] == 1
+        assert result['stderr'] == 'Error EACCES: access denied'
@@ -0,0 +1,128 @@
+from mock.mock import patch
+import json
+import pytest
+import ca_test_common
+import ceph_osd_upgrade_batches
+
+fake_cluster = 'ceph'
+fake_user = 'client.admin'
+fake_keyring = '/etc/ceph/{}.{}.keyring'.format(fake_cluster, fake_user)
+fake_crush_dump = {
+    'types': [
+        {'type_id': 0, 'name': 'osd'},
+        {'type_id': 1, 'name': 'host'},
+        {'type_id': 3, 'name': 'rack'},
+        {'type_id': 11, 'name': 'root'},
+    ],
+    'buckets': [
+        {'id': -1, 'name': 'default', 'type_name': 'root',
+         'items': [{'id': -2}, {'id': -3}]},
+        {'id': -2, 'name': 'rack1', 'type_name': 'rack',
+         'items': [{'id': -4}, {'id': -5}]},
+        {'id': -3, 'name': 'rack2', 'type_name': 'rack',
+         'items': [{'id': -6}]},
+        {'id': -4, 'name': 'osd0', 'type_name': 'host', 'items': [{'id': 0}, {'id': 3}]},
+        {'id': -5, 'name': 'osd1', 'type_name': 'host', 'items': [{'id': 1}]},
+        {'id': -6, 'name': 'osd2', 'type_name': 'host', 'items': [{'id': 2}]},
+    ],
+    'rules': [
+        {'rule_id': 0, 'steps': [{'op': 'take', 'item': -1},
+                                 {'op': 'chooseleaf_firstn', 'num': 0, 'type': 'rack'},
+                                 {'op': 'emit'}]},
+        {'rule_id': 1, 'steps': [{'op': 'take', 'item': -1},
+                                 {'op': 'chooseleaf_firstn', 'num': 0, 'type': 'host'},
+                                 {'op': 'emit'}]},
+    ],
+}
+fake_hosts = {'osd0.example.com': 'osd0', 'osd2.example.com': 'osd2', 'osd1.example.com': 'osd1', 'mon0': 'mon0'}
+
+
+class TestCephOSDUpgradeBatchesModule(object):
+
+    def test_get_failure_domain(self):
+        assert ceph_osd_upgrade_batches.get_failure_domain(fake_crush_dump, [{'crush_rule': 0}]) == 'rack'
+        # the smallest failure domain of the rules in use
+        assert ceph_osd_upgrade_batches.get_failure_domain(fake_crush_dump, [{'crush_rule': 0}, {'crush_rule': 1}]) == 'host'
+        # all the rules when there's no pool
+        assert ceph_osd_upgrade_batches.get_failure_domain(fake_crush_dump, []) == 'host'
+
+    def test_generate_batches(self):
+        host_domains = ceph_osd_upgrade_batches.get_host_domains(fake_crush_dump, 'rack')
+        assert host_domains == {
+            'osd0': {'domain': 'rack1', 'osds': [0, 3]},
+            'osd1': {'domain': 'rack1', 'osds': [1]},
+            'osd2': {'domain': 'rack2', 'osds': [2]},
+        }
+        assert ceph_osd_upgrade_batches.generate_batches(fake_hosts, host_domains) == [
+            (['osd0.example.com', 'osd1.example.com'], [0, 3, 1]),
+            (['osd2.example.com'], [2]),
+            (['mon0'], []),
+        ]
+        assert ceph_osd_upgrade_batches.generate_batches(fake_hosts, host_domains, max_batch_size=1) == [
+            (['osd0.example.com'], [0, 3]),
+            (['osd2.example.com'], [2]),
+            (['osd1.example.com'], [1]),
+            (['mon0'], []),
+        ]
+        host_domains = ceph_osd_upgrade_batches.get_host_domains(fake_crush_dump, 'host')
+        assert len(ceph_osd_upgrade_batches.generate_batches(fake_hosts, host_domains)) == 4
+
+    def test_generate_batches_unknown_domain(self):
+        host_domains = ceph_osd_upgrade_batches.get_host_domains(fake_crush_dump, 'rack')
+        host_domains['osd3'] = {'domain': 'rack2', 'osds': []}
+        hosts = dict(fake_hosts)
+        hosts.update({'osd3.example.com': 'osd3', 'osd4.example.com': 'osd4', 'mon1': 'mon1'})
+        # the hosts without host bucket or without osd are never grouped
+        assert ceph_osd_upgrade_batches.generate_batches(hosts, host_domains) == [
+            (['osd0.example.com', 'osd1.example.com'], [0, 3, 1]),
+            (['osd2.example.com'], [2]),
+            (['mon0'], []),
+            (['osd3.example.com'], []),
+            (['osd4.example.com'], []),
+            (['mon1'], []),
+        ]
+
+    def test_generate_batches_max_osds(self):
+        host_domains = ceph_osd_upgrade_batches.get_host_domains(fake_crush_dump, 'root')
+        assert ceph_osd_upgrade_batches.generate_batches(fake_hosts, host_domains, max_osds=3) == [
+            (['osd0.example.com', 'osd2.example.com'], [0, 3, 2]),
+            (['osd1.example.com'], [1]),
+            (['mon0'], []),
+        ]
+        # osd0 has more osds than the budget, it's alone in its batch
+        assert ceph_osd_upgrade_batches.generate_batches(fake_hosts, host_domains, max_osds=1) == [
+            (['osd0.example.com'], [0, 3]),
+            (['osd2.example.com'], [2]),
+            (['osd1.example.com'], [1]),
+            (['mon0'], []),
+        ]
+
+    @pytest.mark.parametrize('ok_to_stop_rc', [0, 16])
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_batches(self, m_run_command, m_exit_json, ok_to_stop_rc):
+        ca_test_common.set_module_args({
+            'hosts': fake_hosts,
+        })
+        m_exit_json.side_effect = ca_test_common.exit_json
+        m_run_command.side_effect = [
+            (0, json.dumps(fake_crush_dump), ''),
+            (0, json.dumps([{'pool_name': 'rbd', 'crush_rule': 0}]), ''),
+            (ok_to_stop_rc, '', ''),
+        ]
+
+        with pytest.raises(ca_test_common.AnsibleExitJson) as result:
+            ceph_osd_upgrade_batches.main()
+
+        result = result.value.args[0]
+        assert not result['changed']
+        assert result['failure_domain'] == 'rack'
+        base_cmd = ['ceph', '-n', fake_user, '-k', fake_keyring, '--cluster', fake_cluster]
+        assert m_run_command.call_args_list[2][0][0] == base_cmd + ['osd', 'ok-to-stop', '0', '3', '1']
+        if ok_to_stop_rc == 0:
+            assert result['batches'] == [['osd0.example.com', 'osd1.example.com'], ['osd2.example.com'], ['mon0']]
+            assert result['batch_sizes'] == [2, 1, 1]
+        else:
+            assert result['batches'] == [['osd0.example.com'], ['osd1.example.com'], ['osd2.example.com'], ['mon0']]
+            assert result['batch_sizes'] == [1, 1, 1, 1]
+        assert result['hosts'] == ['osd0.example.com', 'osd1.example.com', 'osd2.example.com', 'mon0']
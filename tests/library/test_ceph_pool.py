@@ -1,6 +1,9 @@
+import json
 import os
 import sys
+import ca_test_common
 import ceph_pool
+import pytest
 from mock.mock import patch
 
 sys.path.append('./library')
@@ -621,3 +624,56 @@ class TestCephPoolModule(object):
                                     fake_user, fake_user_key, container_image=fake_container_image_name)
 
         assert cmd == expected_command
+
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_batch_present(self, m_run_command, m_exit_json):
+        ca_test_common.set_module_args({
+            'pools': [
+                {'name': 'foo2', 'size': 2, 'pg_autoscale_mode': 'on',
+                 'target_size_ratio': '0.3', 'application': 'rbd'},
+                {'name': 'bar', 'type': 'replicated', 'application': 'rgw'},
+            ]
+        })
+        m_exit_json.side_effect = ca_test_common.exit_json
+        self.fake_running_pool_details['options'] = {'target_size_ratio': 0.3}
+        m_run_command.return_value = 0, json.dumps([self.fake_running_pool_details]), ''
+
+        with pytest.raises(ca_test_common.AnsibleExitJson) as result:
+            ceph_pool.main()
+
+        result = result.value.args[0]
+        cmds = [c[0][0] for c in m_run_command.call_args_list]
+        base_cmd = ['ceph', '-n', fake_user, '-k', fake_user_key, '--cluster', fake_cluster_name]
+        # a single 'ls detail' is enough to reconcile all the pools
+        assert cmds == [
+            base_cmd + ['osd', 'pool', 'ls', 'detail', '-f', 'json'],
+            base_cmd + ['osd', 'pool', 'create', 'bar', 'replicated', 'replicated_rule',
+                        '--expected_num_objects', '0', '--autoscale-mode', 'on'],
+            base_cmd + ['osd', 'pool', 'application', 'enable', 'bar', 'rgw'],
+        ]
+        assert result['changed']
+        assert result['rc'] == 0
+        assert [r['name'] for r in result['results']] == ['foo2', 'bar']
+        assert not result['results'][0]['changed']
+        assert result['results'][1]['changed']
+
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_batch_absent(self, m_run_command, m_exit_json):
+        ca_test_common.set_module_args({
+            'pools': [{'name': 'foo2'}, {'name': 'bar'}],
+            'state': 'absent'
+        })
+        m_exit_json.side_effect = ca_test_common.exit_json
+        m_run_command.return_value = 0, json.dumps([self.fake_running_pool_details]), ''
+
+        with pytest.raises(ca_test_common.AnsibleExitJson) as result:
+            ceph_pool.main()
+
+        result = result.value.args[0]
+        assert m_run_command.call_count == 2
+        assert m_run_command.call_args[0][0][-5:] == ['pool', 'rm', 'foo2', 'foo2', '--yes-i-really-really-mean-it']
+        assert result['changed']
+        assert result['results'][0]['changed']
+        assert not result['results'][1]['changed']
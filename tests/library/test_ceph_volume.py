@@ -2,6 +2,8 @@ import sys
 import mock
 import os
 import pytest
+import json
+import ca_test_common
 sys.path.append('./library')
 import ceph_volume  # noqa: E402
 
@@ -387,3 +389,170 @@ class TestCephVolumeModule(object):
         result = ceph_volume.batch(
             fake_module, fake_container_image)
         assert result == expected_command_list
+
+    def test_is_volume_used(self):
+        fake_lvm_list = {'0': [{'devices': ['/dev/sdb'],
+                                'lv_name': 'osd-block-foo',
+                                'lv_path': '/dev/ceph-foo/osd-block-foo',
+                                'type': 'block',
+                                'vg_name': 'ceph-foo'}],
+                         '1': [{'devices': ['/dev/sdc'],
+                                'lv_name': 'data-lv1',
+                                'lv_path': '/dev/vg1/data-lv1',
+                                'type': 'block',
+                                'vg_name': 'vg1'}]}
+        assert ceph_volume.is_volume_used(fake_lvm_list, '/dev/sdb', None)
+        assert ceph_volume.is_volume_used(fake_lvm_list, 'data-lv1', 'vg1')
+        assert not ceph_volume.is_volume_used(fake_lvm_list, 'data-lv1', 'vg2')
+        assert not ceph_volume.is_volume_used(fake_lvm_list, '/dev/sdd', None)
+
+    @mock.patch('ansible.module_utils.basic.AnsibleModule.fail_json')
+    @mock.patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_prepare_volumes(self, m_run_command, m_fail_json):
+        ca_test_common.set_module_args({
+            'action': 'prepare',
+            'volumes': [{'data': '/dev/sdb'}, {'data': '/dev/sdc'}, {'data': '/dev/sdd'}],
+            'workers': 2,
+        })
+        m_fail_json.side_effect = ca_test_common.fail_json
+        fake_lvm_list = {'0': [{'devices': ['/dev/sdb'], 'type': 'block'}]}
+
+        def fake_run_command(cmd, **kwargs):
+            if 'list' in cmd:
+                return 0, json.dumps(fake_lvm_list), ''
+            if '/dev/sdd' in cmd:
+                return 1, '', 'error on /dev/sdd'
+            return 0, 'prepared', ''
+        m_run_command.side_effect = fake_run_command
+
+        with pytest.raises(ca_test_common.AnsibleFailJson) as result:
+            ceph_volume.main()
+
+        result = result.value.args[0]
+        cmds = [c[0][0] for c in m_run_command.call_args_list]
+        # a single 'lvm list' for all the volumes
+        assert cmds[0] == ['ceph-volume', '--cluster', 'ceph', 'lvm', 'list', '--format=json']
+        assert len(cmds) == 3
+        assert result['msg'] == 'failed to prepare /dev/sdd'
+        assert [r['data'] for r in result['results']] == ['/dev/sdb', '/dev/sdc', '/dev/sdd']
+        assert result['results'][0]['skipped']
+        assert result['results'][1]['changed']
+        assert result['results'][2]['rc'] == 1
+
+    @mock.patch('ansible.module_utils.basic.AnsibleModule.fail_json')
+    @mock.patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_prepare_volumes_worker_exit(self, m_run_command, m_fail_json):
+        ca_test_common.set_module_args({
+            'action': 'prepare',
+            'volumes': [{'data': '/dev/sdb'}, {'data': '/dev/sdc'}],
+            'workers': 2,
+        })
+        m_fail_json.side_effect = ca_test_common.fail_json
+
+        def fake_run_command(cmd, **kwargs):
+            if 'list' in cmd:
+                return 0, '{}', ''
+            if '/dev/sdc' in cmd:
+                # e.g. run_command calling fail_json
+                raise SystemExit(1)
+            return 0, 'prepared', ''
+        m_run_command.side_effect = fake_run_command
+
+        # the worker exiting doesn't hang the pool
+        with pytest.raises(ca_test_common.AnsibleFailJson) as result:
+            ceph_volume.main()
+
+        result = result.value.args[0]
+        assert result['msg'] == 'failed to prepare /dev/sdc'
+        assert result['results'][0]['changed']
+        assert result['results'][1]['rc'] == 1
+        assert result['results'][1]['stderr'] == 'SystemExit: 1'
+
+    @mock.patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @mock.patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_zap_volumes(self, m_run_command, m_exit_json):
+        ca_test_common.set_module_args({
+            'action': 'zap',
+            'volumes': [{'osd_fsid': 'a_uuid', 'destroy': False},
+                        {'data': '/dev/sdc'},
+                        {'data': 'data-lv1', 'data_vg': 'vg1'},
+                        {'data': 'data-lv2', 'data_vg': 'vg2'}],
+            'workers': 2,
+        })
+        m_exit_json.side_effect = ca_test_common.exit_json
+        fake_lvs = {'report': [{'lv': [{'lv_name': 'data-lv1', 'vg_name': 'vg1'}]}]}
+
+        def fake_run_command(cmd, **kwargs):
+            if cmd[0] == 'lvs':
+                return 0, json.dumps(fake_lvs), ''
+            return 0, 'zapped', ''
+        m_run_command.side_effect = fake_run_command
+
+        with pytest.raises(ca_test_common.AnsibleExitJson) as result:
+            ceph_volume.main()
+
+        result = result.value.args[0]
+        cmds = [c[0][0] for c in m_run_command.call_args_list]
+        # a single 'lvs' for all the volumes, a single rescan after the zaps
+        assert [c[0] for c in cmds].count('lvs') == 1
+        assert cmds[-2:] == [['vgscan', '--cache'], ['lvscan', '--cache']]
+        assert ['ceph-volume', '--cluster', 'ceph', 'lvm', 'zap', '--osd-fsid', 'a_uuid'] in cmds
+        assert ['ceph-volume', '--cluster', 'ceph', 'lvm', 'zap', '--destroy', '/dev/sdc'] in cmds
+        assert ['ceph-volume', '--cluster', 'ceph', 'lvm', 'zap', '--destroy', 'vg1/data-lv1'] in cmds
+        assert result['changed']
+        assert [r['data'] for r in result['results']] == ['a_uuid', '/dev/sdc', 'vg1/data-lv1', 'vg2/data-lv2']
+        # vg2/data-lv2 isn't an lv
+        assert result['results'][3]['skipped']
+
+    @mock.patch('ansible.module_utils.basic.AnsibleModule.fail_json')
+    @mock.patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_zap_volumes_failure(self, m_run_command, m_fail_json):
+        ca_test_common.set_module_args({
+            'action': 'zap',
+            'volumes': [{'data': '/dev/sdb'}, {'data': '/dev/sdc'}],
+            'workers': 2,
+        })
+        m_fail_json.side_effect = ca_test_common.fail_json
+
+        def fake_run_command(cmd, **kwargs):
+            if '/dev/sdb' in cmd:
+                return 1, '', 'error on /dev/sdb'
+            return 0, '', ''
+        m_run_command.side_effect = fake_run_command
+
+        with pytest.raises(ca_test_common.AnsibleFailJson) as result:
+            ceph_volume.main()
+
+        result = result.value.args[0]
+        assert result['msg'] == 'failed to zap /dev/sdb'
+        assert result['rc'] == 1
+        assert result['results'][1]['changed']
+
+    @mock.patch('ceph_volume.get_devices_state')
+    @mock.patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @mock.patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_list_cache(self, m_run_command, m_exit_json, m_get_devices_state, tmpdir):
+        ca_test_common.set_module_args({
+            'action': 'list',
+            'cache': True,
+        })
+        m_exit_json.side_effect = ca_test_common.exit_json
+        m_run_command.return_value = 0, '{}', ''
+        m_get_devices_state.return_value = ['1', ['sda'], 0]
+
+        with mock.patch('ceph_volume.CACHE_DIR', str(tmpdir.join('cache'))):
+            for _ in range(2):
+                with pytest.raises(ca_test_common.AnsibleExitJson) as result:
+                    ceph_volume.main()
+                assert result.value.args[0]['stdout'] == '{}'
+            # the second run is answered from the cache
+            assert m_run_command.call_count == 1
+
+            # the devices state changed, the cached result is stale
+            m_get_devices_state.return_value = ['2', ['sda'], 0]
+            with pytest.raises(ca_test_common.AnsibleExitJson):
+                ceph_volume.main()
+            assert m_run_command.call_count == 2
+
+            ceph_volume.invalidate_cache()
+            assert not tmpdir.join('cache').check()
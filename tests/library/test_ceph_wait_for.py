@@ -0,0 +1,201 @@
+from mock.mock import patch
+import json
+import pytest
+import ca_test_common
+import ceph_wait_for
+
+fake_cluster = 'ceph'
+fake_status = {
+    'pgmap': {
+        'num_pgs': 128,
+        'pgs_by_state': [
+            {'state_name': 'active+clean', 'count': 96},
+            {'state_name': 'active+clean+scrubbing', 'count': 16},
+            {'state_name': 'peering', 'count': 16},
+        ],
+    },
+}
+fake_clean_status = {
+    'pgmap': {
+        'num_pgs': 128,
+        'pgs_by_state': [{'state_name': 'active+clean', 'count': 128}],
+    },
+}
+fake_fs_dump = {
+    'standbys': [{'name': 'mds1', 'state': 'up:standby'}],
+    'filesystems': [
+        {'mdsmap': {'info': {'gid_4242': {'name': 'mds0', 'state': 'up:replay', 'rank': 0}}}},
+    ],
+}
+
+
+class TestCephWaitForModule(object):
+
+    def test_eval_pgs_active_clean(self):
+        assert ceph_wait_for.eval_pgs_active_clean(fake_status, {}) == (False, {'pgs_clean': 112, 'pgs_total': 128})
+        assert ceph_wait_for.eval_pgs_active_clean(fake_clean_status, {}) == (True, {'pgs_clean': 128, 'pgs_total': 128})
+        assert ceph_wait_for.eval_pgs_active_clean({'pgmap': {'num_pgs': 0}}, {}) == (True, {'pgs_clean': 0, 'pgs_total': 0})
+
+    def test_eval_quorum(self):
+        data = {'quorum_names': ['mon0', 'mon1']}
+        assert ceph_wait_for.eval_quorum(data, {'name': 'mon1'}) == (True, {'quorum': ['mon0', 'mon1']})
+        assert ceph_wait_for.eval_quorum(data, {'name': 'mon2'})[0] is False
+
+    def test_eval_osds_up(self):
+        data = {'osds': [
+            {'osd': 0, 'up': 1, 'in': 1},
+            {'osd': 1, 'up': 0, 'in': 1},
+            {'osd': 2, 'up': 0, 'in': 0},
+        ]}
+        assert ceph_wait_for.eval_osds_up(data, {'osds': [0]}) == (True, {'osds_up': 1, 'osds_total': 1})
+        assert ceph_wait_for.eval_osds_up(data, {'osds': [0, 1]}) == (False, {'osds_up': 1, 'osds_total': 2})
+        # all the in osds
+        assert ceph_wait_for.eval_osds_up(data, {'osds': []}) == (False, {'osds_up': 1, 'osds_total': 2})
+
+    def test_eval_mds_state(self):
+        params = {'name': 'mds0', 'state': ['up:active']}
+        assert ceph_wait_for.eval_mds_state(fake_fs_dump, params) == (False, {'mds_state': 'up:replay'})
+        params = {'name': 'mds1', 'state': ['up:active', 'up:standby']}
+        assert ceph_wait_for.eval_mds_state(fake_fs_dump, params) == (True, {'mds_state': 'up:standby'})
+        params = {'name': 'mds2', 'state': ['up:active']}
+        assert ceph_wait_for.eval_mds_state(fake_fs_dump, params) == (False, {'mds_state': None})
+
+    def test_eval_ok_to_stop(self):
+        data = {'ok_to_stop': True, 'osds': [0, 3], 'num_ok_pgs': 42, 'num_not_ok_pgs': 0}
+        assert ceph_wait_for.eval_ok_to_stop(data, {}) == (True, {'ok_to_stop': [0, 3]})
+        assert ceph_wait_for.eval_ok_to_stop({'ok_to_stop': False, 'osds': []}, {})[0] is False
+
+    def test_generate_status_cmd(self):
+        params = {'osds': [0, 3], 'max': 0}
+        assert ceph_wait_for.generate_status_cmd('ok_to_stop', fake_cluster, params) == [
+            'ceph', '-n', 'client.admin', '-k', '/etc/ceph/ceph.client.admin.keyring',
+            '--cluster', fake_cluster, 'osd', 'ok-to-stop', '0', '3', '--format', 'json'
+        ]
+        params = {'osds': [0], 'max': 8}
+        assert ceph_wait_for.generate_status_cmd('ok_to_stop', fake_cluster, params)[-4:] == [
+            '0', '--max=8', '--format', 'json'
+        ]
+        assert ceph_wait_for.generate_status_cmd('osds_up', fake_cluster, params)[-4:] == [
+            'osd', 'dump', '--format', 'json'
+        ]
+
+    def test_next_delay(self):
+        params = {'delay': 2, 'max_delay': 10}
+        # no progress, back off
+        assert ceph_wait_for.next_delay(2, params, {'pgs_clean': 1}, {'pgs_clean': 1}) == 4
+        assert ceph_wait_for.next_delay(8, params, {'pgs_clean': 1}, {'pgs_clean': 1}) == 10
+        # progress, poll again quickly
+        assert ceph_wait_for.next_delay(8, params, {'pgs_clean': 2}, {'pgs_clean': 1}) == 2
+        # errors aren't progress
+        assert ceph_wait_for.next_delay(4, params, {'error': 'timed out'}, {'pgs_clean': 1}) == 8
+
+    @patch('time.sleep')
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_wait_for_pgs(self, m_run_command, m_exit_json, m_sleep):
+        ca_test_common.set_module_args({
+            'condition': 'pgs_active_clean',
+        })
+        m_exit_json.side_effect = ca_test_common.exit_json
+        m_run_command.side_effect = [
+            (0, json.dumps(fake_status), ''),
+            (1, '', 'Error ETIMEDOUT'),
+            (0, json.dumps(fake_clean_status), ''),
+        ]
+
+        with pytest.raises(ca_test_common.AnsibleExitJson) as result:
+            ceph_wait_for.main()
+
+        result = result.value.args[0]
+        assert not result['changed']
+        assert result['cmd'] == 'ceph -n client.admin -k /etc/ceph/ceph.client.admin.keyring --cluster ceph status --format json'
+        assert result['polls'] == 3
+        assert result['status']['pgs_clean'] == 128
+        assert result['progress'][1]['error'] == 'Error ETIMEDOUT'
+        # a single status call per poll
+        assert m_run_command.call_count == 3
+        assert [c[0][0] for c in m_sleep.call_args_list] == [2, 4]
+
+    @patch('time.time')
+    @patch('time.sleep')
+    @patch('ansible.module_utils.basic.AnsibleModule.fail_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_wait_for_quorum_timeout(self, m_run_command, m_fail_json, m_sleep, m_time):
+        ca_test_common.set_module_args({
+            'condition': 'quorum',
+            'name': 'mon2',
+            'timeout': 10,
+        })
+        m_fail_json.side_effect = ca_test_common.fail_json
+        m_run_command.return_value = (0, json.dumps({'quorum_names': ['mon0', 'mon1']}), '')
+        clock = [0]
+
+        def sleep(delay):
+            clock[0] += delay
+        m_sleep.side_effect = sleep
+        m_time.side_effect = lambda: clock[0]
+
+        with pytest.raises(ca_test_common.AnsibleFailJson) as result:
+            ceph_wait_for.main()
+
+        result = result.value.args[0]
+        assert result['msg'] == 'Timed out after 10s waiting for quorum'
+        assert result['cmd'] == 'ceph -n client.admin -k /etc/ceph/ceph.client.admin.keyring --cluster ceph quorum_status --format json'
+        # 2 + 4 + the remaining 4 seconds
+        assert result['polls'] == 4
+        assert result['status'] == {'elapsed': 10, 'quorum': ['mon0', 'mon1']}
+
+    @patch('time.sleep')
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_wait_for_ok_to_stop(self, m_run_command, m_exit_json, m_sleep):
+        ca_test_common.set_module_args({
+            'condition': 'ok_to_stop',
+            'osds': [0],
+            'max': 8,
+        })
+        m_exit_json.side_effect = ca_test_common.exit_json
+        m_run_command.return_value = (0, json.dumps({'ok_to_stop': True, 'osds': [0, 3]}), '')
+
+        with pytest.raises(ca_test_common.AnsibleExitJson) as result:
+            ceph_wait_for.main()
+
+        result = result.value.args[0]
+        assert result['cmd'].endswith('osd ok-to-stop 0 --max=8 --format json')
+        assert result['status']['ok_to_stop'] == [0, 3]
+
+    @patch('time.sleep')
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_wait_for_ok_to_stop_nautilus(self, m_run_command, m_exit_json, m_sleep):
+        ca_test_common.set_module_args({
+            'condition': 'ok_to_stop',
+            'osds': [0],
+            'max': 8,
+        })
+        m_exit_json.side_effect = ca_test_common.exit_json
+        outputs = [
+            (22, '', "Invalid command: unused arguments: ['--max=8']"),
+            (16, '', 'Error EBUSY: 12 PGs are already too degraded'),
+            (0, '', 'OSD(s) 0 are ok to stop without reducing availability'),
+        ]
+        cmds = []
+
+        def run_command(cmd, **kwargs):
+            cmds.append(list(cmd))
+            return outputs.pop(0)
+        m_run_command.side_effect = run_command
+
+        with pytest.raises(ca_test_common.AnsibleExitJson) as result:
+            ceph_wait_for.main()
+
+        result = result.value.args[0]
+        # --max isn't supported, the osds are checked alone
+        assert [cmd[-3:] for cmd in cmds] == [
+            ['--max=8', '--format', 'json'],
+            ['0', '--format', 'json'],
+            ['0', '--format', 'json'],
+        ]
+        assert result['cmd'].endswith('osd ok-to-stop 0 --format json')
+        assert result['polls'] == 2
+        assert result['status']['ok_to_stop'] == [0]
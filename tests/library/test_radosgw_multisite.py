@@ -0,0 +1,161 @@
+from mock.mock import patch
+import json
+import pytest
+import ca_test_common
+import radosgw_multisite
+
+fake_cluster = 'ceph'
+fake_realm = 'foo'
+fake_zonegroup = 'bar'
+fake_zone = 'z1'
+fake_endpoints = ['http://192.168.1.10:8080', 'http://192.168.1.11:8080']
+fake_period = {
+    'realm_id': 'f1e2d3',
+    'period_map': {
+        'zonegroups': [
+            {'name': fake_zonegroup, 'endpoints': fake_endpoints, 'is_master': 'true',
+             'zones': [{'name': fake_zone, 'endpoints': fake_endpoints}]}
+        ]
+    }
+}
+fake_zone_get = {'system_key': {'access_key': 'foo', 'secret_key': 'bar'}}
+fake_args = {
+    'realms': [{'name': fake_realm, 'default': True}],
+    'zonegroups': [{'name': fake_zonegroup, 'realm': fake_realm, 'master': True}],
+    'zones': [{'name': fake_zone, 'realm': fake_realm, 'zonegroup': fake_zonegroup,
+               'endpoints': fake_endpoints, 'access_key': 'foo', 'secret_key': 'bar',
+               'master': True}],
+}
+
+
+def snapshot_outputs(realms, zonegroups, zones, period=None):
+    outputs = [
+        (0, json.dumps({'default_info': '', 'realms': realms}), ''),
+        (0, json.dumps({'default_info': '', 'zonegroups': zonegroups}), ''),
+        (0, json.dumps({'default_info': '', 'zones': zones}), ''),
+    ]
+    if period is not None:
+        outputs.append((0, json.dumps(period), ''))
+    return outputs
+
+
+def subcommands(m_run_command):
+    return [c[0][0][3:5] for c in m_run_command.call_args_list]
+
+
+class TestRadosgwMultisiteModule(object):
+
+    def test_zonegroup_endpoints(self):
+        zones = fake_args['zones']
+        assert radosgw_multisite.zonegroup_endpoints({'name': fake_zonegroup, 'realm': fake_realm}, zones) == fake_endpoints
+        assert radosgw_multisite.zonegroup_endpoints({'name': fake_zonegroup, 'realm': fake_realm, 'endpoints': []}, zones) == []
+        assert radosgw_multisite.zonegroup_endpoints({'name': 'baz', 'realm': fake_realm}, zones) is None
+
+    def test_plan_commits(self):
+        plan = [({'type': 'zone', 'name': 'z2', 'realm': fake_realm, 'action': 'create'}, [])]
+        zones = [{'name': 'z2', 'realm': fake_realm, 'zonegroup': fake_zonegroup},
+                 {'name': fake_zone, 'realm': fake_realm, 'zonegroup': fake_zonegroup, 'master': True}]
+        assert radosgw_multisite.plan_commits(plan, zones) == [
+            ({'type': 'period', 'name': fake_realm, 'realm': fake_realm, 'action': 'commit'},
+             ['period', 'update', '--commit', '--rgw-realm=' + fake_realm,
+              '--rgw-zonegroup=' + fake_zonegroup, '--rgw-zone=' + fake_zone])
+        ]
+        assert radosgw_multisite.plan_commits([], zones) == []
+
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_create_topology(self, m_run_command, m_exit_json):
+        ca_test_common.set_module_args(dict(fake_args))
+        m_exit_json.side_effect = ca_test_common.exit_json
+        m_run_command.side_effect = snapshot_outputs([], [], []) + [(0, '', '')] * 4
+
+        with pytest.raises(ca_test_common.AnsibleExitJson) as result:
+            radosgw_multisite.main()
+
+        result = result.value.args[0]
+        assert result['changed']
+        assert [(a['type'], a['action']) for a in result['actions']] == [
+            ('realm', 'create'), ('zonegroup', 'create'), ('zone', 'create'), ('period', 'commit')
+        ]
+        # no period get for a realm that doesn't exist yet, a single commit
+        assert subcommands(m_run_command) == [
+            ['realm', 'list'], ['zonegroup', 'list'], ['zone', 'list'],
+            ['realm', 'create'], ['zonegroup', 'create'], ['zone', 'create'], ['period', 'update'],
+        ]
+        assert result['cmd'][1][7] == '--endpoints=' + ','.join(fake_endpoints)
+
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_topology_up_to_date(self, m_run_command, m_exit_json):
+        ca_test_common.set_module_args(dict(fake_args))
+        m_exit_json.side_effect = ca_test_common.exit_json
+        m_run_command.side_effect = snapshot_outputs([fake_realm], [fake_zonegroup], [fake_zone], fake_period) + [
+            (0, json.dumps(fake_zone_get), ''),
+        ]
+
+        with pytest.raises(ca_test_common.AnsibleExitJson) as result:
+            radosgw_multisite.main()
+
+        result = result.value.args[0]
+        assert not result['changed']
+        assert result['actions'] == []
+        assert subcommands(m_run_command) == [
+            ['realm', 'list'], ['zonegroup', 'list'], ['zone', 'list'], ['period', 'get'], ['zone', 'get'],
+        ]
+
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_add_zone_endpoint(self, m_run_command, m_exit_json):
+        endpoints = fake_endpoints + ['http://192.168.1.12:8080']
+        args = dict(fake_args, zones=[dict(fake_args['zones'][0], endpoints=endpoints)])
+        ca_test_common.set_module_args(args)
+        m_exit_json.side_effect = ca_test_common.exit_json
+        m_run_command.side_effect = snapshot_outputs([fake_realm], [fake_zonegroup], [fake_zone], fake_period) + [
+            (0, '', ''),
+        ] * 3
+
+        with pytest.raises(ca_test_common.AnsibleExitJson) as result:
+            radosgw_multisite.main()
+
+        result = result.value.args[0]
+        assert result['changed']
+        # the zonegroup follows the endpoints of its master zone
+        assert [(a['type'], a['action']) for a in result['actions']] == [
+            ('zonegroup', 'modify'), ('zone', 'modify'), ('period', 'commit')
+        ]
+        assert m_run_command.call_count == 7
+
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_check_mode(self, m_run_command, m_exit_json):
+        ca_test_common.set_module_args(dict(fake_args, _ansible_check_mode=True))
+        m_exit_json.side_effect = ca_test_common.exit_json
+        m_run_command.side_effect = snapshot_outputs([], [], [])
+
+        with pytest.raises(ca_test_common.AnsibleExitJson) as result:
+            radosgw_multisite.main()
+
+        result = result.value.args[0]
+        assert result['changed']
+        assert result['cmd'] == []
+        assert len(result['actions']) == 4
+        assert m_run_command.call_count == 3
+
+    @patch('ansible.module_utils.basic.AnsibleModule.fail_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_failure(self, m_run_command, m_fail_json):
+        ca_test_common.set_module_args(dict(fake_args))
+        m_fail_json.side_effect = ca_test_common.fail_json
+        m_run_command.side_effect = snapshot_outputs([], [], []) + [
+            (0, '', ''),
+            (22, '', 'Error EINVAL'),
+        ]
+
+        with pytest.raises(ca_test_common.AnsibleFailJson) as result:
+            radosgw_multisite.main()
+
+        result = result.value.args[0]
+        assert result['msg'] == 'Failed to create zonegroup bar'
+        assert result['rc'] == 22
+        assert result['stderr'] == 'Error EINVAL'
+        assert len(result['cmd']) == 2
@@ -1,8 +1,10 @@
+import json
 import os
 import sys
 from mock.mock import patch, MagicMock
 import pytest
 sys.path.append('./library')
+import ca_test_common  # noqa: E402
 import radosgw_user  # noqa: E402
 
 
@@ -149,3 +151,142 @@ class TestRadosgwUserModule(object):
         ]
 
         assert radosgw_user.remove_user(fake_module) == expected_cmd
+
+    def test_list_users_metadata(self):
+        fake_module = MagicMock()
+        fake_module.params = fake_params
+        expected_cmd = [
+            fake_binary,
+            '--cluster', fake_cluster,
+            'metadata', 'list', 'user',
+            '--format=json',
+            '--rgw-realm=' + fake_realm,
+            '--rgw-zonegroup=' + fake_zonegroup,
+            '--rgw-zone=' + fake_zone
+        ]
+
+        assert radosgw_user.list_users_metadata(fake_module) == expected_cmd
+
+    def test_get_user_metadata(self):
+        fake_module = MagicMock()
+        fake_module.params = fake_params
+        expected_cmd = [
+            fake_binary,
+            '--cluster', fake_cluster,
+            'metadata', 'get', 'user:' + fake_user,
+            '--format=json',
+            '--rgw-realm=' + fake_realm,
+            '--rgw-zonegroup=' + fake_zonegroup,
+            '--rgw-zone=' + fake_zone
+        ]
+
+        assert radosgw_user.get_user_metadata(fake_module) == expected_cmd
+
+    def test_user_changed(self):
+        user = {
+            'display_name': fake_user,
+            'email': fake_user,
+            'keys': [{'access_key': fake_params['access_key'], 'secret_key': fake_params['secret_key']}],
+            'system': 'true',
+            'admin': True
+        }
+        assert not radosgw_user.user_changed(user, fake_params)
+        assert radosgw_user.user_changed(dict(user, system='false'), fake_params)
+        assert radosgw_user.user_changed(dict(user, keys=[]), fake_params)
+        assert not radosgw_user.user_changed(dict(user, email='bar'), dict(fake_params, email=None))
+
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_users(self, m_run_command, m_exit_json):
+        ca_test_common.set_module_args({
+            'users': [{'name': 'foo', 'system': True},
+                      {'name': 'bar', 'display_name': 'Bar'},
+                      {'name': 'baz'}],
+            'workers': 2,
+        })
+        m_exit_json.side_effect = ca_test_common.exit_json
+        metadata = {
+            'user:foo': {'display_name': 'foo', 'keys': [], 'system': 'true', 'admin': 'false'},
+            'user:bar': {'display_name': 'bar', 'keys': [], 'system': 'false', 'admin': 'false'},
+        }
+
+        def run_command(cmd):
+            if cmd[3:6] == ['metadata', 'list', 'user']:
+                return 0, json.dumps(['foo', 'bar']), ''
+            if cmd[3:5] == ['metadata', 'get']:
+                return 0, json.dumps({'key': cmd[5], 'data': metadata[cmd[5]]}), ''
+            return 0, '{}', ''
+        m_run_command.side_effect = run_command
+
+        with pytest.raises(ca_test_common.AnsibleExitJson) as result:
+            radosgw_user.main()
+
+        result = result.value.args[0]
+        assert result['changed']
+        assert [(r['name'], r['changed']) for r in result['results']] == [('foo', False), ('bar', True), ('baz', True)]
+        assert result['results'][1]['cmd'][3:5] == ['user', 'modify']
+        assert result['results'][2]['cmd'][3:5] == ['user', 'create']
+        cmds = [c[0][0][3:5] for c in m_run_command.call_args_list]
+        # a single list, no metadata get for the missing user
+        assert cmds.count(['metadata', 'list']) == 1
+        assert cmds.count(['metadata', 'get']) == 2
+        assert ['user', 'info'] not in cmds
+
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_users_options(self, m_run_command, m_exit_json):
+        ca_test_common.set_module_args({
+            'users': [{'name': 'foo', 'system': 'yes', 'secret_key': fake_params['secret_key']},
+                      {'name': 'bar', 'admin': 'no'}],
+            'admin': True,
+        })
+        m_exit_json.side_effect = ca_test_common.exit_json
+        m_run_command.side_effect = [
+            (0, '[]', ''),
+            (0, '{}', ''),
+            (0, '{}', ''),
+        ]
+
+        with pytest.raises(ca_test_common.AnsibleExitJson) as result:
+            radosgw_user.main()
+
+        result = result.value.args[0]
+        # the flags are converted to booleans, unset ones use the module level value
+        assert '--system' in result['results'][0]['cmd']
+        assert '--admin' in result['results'][0]['cmd']
+        assert '--admin' not in result['results'][1]['cmd']
+        assert '--secret-key=' + fake_params['secret_key'] in result['results'][0]['cmd']
+
+    @patch('ansible.module_utils.basic.AnsibleModule.fail_json')
+    def test_users_unknown_option(self, m_fail_json):
+        ca_test_common.set_module_args({
+            'users': [{'name': 'foo', 'secret': 'bar'}],
+        })
+        m_fail_json.side_effect = ca_test_common.fail_json
+
+        with pytest.raises(ca_test_common.AnsibleFailJson) as result:
+            radosgw_user.main()
+
+        assert 'secret' in result.value.args[0]['msg']
+
+    @patch('ansible.module_utils.basic.AnsibleModule.fail_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_users_failure(self, m_run_command, m_fail_json):
+        ca_test_common.set_module_args({
+            'users': [{'name': 'foo'}, {'name': 'bar'}],
+        })
+        m_fail_json.side_effect = ca_test_common.fail_json
+        m_run_command.side_effect = [
+            (0, '[]', ''),
+            (17, '', 'could not create user'),
+            (0, '{}', ''),
+        ]
+
+        with pytest.raises(ca_test_common.AnsibleFailJson) as result:
+            radosgw_user.main()
+
+        result = result.value.args[0]
+        assert result['msg'] == 'failed to create or modify foo'
+        assert result['rc'] == 17
+        # the other users are still created
+        assert [r['changed'] for r in result['results']] == [False, True]
@@ -1,8 +1,10 @@
+import json
 import os
 import sys
 from mock.mock import patch, MagicMock
 import pytest
 sys.path.append('./library')
+import ca_test_common  # noqa: E402
 import radosgw_zone  # noqa: E402
 
 
@@ -25,6 +27,15 @@ fake_realm = 'foo'
 fake_zonegroup = 'bar'
 fake_zone = 'z1'
 fake_endpoints = ['http://192.168.1.10:8080', 'http://192.168.1.11:8080']
+fake_period = {
+    'realm_id': 'f1e2d3',
+    'period_map': {
+        'zonegroups': [
+            {'name': fake_zonegroup,
+             'zones': [{'name': fake_zone, 'endpoints': fake_endpoints}]}
+        ]
+    }
+}
 fake_params = {'cluster': fake_cluster,
                'name': fake_zone,
                'realm': fake_realm,
@@ -149,6 +160,64 @@ class TestRadosgwZoneModule(object):
 
         assert radosgw_zone.get_realm(fake_module) == expected_cmd
 
+    def test_get_period(self):
+        fake_module = MagicMock()
+        fake_module.params = fake_params
+        expected_cmd = [
+            fake_binary,
+            '--cluster', fake_cluster,
+            'period', 'get',
+            '--rgw-realm=' + fake_realm,
+            '--format=json'
+        ]
+
+        assert radosgw_zone.get_period(fake_module) == expected_cmd
+
+    def test_get_period_zone(self):
+        assert radosgw_zone.get_period_zone(fake_period, fake_zonegroup, fake_zone)['endpoints'] == fake_endpoints
+        assert radosgw_zone.get_period_zone(fake_period, fake_zonegroup, 'z2') is None
+        assert radosgw_zone.get_period_zone({}, fake_zonegroup, fake_zone) is None
+
+    @pytest.mark.parametrize('endpoints,changed', [(fake_endpoints, False), (fake_endpoints[:1], True)])
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_present_committed_zone(self, m_run_command, m_exit_json, endpoints, changed):
+        ca_test_common.set_module_args(dict(fake_params, endpoints=endpoints))
+        m_exit_json.side_effect = ca_test_common.exit_json
+        m_run_command.side_effect = [
+            (0, json.dumps(fake_period), ''),
+            (0, '', ''),
+        ]
+
+        with pytest.raises(ca_test_common.AnsibleExitJson) as result:
+            radosgw_zone.main()
+
+        result = result.value.args[0]
+        assert result['changed'] == changed
+        # the period is enough to compare the zone
+        assert m_run_command.call_args_list[0][0][0][3:5] == ['period', 'get']
+        assert m_run_command.call_count == (2 if changed else 1)
+        if changed:
+            assert result['cmd'][3:5] == ['zone', 'modify']
+
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_present_system_keys(self, m_run_command, m_exit_json):
+        ca_test_common.set_module_args(dict(fake_params, access_key='foo', secret_key='bar'))
+        m_exit_json.side_effect = ca_test_common.exit_json
+        fake_zone_get = {'system_key': {'access_key': 'foo', 'secret_key': 'bar'}}
+        m_run_command.side_effect = [
+            (0, json.dumps(fake_period), ''),
+            (0, json.dumps(fake_zone_get), ''),
+        ]
+
+        with pytest.raises(ca_test_common.AnsibleExitJson) as result:
+            radosgw_zone.main()
+
+        result = result.value.args[0]
+        assert not result['changed']
+        assert result['cmd'][3:5] == ['zone', 'get']
+
     def test_remove_zone(self):
         fake_module = MagicMock()
         fake_module.params = fake_params
@@ -1,8 +1,10 @@
+import json
 import os
 import sys
 from mock.mock import patch, MagicMock
 import pytest
 sys.path.append('./library')
+import ca_test_common  # noqa: E402
 import radosgw_zonegroup  # noqa: E402
 
 
@@ -24,6 +26,15 @@ fake_container_cmd = [
 fake_realm = 'foo'
 fake_zonegroup = 'bar'
 fake_endpoints = ['http://192.168.1.10:8080', 'http://192.168.1.11:8080']
+fake_period = {
+    'realm_id': 'f1e2d3',
+    'period_map': {
+        'zonegroups': [
+            {'name': fake_zonegroup, 'endpoints': fake_endpoints,
+             'is_master': 'true', 'realm_id': 'f1e2d3'}
+        ]
+    }
+}
 fake_params = {'cluster': fake_cluster,
                'name': fake_zonegroup,
                'realm': fake_realm,
@@ -130,6 +141,56 @@ class TestRadosgwZonegroupModule(object):
 
         assert radosgw_zonegroup.get_realm(fake_module) == expected_cmd
 
+    def test_get_period(self):
+        fake_module = MagicMock()
+        fake_module.params = fake_params
+        expected_cmd = [
+            fake_binary,
+            '--cluster', fake_cluster,
+            'period', 'get',
+            '--rgw-realm=' + fake_realm,
+            '--format=json'
+        ]
+
+        assert radosgw_zonegroup.get_period(fake_module) == expected_cmd
+
+    @pytest.mark.parametrize('master,changed', [(True, False), (False, True)])
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_present_committed_zonegroup(self, m_run_command, m_exit_json, master, changed):
+        ca_test_common.set_module_args(dict(fake_params, master=master))
+        m_exit_json.side_effect = ca_test_common.exit_json
+        m_run_command.side_effect = [
+            (0, json.dumps(fake_period), ''),
+            (0, '', ''),
+        ]
+
+        with pytest.raises(ca_test_common.AnsibleExitJson) as result:
+            radosgw_zonegroup.main()
+
+        result = result.value.args[0]
+        assert result['changed'] == changed
+        assert m_run_command.call_count == (2 if changed else 1)
+
+    @patch('ansible.module_utils.basic.AnsibleModule.exit_json')
+    @patch('ansible.module_utils.basic.AnsibleModule.run_command')
+    def test_present_uncommitted_zonegroup(self, m_run_command, m_exit_json):
+        ca_test_common.set_module_args(fake_params)
+        m_exit_json.side_effect = ca_test_common.exit_json
+        zonegroup = fake_period['period_map']['zonegroups'][0]
+        m_run_command.side_effect = [
+            (0, json.dumps({'realm_id': 'f1e2d3', 'period_map': {'zonegroups': []}}), ''),
+            (0, json.dumps(zonegroup), ''),
+        ]
+
+        with pytest.raises(ca_test_common.AnsibleExitJson) as result:
+            radosgw_zonegroup.main()
+
+        result = result.value.args[0]
+        assert not result['changed']
+        # the realm id comes from the period, no realm get
+        assert m_run_command.call_count == 2
+
     def test_remove_zonegroup(self):
         fake_module = MagicMock()
         fake_module.params = fake_params
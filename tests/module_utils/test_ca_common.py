@@ -1,5 +1,6 @@
 from mock.mock import patch, MagicMock
 import os
+import time
 import ca_common
 import pytest
 
@@ -29,6 +30,124 @@ class TestCommon(object):
         cmd = ca_common.container_exec(self.fake_binary, fake_container_image)
         assert cmd == self.fake_container_cmd
 
+    @patch.dict(os.environ, {'CEPH_CONTAINER_BINARY': fake_container_binary,
+                             'CEPH_CONTAINER_SESSION_TIMEOUT': '300'})
+    @patch('ca_common.container_session_is_running')
+    @patch('ca_common.subprocess.call')
+    def test_container_exec_no_side_effect(self, m_call, m_is_running, tmpdir):
+        ca_common._container_sessions.clear()
+        with patch('ca_common.CONTAINER_SESSION_DIR', str(tmpdir)):
+            # building a command line doesn't start the helper container
+            assert ca_common.container_exec(self.fake_binary, fake_container_image) == self.fake_container_cmd
+            assert tmpdir.listdir() == []
+        m_call.assert_not_called()
+        m_is_running.assert_not_called()
+
+    @patch.dict(os.environ, {'CEPH_CONTAINER_BINARY': fake_container_binary})
+    def test_container_session_exec(self):
+        name = ca_common.container_session_name(fake_container_image)
+        cmd = ca_common.container_exec(self.fake_binary, fake_container_image, interactive=True) + ['-s']
+        assert ca_common.container_session_exec(cmd) == (
+            fake_container_image, [fake_container_binary, 'exec', '--interactive', name, self.fake_binary, '-s'])
+        assert ca_common.container_session_exec([self.fake_binary, '-s']) is None
+        # a container command with other volumes or privileges isn't rewritten
+        privileged = cmd[:2] + ['--privileged=true', '-v', '/dev:/dev'] + cmd[2:]
+        assert ca_common.container_session_exec(privileged) is None
+        extra_volume = cmd[:-3] + ['-v', '/run/lvm/:/run/lvm/'] + cmd[-3:]
+        assert ca_common.container_session_exec(extra_volume) is None
+
+    @patch.dict(os.environ, {'CEPH_CONTAINER_BINARY': fake_container_binary,
+                             'CEPH_CONTAINER_SESSION_TIMEOUT': '300'})
+    @patch('ca_common.container_session_is_running')
+    @patch('ca_common.subprocess.call')
+    def test_exec_command_session(self, m_call, m_is_running, tmpdir):
+        ca_common._container_sessions.clear()
+        m_is_running.side_effect = [False, True]
+        fake_module = MagicMock(check_mode=False)
+        fake_module.run_command.return_value = 0, 'ok', ''
+        name = ca_common.container_session_name(fake_container_image)
+        cmd = ca_common.container_exec(self.fake_binary, fake_container_image) + ['-s']
+        with patch('ca_common.CONTAINER_SESSION_DIR', str(tmpdir)):
+            _rc, _cmd, _out, _err = ca_common.exec_command(fake_module, cmd)
+            # the helper container is only started once per process
+            ca_common.exec_command(fake_module, cmd)
+            assert tmpdir.join(name).check(file=1)
+        assert _cmd == [fake_container_binary, 'exec', name, self.fake_binary, '-s']
+        assert fake_module.run_command.call_args[0][0] == _cmd
+        assert m_call.call_count == 1
+        run_cmd = m_call.call_args[0][0]
+        assert run_cmd[:6] == [fake_container_binary, 'run', '--detach', '--rm', '--name', name]
+        assert '--entrypoint=/bin/bash' in run_cmd
+
+    @patch.dict(os.environ, {'CEPH_CONTAINER_BINARY': fake_container_binary,
+                             'CEPH_CONTAINER_SESSION_TIMEOUT': '3'})
+    @patch('ca_common.container_session_is_running')
+    @patch('ca_common.subprocess.call')
+    def test_exec_command_session_heartbeat(self, m_call, m_is_running, tmpdir):
+        ca_common._container_sessions.clear()
+        m_is_running.side_effect = [False, True]
+        name = ca_common.container_session_name(fake_container_image)
+        refreshes = []
+
+        def long_command(cmd, **kwargs):
+            # the heartbeat is refreshed while the command runs
+            mtime = tmpdir.join(name).mtime()
+            os.utime(str(tmpdir.join(name)), (mtime - 100, mtime - 100))
+            time.sleep(1.5)
+            refreshes.append(tmpdir.join(name).mtime() > mtime - 100)
+            return 0, '', ''
+        fake_module = MagicMock(check_mode=False)
+        fake_module.run_command.side_effect = long_command
+        cmd = ca_common.container_exec(self.fake_binary, fake_container_image)
+        with patch('ca_common.CONTAINER_SESSION_DIR', str(tmpdir)):
+            ca_common.exec_command(fake_module, cmd)
+        assert refreshes == [True]
+
+    @patch.dict(os.environ, {'CEPH_CONTAINER_BINARY': fake_container_binary,
+                             'CEPH_CONTAINER_SESSION_TIMEOUT': '300'})
+    @patch('ca_common.container_session_is_running')
+    @patch('ca_common.subprocess.call')
+    def test_exec_command_session_check_mode(self, m_call, m_is_running, tmpdir):
+        ca_common._container_sessions.clear()
+        fake_module = MagicMock(check_mode=True)
+        fake_module.run_command.return_value = 0, '', ''
+        cmd = ca_common.container_exec(self.fake_binary, fake_container_image)
+        with patch('ca_common.CONTAINER_SESSION_DIR', str(tmpdir)):
+            _rc, _cmd, _out, _err = ca_common.exec_command(fake_module, cmd)
+            assert tmpdir.listdir() == []
+        assert _cmd == self.fake_container_cmd
+        m_call.assert_not_called()
+
+    @patch.dict(os.environ, {'CEPH_CONTAINER_BINARY': fake_container_binary,
+                             'CEPH_CONTAINER_SESSION_TIMEOUT': '300'})
+    @patch('ca_common.container_session_is_running')
+    @patch('ca_common.subprocess.call')
+    def test_exec_command_session_fallback(self, m_call, m_is_running, tmpdir):
+        ca_common._container_sessions.clear()
+        m_is_running.return_value = False
+        fake_module = MagicMock(check_mode=False)
+        fake_module.run_command.return_value = 0, '', ''
+        cmd = ca_common.container_exec(self.fake_binary, fake_container_image)
+        with patch('ca_common.CONTAINER_SESSION_DIR', str(tmpdir)):
+            _rc, _cmd, _out, _err = ca_common.exec_command(fake_module, cmd)
+        assert _cmd == self.fake_container_cmd
+
+    @pytest.mark.parametrize('timeout,expected', [(None, 0), ('0', 0), ('foo', 0), ('-1', 0), ('600', 600)])
+    def test_container_session_timeout(self, timeout, expected):
+        env = {}
+        if timeout is not None:
+            env['CEPH_CONTAINER_SESSION_TIMEOUT'] = timeout
+        with patch.dict(os.environ, env, clear=True):
+            assert ca_common.container_session_timeout() == expected
+
+    def test_container_session_stop(self, tmpdir):
+        with patch('ca_common.CONTAINER_SESSION_DIR', str(tmpdir)):
+            name = ca_common.container_session_name(fake_container_image)
+            tmpdir.join(name).write('')
+            assert ca_common.container_session_stop(fake_container_image)
+            assert not tmpdir.join(name).check()
+            assert not ca_common.container_session_stop(fake_container_image)
+
     def test_not_is_containerized(self):
         assert ca_common.is_containerized() is None
 
@@ -142,3 +261,94 @@ class TestCommon(object):
         assert _cmd == expected_cmd
         assert _err == stderr
         assert _out == stdout
+
+    def test_split_ceph_cmd(self):
+        cmd = ca_common.generate_ceph_cmd(['osd', 'pool'], ['ls', 'detail', '-f', 'json'])
+        assert ca_common.split_ceph_cmd(cmd) == {
+            'user': 'client.admin',
+            'keyring': '/etc/ceph/ceph.client.admin.keyring',
+            'cluster': 'ceph',
+            'containerized': False,
+            'format': 'json',
+            'infile': None,
+            'outfile': None,
+            'args': ['osd', 'pool', 'ls', 'detail'],
+        }
+        cmd = ca_common.generate_ceph_cmd(['auth'], ['import', '--in-file=-'])
+        assert ca_common.split_ceph_cmd(cmd)['infile'] == '-'
+        assert ca_common.split_ceph_cmd([self.fake_binary, '--version']) is None
+        assert ca_common.split_ceph_cmd(['ceph-volume', '-n', 'foo']) is None
+
+    @patch.dict(os.environ, {'CEPH_CONTAINER_BINARY': fake_container_binary})
+    def test_split_ceph_cmd_container(self):
+        cmd = ca_common.generate_ceph_cmd(['auth'], ['get', 'client.foo', '-o', '/etc/ceph/foo'],
+                                          container_image=fake_container_image)
+        parsed = ca_common.split_ceph_cmd(cmd)
+        assert parsed['containerized']
+        assert parsed['outfile'] == '/etc/ceph/foo'
+        assert parsed['args'] == ['auth', 'get', 'client.foo']
+        # files have to be read/written from the container
+        with patch('ca_common.rados_connect') as m_rados_connect:
+            assert ca_common.rados_command(cmd) is None
+        m_rados_connect.assert_not_called()
+
+    @pytest.mark.parametrize('ret,err', [(0, 'pool foo created'), (-2, 'Error ENOENT: pool foo created')])
+    @patch('ca_common.rados')
+    @patch('ca_common.json_command', create=True)
+    @patch('ca_common.validate_command', create=True)
+    @patch('ca_common.parse_json_funcsigs', create=True)
+    def test_exec_command_rados(self, m_parse_json_funcsigs, m_validate_command, m_json_command, m_rados, ret, err):
+        ca_common._rados_handles.clear()
+        fake_module = MagicMock()
+        m_json_command.side_effect = [
+            (0, b'{}', ''),
+            (ret, b'{"foo": 1}', 'pool foo created'),
+        ]
+        m_validate_command.return_value = {'prefix': 'osd pool create', 'pool': 'foo'}
+        cmd = ca_common.generate_ceph_cmd(['osd', 'pool'], ['create', 'foo', '-f', 'json'])
+
+        for _ in range(2):
+            if _:
+                m_json_command.side_effect = [(ret, b'{"foo": 1}', 'pool foo created')]
+            rc, _cmd, out, _err = ca_common.exec_command(fake_module, cmd)
+            assert rc == -ret
+            assert _cmd == cmd
+            assert out == '{"foo": 1}'
+            assert _err == err
+
+        fake_module.run_command.assert_not_called()
+        # a single librados handle per module execution
+        m_rados.Rados.assert_called_once_with(name='client.admin', clustername='ceph',
+                                              conffile='/etc/ceph/ceph.conf',
+                                              conf=dict(keyring='/etc/ceph/ceph.client.admin.keyring'))
+        m_validate_command.assert_called_with(m_parse_json_funcsigs.return_value, ['osd', 'pool', 'create', 'foo'])
+        m_json_command.assert_called_with(m_rados.Rados.return_value,
+                                          argdict={'prefix': 'osd pool create', 'pool': 'foo', 'format': 'json'},
+                                          inbuf=b'')
+
+    @patch.dict(os.environ, {'CEPH_RADOS_BACKEND': 'false'})
+    @patch('ca_common.rados')
+    def test_exec_command_rados_disabled(self, m_rados):
+        fake_module = MagicMock()
+        fake_module.run_command.return_value = 0, '', ''
+        cmd = ca_common.generate_ceph_cmd(['osd', 'pool'], ['ls'])
+        ca_common.exec_command(fake_module, cmd)
+        fake_module.run_command.assert_called_once_with(cmd, data=None, binary_data=False)
+        m_rados.Rados.assert_not_called()
+
+    @patch('ca_common.rados')
+    @patch('ca_common.json_command', create=True)
+    @patch('ca_common.validate_command', create=True)
+    @patch('ca_common.parse_json_funcsigs', create=True)
+    def test_exec_command_rados_fallback(self, m_parse_json_funcsigs, m_validate_command, m_json_command, m_rados):
+        ca_common._rados_handles.clear()
+        fake_module = MagicMock()
+        fake_module.run_command.return_value = 22, '', 'invalid command'
+        m_json_command.return_value = 0, b'{}', ''
+        # the arguments don't match any command, let the CLI report it
+        m_validate_command.return_value = {}
+        cmd = ca_common.generate_ceph_cmd(['osd', 'pool'], ['foo'])
+        rc, _cmd, out, err = ca_common.exec_command(fake_module, cmd, stdin='bar')
+        assert rc == 22
+        assert err == 'invalid command'
+        fake_module.run_command.assert_called_once_with(cmd, data='bar', binary_data=True)
@@ -0,0 +1,191 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import config_template
+import legacy_config_template
+import mock
+import timeit
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+
+CEPH_CONF = """# Please do not change this file directly since it is managed by Ansible
+[global]
+fsid = 40358a87-ab6e-4bdc-83db-1d909147861c
+mon host = [v2:192.168.1.10:3300,v1:192.168.1.10:6789]
+public network = 192.168.1.0/24 ; inline comment
+osd pool default size = 3
+rbd default features = 1
+rbd default features = 3
+rbd default features = 1
+
+# section comment
+[client.rgw.rgw0]
+host = rgw0
+keyring = /var/lib/ceph/radosgw/ceph-rgw.rgw0/keyring
+rgw frontends = beast endpoint=192.168.1.20:8080
+# option comment
+log file = /var/log/ceph/ceph-rgw-rgw0.log
+no value
+
+[DEFAULT]
+debug ms = 0
+"""
+
+CEPH_CONF_OVERRIDES = {
+    'global': {
+        'osd pool default size': 2,
+        'mon allow pool delete': True,
+        'rbd default features': ['1', '2'],
+        'auth supported': {'cephx': None, 'none': None},
+    },
+    'osd': {
+        'osd memory target': 4294967296,
+        'debug ms': 0,
+    },
+    'mon': {
+        'mon host': 'a\nb',
+    },
+    'log to stderr': 'false',
+}
+
+
+# rendered by the former ConfigTemplateParser
+CEPH_CONF_RESULT = """[DEFAULT]
+debug ms = 0
+log to stderr = false
+
+# section comment
+[client.rgw.rgw0]
+host = rgw0
+keyring = /var/lib/ceph/radosgw/ceph-rgw.rgw0/keyring
+# option comment
+log file = /var/log/ceph/ceph-rgw-rgw0.log
+{no_value}rgw frontends = beast endpoint=192.168.1.20:8080
+
+# Please do not change this file directly since it is managed by Ansible
+[global]
+auth supported = cephx
+auth supported = none
+fsid = 40358a87-ab6e-4bdc-83db-1d909147861c
+mon allow pool delete = True
+mon host = [v2:192.168.1.10:3300,v1:192.168.1.10:6789]
+osd pool default size = 2
+public network = 192.168.1.0/24
+rbd default features = 1,2
+
+[mon]
+mon host = a
+\tb
+
+[osd]
+debug ms = 0
+osd memory target = 4294967296
+
+"""
+
+OSD_CONF_RESULT = """[osd.{0}]
+bluestore cache autotune = true
+debug osd = 1/5,5/5
+osd crush location = host=node{1}
+osd memory target = {2}
+
+"""
+
+
+def legacy_parser(ignore_none_type=True, default_section='DEFAULT'):
+    config = legacy_config_template.ConfigTemplateParser(
+        allow_no_value=True,
+        dict_type=legacy_config_template.MultiKeyDict,
+        ignore_none_type=ignore_none_type,
+        default_section=default_section
+    )
+    config.optionxform = str
+    return config
+
+
+def merge(config_overrides, resultant, legacy=False, **kwargs):
+    action = config_template.ActionModule.__new__(config_template.ActionModule)
+    if legacy:
+        with mock.patch.object(config_template, 'IniConfig', legacy_parser):
+            return action.return_config_overrides_ini(
+                config_overrides, resultant, **kwargs)
+    return action.return_config_overrides_ini(
+        config_overrides, resultant, **kwargs)
+
+
+def generate_config(osds):
+    conf = CEPH_CONF
+    overrides = dict(CEPH_CONF_OVERRIDES)
+    for i in range(osds):
+        conf += "\n[osd.{0}]\nosd crush location = host=node{0}\n".format(i)
+        overrides['osd.{}'.format(i)] = {
+            'osd memory target': 4294967296 + i,
+            'osd crush location': 'host=node{}'.format(i // 4),
+            'bluestore cache autotune': 'true',
+            'debug osd': ['1/5', '5/5'],
+        }
+    return conf, overrides
+
+
+class TestIniConfig(object):
+
+    def test_same_output(self):
+        resultant, _ = merge(CEPH_CONF_OVERRIDES, CEPH_CONF)
+        assert resultant == CEPH_CONF_RESULT.format(no_value='')
+        assert (resultant, _) == merge(CEPH_CONF_OVERRIDES, CEPH_CONF, legacy=True)
+
+    def test_same_output_none_type(self):
+        resultant, _ = merge(CEPH_CONF_OVERRIDES, CEPH_CONF, ignore_none_type=False)
+        assert resultant == CEPH_CONF_RESULT.format(no_value='no value\n')
+        assert (resultant, _) == merge(CEPH_CONF_OVERRIDES, CEPH_CONF, legacy=True,
+                                       ignore_none_type=False)
+
+    def test_same_output_default_section(self):
+        # the default section isn't written first, as with the legacy
+        # parser on python 3
+        resultant, _ = merge(CEPH_CONF_OVERRIDES, CEPH_CONF, default_section='global')
+        assert resultant == CEPH_CONF_RESULT.format(no_value='')
+        assert (resultant, _) == merge(CEPH_CONF_OVERRIDES, CEPH_CONF, legacy=True,
+                                       default_section='global')
+
+    def test_same_output_many_sections(self):
+        conf, overrides = generate_config(50)
+        resultant, _ = merge(overrides, conf)
+        assert resultant == CEPH_CONF_RESULT.format(no_value='') + ''.join(
+            OSD_CONF_RESULT.format(i, i // 4, 4294967296 + i)
+            for i in sorted(range(50), key=str))
+        assert (resultant, _) == merge(overrides, conf, legacy=True)
+
+    def test_benchmark(self):
+        # the legacy parser copies the tuple of values of an option each
+        # time it is defined again
+        conf, overrides = generate_config(500)
+        conf += '\n[client]\n' + ''.join(
+            'rbd default map options = opt{}\n'.format(i) for i in range(2000))
+        resultant, _ = merge(overrides, conf)
+        assert resultant == merge(overrides, conf, legacy=True)[0]
+        legacy = min(timeit.repeat(lambda: merge(overrides, conf, legacy=True),
+                                   number=1, repeat=3))
+        new = min(timeit.repeat(lambda: merge(overrides, conf),
+                                number=1, repeat=3))
+        print('legacy parser: {:.3f}s, new parser: {:.3f}s'.format(legacy, new))
+        assert new < legacy
+
+    def test_continuation_lines(self):
+        # the legacy parser can't read them on python >= 3.8
+        # (dictionary keys changed during iteration)
+        resultant, _ = merge({}, "[global]\nthings =\n    url1\n    url2\nother = 1\n")
+        assert resultant == "[global]\nother = 1\nthings = \n\turl1\n\turl2\n\n"
+
+    def test_multi_value(self):
+        config = config_template.IniConfig()
+        config.read_file(StringIO("[global]\nkey = var1\nkey = var2\nkey = var1\n"))
+        assert config.defaults() == {}
+        assert dict(config.items('global')) == {'key': ['var1', 'var2']}
+        fp = StringIO()
+        config.write(fp)
+        assert fp.getvalue() == "[global]\nkey = var1\nkey = var2\n\n"
@@ -0,0 +1,114 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+from mock.mock import MagicMock, patch
+
+import installer_profile
+import json
+
+
+def fake_task(uuid, name, role=None):
+    task = MagicMock()
+    task._uuid = uuid
+    task.get_name.return_value = name
+    task.get_path.return_value = 'roles/{}/tasks/main.yml:1'.format(role)
+    if role:
+        task._role.get_name.return_value = role
+    else:
+        task._role = None
+    return task
+
+
+def fake_host(name):
+    host = MagicMock()
+    host.get_name.return_value = name
+    return host
+
+
+def fake_result(task, host, result=None):
+    res = MagicMock()
+    res._task = task
+    res._host = host
+    res._result = result or {}
+    return res
+
+
+class TestInstallerProfile(object):
+
+    @patch('time.time')
+    def test_profile(self, m_time, tmpdir):
+        clock = [100.0]
+        m_time.side_effect = lambda: clock[0]
+
+        def tick(seconds):
+            clock[0] += seconds
+
+        callback = installer_profile.CallbackModule()
+        callback._display = MagicMock()
+        callback.trace_file = str(tmpdir.join('profile.json'))
+        callback.top = 2
+        playbook = MagicMock()
+        playbook._file_name = 'site.yml'
+        callback.v2_playbook_on_start(playbook)
+
+        osd0 = fake_host('osd0')
+        osd1 = fake_host('osd1')
+        gather = fake_task('1', 'gather facts')
+        zap = fake_task('2', 'zap devices', role='ceph-osd')
+
+        callback.v2_playbook_on_task_start(gather, False)
+        callback.v2_runner_on_start(osd0, gather)
+        callback.v2_runner_on_start(osd1, gather)
+        tick(1)
+        callback.v2_runner_on_ok(fake_result(gather, osd0))
+        tick(2)
+        callback.v2_runner_on_ok(fake_result(gather, osd1))
+
+        callback.v2_playbook_on_task_start(zap, False)
+        callback.v2_runner_on_start(osd0, zap)
+        tick(5)
+        callback.v2_runner_item_on_ok(fake_result(zap, osd0, {'item': '/dev/sdb', '_ansible_item_label': '/dev/sdb'}))
+        tick(1)
+        callback.v2_runner_item_on_failed(fake_result(zap, osd0, {'item': {'data': '/dev/sdc'}}))
+        callback.v2_runner_on_failed(fake_result(zap, osd0), ignore_errors=True)
+
+        callback.v2_playbook_on_stats(MagicMock())
+
+        assert [installer_profile.duration(t) for t in callback.tasks.values()] == [3, 6]
+        assert callback.tasks['2']['hosts']['osd0']['status'] == 'ignored'
+        assert [(i['item'], installer_profile.duration(i), i['status']) for i in callback.items] == [
+            ('/dev/sdb', 5, 'ok'),
+            ('{"data": "/dev/sdc"}', 1, 'failed'),
+        ]
+
+        lines = [c[0][0] for c in callback._display.display.call_args_list]
+        assert lines[0] == 'Slowest tasks:'
+        assert lines[1] == '     6.00s  ceph-osd : zap devices'
+        assert lines[2] == '     3.00s  gather facts'
+        assert lines[4] == '     6.00s  osd0 | ceph-osd : zap devices'
+        assert lines[5] == '     3.00s  osd1 | gather facts'
+        assert lines[7] == '     5.00s  osd0 | ceph-osd : zap devices | /dev/sdb'
+
+        with open(callback.trace_file) as f:
+            trace = json.load(f)
+        assert trace['otherData']['playbook'] == 'site.yml'
+        assert trace['otherData']['tasks'][1] == {'name': 'zap devices', 'role': 'ceph-osd',
+                                                  'path': 'roles/ceph-osd/tasks/main.yml:1', 'duration': 6}
+        events = [e for e in trace['traceEvents'] if e['ph'] == 'X']
+        assert [(e['name'], e['tid'], e['ts'], e['dur']) for e in events] == [
+            ('gather facts', 1, 0, 1000000),
+            ('gather facts', 2, 0, 3000000),
+            ('zap devices', 1, 3000000, 6000000),
+            ('zap devices [/dev/sdb]', 1, 3000000, 5000000),
+            ('zap devices [{"data": "/dev/sdc"}]', 1, 8000000, 1000000),
+        ]
+        threads = [(e['tid'], e['args']['name']) for e in trace['traceEvents'] if e['ph'] == 'M']
+        assert threads == [(1, 'osd0'), (2, 'osd1')]
+
+    def test_no_trace_file(self, tmpdir):
+        callback = installer_profile.CallbackModule()
+        callback._display = MagicMock()
+        callback.trace_file = ''
+        with tmpdir.as_cwd():
+            callback.v2_playbook_on_stats(MagicMock())
+            assert tmpdir.listdir() == []
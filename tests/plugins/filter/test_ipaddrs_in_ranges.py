@@ -6,7 +6,7 @@ from ansible.errors import AnsibleFilterError
 import ipaddrs_in_ranges
 import pytest
 
-pytest.importorskip('netaddr')
+netaddr = pytest.importorskip('netaddr')
 
 filter_plugin = ipaddrs_in_ranges.FilterModule()
 
@@ -50,6 +50,38 @@ class TestIpaddrsInRanges(object):
         result = filter_plugin.ips_in_ranges(ips, ranges)
         assert len(result) == 0
 
+    def test_one_ip_overlapping_ranges(self):
+        ips = ['10.10.10.1', '10.10.10.1']
+        ranges = ['10.10.0.0/16', '10.10.10.0/24']
+        result = filter_plugin.ips_in_ranges(ips, ranges)
+        assert result == ['10.10.10.1']
+
+    def test_order_preserved(self):
+        ips = ['10.10.12.1', '192.168.1.1', '10.10.10.1', '10.10.11.255']
+        ranges = ['10.10.10.0/24', '10.10.12.0/24', '10.10.11.0/24']
+        result = filter_plugin.ips_in_ranges(ips, ranges)
+        assert result == ['10.10.12.1', '10.10.10.1', '10.10.11.255']
+
+    def test_range_boundaries(self):
+        ips = ['10.10.9.255', '10.10.10.0', '10.10.10.255', '10.10.11.0']
+        ranges = ['10.10.10.0/24']
+        result = filter_plugin.ips_in_ranges(ips, ranges)
+        assert result == ['10.10.10.0', '10.10.10.255']
+
+    def test_ipv6(self):
+        ips = ['10.10.10.1', 'fd00::1', '2001:db8::1']
+        ranges = ['10.0.0.0/8', 'fd00::/64']
+        result = filter_plugin.ips_in_ranges(ips, ranges)
+        assert result == ['10.10.10.1', 'fd00::1']
+        assert filter_plugin.ips_in_ranges(['fd00::1'], ['10.0.0.0/8']) == []
+
+    def test_compiled_ranges_cached(self):
+        ranges = ['10.10.10.0/24', '10.10.0.0/16', '192.168.1.0/24']
+        index = filter_plugin.compile_ranges(ranges)
+        assert index[4] == ([int(netaddr.IPAddress('10.10.0.0')), int(netaddr.IPAddress('192.168.1.0'))],
+                            [int(netaddr.IPAddress('10.10.255.255')), int(netaddr.IPAddress('192.168.1.255'))])
+        assert filter_plugin.compile_ranges(list(ranges)) is index
+
     def test_ips_in_ranges_in_filters_dict(self):
         assert 'ips_in_ranges' in filter_plugin.filters()
 
@@ -0,0 +1,53 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+from mock.mock import patch
+from ansible.errors import AnsibleError
+
+import ceph_facts_cache
+import pytest
+
+fake_key = 'ceph:mon0,mon1,mon2'
+
+
+class TestCephFactsCache(object):
+
+    def setup_method(self):
+        self.lookup = ceph_facts_cache.LookupModule()
+
+    def test_empty_cache(self, tmpdir):
+        assert self.lookup.run([fake_key], path=str(tmpdir)) == [{}]
+
+    def test_update_cache(self, tmpdir):
+        result = self.lookup.run([fake_key], path=str(tmpdir), facts={'fsid': 'abc'})
+        assert result == [{'fsid': 'abc'}]
+        result = self.lookup.run([fake_key], path=str(tmpdir), facts={'running_mon': 'mon1'})
+        assert result == [{'fsid': 'abc', 'running_mon': 'mon1'}]
+        assert self.lookup.run([fake_key], path=str(tmpdir)) == [{'fsid': 'abc', 'running_mon': 'mon1'}]
+        # the cache is per key
+        assert self.lookup.run(['ceph:mon3'], path=str(tmpdir)) == [{}]
+
+    @patch('time.time')
+    def test_ttl(self, m_time, tmpdir):
+        m_time.return_value = 1000
+        self.lookup.run([fake_key], path=str(tmpdir), facts={'fsid': 'abc'})
+        m_time.return_value = 1200
+        self.lookup.run([fake_key], path=str(tmpdir), facts={'running_mon': 'mon1'})
+        m_time.return_value = 1299
+        assert self.lookup.run([fake_key], path=str(tmpdir), ttl=300) == [{'fsid': 'abc', 'running_mon': 'mon1'}]
+        # each fact expires on its own
+        m_time.return_value = 1300
+        assert self.lookup.run([fake_key], path=str(tmpdir), ttl=300) == [{'running_mon': 'mon1'}]
+
+    def test_invalidate(self, tmpdir):
+        self.lookup.run([fake_key], path=str(tmpdir), facts={'fsid': 'abc'})
+        assert self.lookup.run([fake_key], path=str(tmpdir), invalidate=True) == [{}]
+        assert self.lookup.run([fake_key], path=str(tmpdir)) == [{}]
+
+    def test_corrupted_cache(self, tmpdir):
+        tmpdir.join(ceph_facts_cache.cache_file('', fake_key)).write('{')
+        assert self.lookup.run([fake_key], path=str(tmpdir)) == [{}]
+
+    def test_missing_key(self, tmpdir):
+        with pytest.raises(AnsibleError):
+            self.lookup.run([], path=str(tmpdir))